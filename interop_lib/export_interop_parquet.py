@@ -0,0 +1,45 @@
+import sys, json, argparse, logging
+from interop_data_for_db import read_runs_for_batch
+from interop_parquet import PARQUET_EXPORT_SECTIONS
+from interop_parquet import export_runs_to_parquet
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--manifest', default=None, help='Csv file with run_id and run_path columns, and optional interop_dump and runinfo_xml columns')
+    parser.add_argument('-b', '--runs_dir', default=None, help='Dir of run folders, folder name is used as run id and InterOp binary files are read')
+    parser.add_argument('-o', '--output_dir', required=True, help='Parquet dataset dir, runs are partitioned by instrument, run and section')
+    parser.add_argument('-s', '--section', action='append', default=None, help='Section to export, can be used more than once, default all of {0}'.format(', '.join(PARQUET_EXPORT_SECTIONS)))
+    parser.add_argument('-w', '--workers', default=4, type=int, help='Number of worker processes')
+    parser.add_argument('-c', '--cache_dir', default=None, help='Interop section cache dir for the dumptext outputs')
+    parser.add_argument('--compression', default='snappy', choices=['snappy', 'gzip', 'zstd', 'none'], help='Parquet compression')
+    parser.add_argument('--summary_file', default=None, help='Write the export results to this json file')
+    args = parser.parse_args()
+    if args.manifest is None and \
+       args.runs_dir is None:
+        parser.error('Required --manifest or --runs_dir')
+    logging.basicConfig(level=logging.INFO)
+    try:
+        runs = \
+            read_runs_for_batch(
+                manifest=args.manifest,
+                runs_dir=args.runs_dir)
+        results = \
+            export_runs_to_parquet(
+                runs=runs,
+                output_dir=args.output_dir,
+                workers=args.workers,
+                sections=args.section,
+                cache_dir=args.cache_dir,
+                compression=None if args.compression == 'none' else args.compression)
+        if args.summary_file is not None:
+            with open(args.summary_file, 'w') as fp:
+                json.dump(results, fp, indent=2)
+        failed = [r for r in results if r.get('status') != 'success']
+        logging.info(
+            'Export finished: {0} success, {1} failed'.\
+                format(len(results) - len(failed), len(failed)))
+        if len(failed) > 0:
+            sys.exit(1)
+    except Exception as e:
+        logging.error('Failed to export runs to parquet, error: {0}'.format(e))
+        sys.exit(1)
@@ -1,14 +1,46 @@
-import argparse, logging
+import os, time, argparse, logging
 from interop_data_for_db import generate_data_dumps_and_create_json_for_db
+from interop_data_for_db import read_runs_for_batch
+from interop_data_for_db import generate_json_for_db_in_batch
+from interop_cycle_state import InteropCycleState
 
 parser = argparse.ArgumentParser()
-parser.add_argument('-i', '--run_id', required=True, help='Run name')
-parser.add_argument('-r', '--run_path', required=True, help='Path to the run')
+parser.add_argument('-i', '--run_id', default=None, help='Run name')
+parser.add_argument('-r', '--run_path', default=None, help='Path to the run')
+parser.add_argument('-f', '--manifest', default=None, help='Batch mode: csv file with run_id and run_path columns')
+parser.add_argument('-b', '--runs_dir', default=None, help='Batch mode: dir of run folders, folder name is used as run id')
+parser.add_argument('-w', '--workers', default=4, type=int, help='Batch mode: number of worker processes')
+parser.add_argument('-l', '--memory_limit_gb', default=None, type=float, help='Batch mode: memory limit per worker process in GB')
 parser.add_argument('-o', '--output_dir', required=True, help='Output dir path')
 parser.add_argument('-m', '--generate_imaging', default=False, action='store_true', help='Generate imaging data')
 parser.add_argument('-d', '--interop_dumptext_exe', default='interop_dumptext', help='Path to InterOp demptext exe')
 parser.add_argument('-t', '--interop_imaging_tablet_exe', default='interop_imaging_table', help='Path to InterOp imagig table exe')
+parser.add_argument('-c', '--cache_dir', default=os.environ.get('INTEROP_CACHE_DIR'), help='Interop section cache dir, default INTEROP_CACHE_DIR env')
+parser.add_argument('--no_cache', default=False, action='store_true', help='Bypass the interop section cache')
+parser.add_argument('--refresh_cache', default=False, action='store_true', help='Refresh the interop section cache for this run')
+parser.add_argument('-s', '--stream_dumptext', default=False, action='store_true', help='Parse interop_dumptext output from a pipe, without a temp file')
+parser.add_argument('--tee_dumptext', default=None, help='Write a copy of the streamed interop_dumptext output to this path, for debugging')
+parser.add_argument('-n', '--binary_reader', default=False, action='store_true', help='Read InterOp binary files directly, without interop_dumptext')
+parser.add_argument('-u', '--state_dir', default=None, help='Incremental mode: dir for per cycle aggregates, only new cycles are processed and the output json is replaced')
+parser.add_argument('-p', '--poll_interval', default=None, type=int, help='Incremental mode: seconds between polls, repeat till the run is complete')
+parser.add_argument('--stages', default=False, action='store_true', help='Log stage timings and write them to <run_id>_stages.json in output dir')
+parser.add_argument('--profile', default=False, action='store_true', help='Write a cProfile dump of the run to <run_id>.prof in output dir')
+parser.add_argument('--json_format', default=1, type=int, choices=[1, 2, 3], help='DB json format version, 1 for charts as json strings, 2 for nested chart objects, 3 for nested chart objects with base64 packed arrays')
+parser.add_argument('--fast_json', default=False, action='store_true', help='Serialize the DB json with orjson, if it is installed')
+parser.add_argument('--compression', default=None, choices=['gzip', 'zstd'], help='Compress the DB json, output file gets a .gz or .zst suffix')
+parser.add_argument('--box_stats', default=False, action='store_true', help='Store quartiles, whiskers and outliers per lane for the cluster count and density box plots, instead of all the tile values')
+parser.add_argument('--imaging_chunk_size', default=None, type=int, help='Read the imaging table in chunks of this many rows, memory use stays flat for long runs')
 args = parser.parse_args()
+if args.manifest is None and \
+   args.runs_dir is None and \
+   (args.run_id is None or args.run_path is None):
+    parser.error('Required --run_id and --run_path, or --manifest / --runs_dir for batch mode')
+if args.poll_interval is not None and \
+   args.state_dir is None:
+    parser.error('Required --state_dir for --poll_interval')
+if args.tee_dumptext is not None and \
+   (args.manifest is not None or args.runs_dir is not None):
+    parser.error('--tee_dumptext is not supported in batch mode')
 
 run_id = args.run_id
 run_path = args.run_path
@@ -16,15 +48,114 @@ output_dir = args.output_dir
 generate_imaging = args.generate_imaging
 interop_dumptext_exe = args.interop_dumptext_exe
 interop_imaging_tablet_exe = args.interop_imaging_tablet_exe
+cache_dir = args.cache_dir
+if args.no_cache:
+    cache_dir = None
+refresh_cache = args.refresh_cache
+stream_dumptext = args.stream_dumptext
+tee_dumptext = args.tee_dumptext
+if tee_dumptext is not None:
+    stream_dumptext = True
+binary_reader = args.binary_reader
+state_dir = args.state_dir
+poll_interval = args.poll_interval
+write_stages = args.stages
+profile = args.profile
+json_format = args.json_format
+fast_json = args.fast_json
+compression = args.compression
+box_stats = args.box_stats
+imaging_chunk_size = args.imaging_chunk_size
+manifest = args.manifest
+runs_dir = args.runs_dir
+workers = args.workers
+memory_limit = None
+if args.memory_limit_gb is not None:
+    memory_limit = int(args.memory_limit_gb * 1024 ** 3)
 
 if __name__=='__main__':
     try:
-        generate_data_dumps_and_create_json_for_db(
-            run_id=run_id,
-            run_path=run_path,
-            output_dir=output_dir,
-            generate_imaging=generate_imaging,
-            interop_dumptext_exe=interop_dumptext_exe,
-            interop_imaging_tablet_exe=interop_imaging_tablet_exe)
+        if manifest is not None or \
+           runs_dir is not None:
+            logging.basicConfig(level=logging.INFO)
+            runs = \
+                read_runs_for_batch(
+                    manifest=manifest,
+                    runs_dir=runs_dir)
+            generate_json_for_db_in_batch(
+                runs=runs,
+                output_dir=output_dir,
+                generate_imaging=generate_imaging,
+                interop_dumptext_exe=interop_dumptext_exe,
+                interop_imaging_tablet_exe=interop_imaging_tablet_exe,
+                workers=workers,
+                memory_limit=memory_limit,
+                cache_dir=cache_dir,
+                refresh_cache=refresh_cache,
+                stream_dumptext=stream_dumptext,
+                binary_reader=binary_reader,
+                write_stages=write_stages,
+                profile=profile,
+                json_format=json_format,
+                fast_json=fast_json,
+                compression=compression,
+                box_stats=box_stats,
+                imaging_chunk_size=imaging_chunk_size)
+        elif poll_interval is not None:
+            logging.basicConfig(level=logging.INFO)
+            while True:
+                try:
+                    json_data = \
+                        generate_data_dumps_and_create_json_for_db(
+                            run_id=run_id,
+                            run_path=run_path,
+                            output_dir=output_dir,
+                            generate_imaging=generate_imaging,
+                            interop_dumptext_exe=interop_dumptext_exe,
+                            interop_imaging_tablet_exe=interop_imaging_tablet_exe,
+                            cache_dir=cache_dir,
+                            refresh_cache=refresh_cache,
+                            stream_dumptext=stream_dumptext,
+                            tee_dumptext=tee_dumptext,
+                            binary_reader=binary_reader,
+                            state_dir=state_dir,
+                            write_stages=write_stages,
+                            profile=profile,
+                            json_format=json_format,
+                            fast_json=fast_json,
+                            compression=compression,
+                            box_stats=box_stats,
+                            imaging_chunk_size=imaging_chunk_size)
+                    logging.info(
+                        'Run {0} processed till cycle {1}'.\
+                            format(run_id, json_data.get('last_cycle_processed')))
+                except Exception as e:
+                    logging.warning('Failed to process run {0}, error: {1}'.format(run_id, e))
+                if InteropCycleState(state_dir, run_id).is_complete():
+                    break
+                time.sleep(poll_interval)
+        else:
+            if write_stages:
+                logging.basicConfig(level=logging.INFO)
+            generate_data_dumps_and_create_json_for_db(
+                run_id=run_id,
+                run_path=run_path,
+                output_dir=output_dir,
+                generate_imaging=generate_imaging,
+                interop_dumptext_exe=interop_dumptext_exe,
+                interop_imaging_tablet_exe=interop_imaging_tablet_exe,
+                cache_dir=cache_dir,
+                refresh_cache=refresh_cache,
+                stream_dumptext=stream_dumptext,
+                tee_dumptext=tee_dumptext,
+                binary_reader=binary_reader,
+                state_dir=state_dir,
+                write_stages=write_stages,
+                profile=profile,
+                json_format=json_format,
+                fast_json=fast_json,
+                compression=compression,
+                box_stats=box_stats,
+                imaging_chunk_size=imaging_chunk_size)
     except Exception as e:
         logging.error('Failed to generate Interop dump, error: {0}'.format(e))
\ No newline at end of file
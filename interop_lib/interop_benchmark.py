@@ -0,0 +1,556 @@
+import os, time, logging, platform, resource, tracemalloc, multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from interop_data_for_db import DB_INTEROP_SECTIONS
+
+BENCHMARK_SCALES = {
+    'miseq': {
+        'lanes': 1, 'surfaces': 2, 'swaths': 1, 'tiles_per_swath': 19,
+        'reads': [(1, 151, 'N'), (2, 8, 'Y'), (3, 8, 'Y'), (4, 151, 'N')],
+        'channels': ['A', 'C', 'G', 'T']},
+    'nextseq': {
+        'lanes': 4, 'surfaces': 2, 'swaths': 3, 'tiles_per_swath': 12,
+        'reads': [(1, 151, 'N'), (2, 8, 'Y'), (3, 8, 'Y'), (4, 151, 'N')],
+        'channels': ['Red', 'Green']},
+    'novaseq_s4': {
+        'lanes': 4, 'surfaces': 2, 'swaths': 6, 'tiles_per_swath': 78,
+        'reads': [(1, 151, 'N'), (2, 8, 'Y'), (3, 8, 'Y'), (4, 151, 'N')],
+        'channels': ['Red', 'Green']}}
+
+BENCHMARK_FUNCTIONS = (
+    'read_interop_data',
+    'get_summary_stats',
+    'get_interop_data_for_db',
+    'summary_report_and_plots_for_interop_dump')
+
+def get_benchmark_tile_naming(sections=1):
+    return 'FourDigit' if sections == 1 else 'FiveDigit'
+
+
+def get_benchmark_tile_ids(surfaces, swaths, tiles_per_swath, sections=1):
+    """
+    A function for building Illumina tile names for a synthetic flowcell
+
+    With one section per swath the names are FourDigit (surface, swath and 2 digit tile
+    number), else FiveDigit (surface, swath, section and 2 digit tile number), same as
+    the layout decoded by get_flowcell_tile_positions.
+
+    :param surfaces: Number of surfaces, 1 to 9
+    :param swaths: Number of swaths per surface, 1 to 9
+    :param tiles_per_swath: Number of tiles per swath, or per section for FiveDigit names, 1 to 99
+    :param sections: Number of sections per swath, 1 to 9, default 1
+    :returns: A numpy array of tile ids
+    """
+    for name, value, max_value in (
+        ('surfaces', surfaces, 9),
+        ('swaths', swaths, 9),
+        ('sections', sections, 9),
+        ('tiles_per_swath', tiles_per_swath, 99)):
+        if not 1 <= value <= max_value:
+            raise ValueError(
+                    'Benchmark {0} should be between 1 and {1}, got {2}'.\
+                        format(name, max_value, value))
+    return np.array([
+        surface * 10000 + swath * 1000 + section * 100 + tile \
+            if sections > 1 else \
+                surface * 1000 + swath * 100 + tile
+            for surface in range(1, surfaces + 1)
+                for swath in range(1, swaths + 1)
+                    for section in range(1, sections + 1)
+                        for tile in range(1, tiles_per_swath + 1)],
+        dtype=np.int64)
+
+
+def write_benchmark_runinfo(runinfo_file, lanes, surfaces, swaths, tiles_per_swath, reads, sections=1):
+    """
+    A function for writing a RunInfo.xml file for a synthetic run
+
+    :param runinfo_file: Output path
+    :param lanes: Number of lanes
+    :param surfaces: Number of surfaces
+    :param swaths: Number of swaths per surface
+    :param tiles_per_swath: Number of tiles per swath
+    :param reads: A list of (read number, cycles, is index Y/N) tuples
+    :param sections: Number of sections per swath, default 1
+    """
+    tile_ids = get_benchmark_tile_ids(surfaces, swaths, tiles_per_swath, sections=sections)
+    with open(runinfo_file, 'w') as fp:
+        fp.write('<?xml version="1.0"?>\n')
+        fp.write('<RunInfo Version="5">\n')
+        fp.write('  <Run Id="BENCHMARK_RUN" Number="1">\n')
+        fp.write('    <Flowcell>BENCHMARK</Flowcell>\n')
+        fp.write('    <Instrument>BENCHMARK</Instrument>\n')
+        fp.write('    <Date>1/1/2021</Date>\n')
+        fp.write('    <Reads>\n')
+        for read_number, cycles, index_read in reads:
+            fp.write(
+                '      <Read Number="{0}" NumCycles="{1}" IsIndexedRead="{2}" />\n'.\
+                    format(read_number, cycles, index_read))
+        fp.write('    </Reads>\n')
+        fp.write(
+            '    <FlowcellLayout LaneCount="{0}" SurfaceCount="{1}" SwathCount="{2}" TileCount="{3}"{4}>\n'.\
+                format(
+                    lanes, surfaces, swaths, tiles_per_swath,
+                    ' SectionPerLane="{0}"'.format(sections) if sections > 1 else ''))
+        fp.write(
+            '      <TileSet TileNamingConvention="{0}">\n'.\
+                format(get_benchmark_tile_naming(sections)))
+        fp.write('        <Tiles>\n')
+        for lane in range(1, lanes + 1):
+            for tile in tile_ids:
+                fp.write('          <Tile>{0}_{1}</Tile>\n'.format(lane, tile))
+        fp.write('        </Tiles>\n')
+        fp.write('      </TileSet>\n')
+        fp.write('    </FlowcellLayout>\n')
+        fp.write('  </Run>\n')
+        fp.write('</RunInfo>\n')
+
+
+def write_benchmark_section(fp, header, columns, df, comments=()):
+    fp.write('# {0}\n'.format(header))
+    for comment in comments:
+        fp.write('# {0}\n'.format(comment))
+    fp.write('{0}\n'.format(','.join(columns)))
+    df[columns].to_csv(fp, header=False, index=False, float_format='%.4f')
+
+
+def write_benchmark_dump(dump_file, lanes, surfaces, swaths, tiles_per_swath, reads, channels, seed=0, sections=1):
+    """
+    A function for writing a synthetic interop_dumptext output
+
+    Tile, Q2030, Extraction, Error (for the non-index reads), EmpiricalPhasing, QByLane,
+    CorrectedInt and Index sections are written with the same layout as interop_dumptext.
+
+    :param dump_file: Output path
+    :param lanes: Number of lanes
+    :param surfaces: Number of surfaces
+    :param swaths: Number of swaths per surface
+    :param tiles_per_swath: Number of tiles per swath
+    :param reads: A list of (read number, cycles, is index Y/N) tuples
+    :param channels: A list of image channel names
+    :param seed: Random seed, default 0
+    :param sections: Number of sections per swath, default 1
+    """
+    rng = np.random.default_rng(seed)
+    tile_ids = get_benchmark_tile_ids(surfaces, swaths, tiles_per_swath, sections=sections)
+    total_cycles = sum([r[1] for r in reads])
+    lane_tiles = \
+        pd.DataFrame({
+            'Lane': np.repeat(np.arange(1, lanes + 1), len(tile_ids)),
+            'Tile': np.tile(tile_ids, lanes)})
+    cycle_rows = \
+        pd.DataFrame({
+            'Lane': np.repeat(lane_tiles['Lane'].values, total_cycles),
+            'Tile': np.repeat(lane_tiles['Tile'].values, total_cycles),
+            'Cycle': np.tile(np.arange(1, total_cycles + 1), len(lane_tiles.index))})
+    rows = len(cycle_rows.index)
+    with open(dump_file, 'w') as fp:
+        fp.write('# Version: v1.1.23\n')
+        cluster_count = rng.integers(2000000, 3000000, len(lane_tiles.index))
+        cluster_count_pf = (cluster_count * rng.uniform(0.6, 0.9, len(lane_tiles.index))).astype(np.int64)
+        tile = \
+            pd.DataFrame({
+                'Lane': np.repeat(lane_tiles['Lane'].values, len(reads)),
+                'Tile': np.repeat(lane_tiles['Tile'].values, len(reads)),
+                'Read': np.tile([r[0] for r in reads], len(lane_tiles.index)),
+                'ClusterCount': np.repeat(cluster_count, len(reads)),
+                'ClusterCountPF': np.repeat(cluster_count_pf, len(reads))})
+        tile['Density'] = tile['ClusterCount'] / 1000.3
+        tile['DensityPF'] = tile['ClusterCountPF'] / 1000.3
+        tile['Aligned'] = rng.uniform(0.5, 5, len(tile.index))
+        tile['Prephasing'] = rng.uniform(0.05, 0.2, len(tile.index))
+        tile['Phasing'] = rng.uniform(0.1, 0.3, len(tile.index))
+        write_benchmark_section(
+            fp, 'Tile,2',
+            ['Lane', 'Tile', 'Read', 'ClusterCount', 'ClusterCountPF', 'Density',
+             'DensityPF', 'Aligned', 'Prephasing', 'Phasing'],
+            tile)
+        del tile
+        q2030 = cycle_rows.copy()
+        q2030['Total'] = rng.integers(1000000, 2000000, rows)
+        q2030['Q20'] = (q2030['Total'] * 0.95).astype(np.int64)
+        q2030['Q30'] = (q2030['Total'] * rng.uniform(0.8, 0.95, rows)).astype(np.int64)
+        q2030['MedianQScore'] = rng.integers(30, 40, rows)
+        write_benchmark_section(
+            fp, 'Q2030,1',
+            ['Lane', 'Tile', 'Cycle', 'Q20', 'Q30', 'Total', 'MedianQScore'],
+            q2030)
+        del q2030
+        extraction = cycle_rows.copy()
+        extraction['TimeStamp'] = 637000000000000000 + extraction['Cycle'].values
+        for c in channels:
+            extraction['MaxIntensity_{0}'.format(c)] = rng.integers(1000, 5000, rows)
+        for c in channels:
+            extraction['Focus_{0}'.format(c)] = rng.uniform(1, 3, rows)
+        write_benchmark_section(
+            fp, 'Extraction,2',
+            ['Lane', 'Tile', 'Cycle', 'TimeStamp'] + \
+            ['MaxIntensity_{0}'.format(c) for c in channels] + \
+            ['Focus_{0}'.format(c) for c in channels],
+            extraction,
+            comments=['Channel Count: {0}'.format(len(channels))])
+        del extraction
+        aligned_cycles = list()
+        start_cycle = 0
+        for _, cycles, index_read in reads:
+            if index_read == 'N':
+                aligned_cycles.extend(range(start_cycle + 1, start_cycle + cycles + 1))
+            start_cycle += cycles
+        error = cycle_rows[cycle_rows['Cycle'].isin(aligned_cycles)].copy()
+        error['ErrorRate'] = rng.uniform(0.1, 1.5, len(error.index))
+        error['PhiXAdapterRate'] = 0
+        write_benchmark_section(
+            fp, 'Error,3',
+            ['Lane', 'Tile', 'Cycle', 'ErrorRate', 'PhiXAdapterRate'],
+            error)
+        del error
+        phasing = cycle_rows.copy()
+        phasing['Phasing'] = 0.1 + 0.001 * phasing['Cycle'] + rng.uniform(0, 0.01, rows)
+        phasing['Prephasing'] = 0.05 + 0.0005 * phasing['Cycle'] + rng.uniform(0, 0.01, rows)
+        write_benchmark_section(
+            fp, 'EmpiricalPhasing,1',
+            ['Lane', 'Tile', 'Cycle', 'Phasing', 'Prephasing'],
+            phasing)
+        del phasing
+        bin_columns = ['Bin_{0}'.format(i) for i in range(1, 8)]
+        qbylane = \
+            pd.DataFrame({
+                'Lane': np.repeat(np.arange(1, lanes + 1), total_cycles),
+                'Tile': 0,
+                'Cycle': np.tile(np.arange(1, total_cycles + 1), lanes)})
+        for c in bin_columns:
+            qbylane[c] = rng.integers(0, 1000000, len(qbylane.index))
+        write_benchmark_section(
+            fp, 'QByLane,6',
+            ['Lane', 'Tile', 'Cycle'] + bin_columns,
+            qbylane,
+            comments=['Bin Count: {0}'.format(len(bin_columns))])
+        corrected = cycle_rows.copy()
+        corrected['AverageCycleIntensity'] = rng.integers(100, 900, rows)
+        corrected['SignalToNoise'] = rng.uniform(0, 10, rows)
+        write_benchmark_section(
+            fp, 'CorrectedInt,2',
+            ['Lane', 'Tile', 'Cycle', 'AverageCycleIntensity', 'SignalToNoise'],
+            corrected)
+        del corrected
+        index = \
+            pd.DataFrame({
+                'Lane': np.arange(1, lanes + 1),
+                'Tile': tile_ids[0],
+                'Read': reads[1][0] if len(reads) > 1 else reads[0][0],
+                'Sequence': 'ACGTACGT',
+                'Sample': 'S1',
+                'Project': 'P1',
+                'Count': 100})
+        write_benchmark_section(
+            fp, 'Index,1',
+            ['Lane', 'Tile', 'Read', 'Sequence', 'Sample', 'Project', 'Count'],
+            index)
+
+
+def write_benchmark_imaging_table(imaging_file, lanes, surfaces, swaths, tiles_per_swath, reads, seed=0, sections=1):
+    """
+    A function for writing a synthetic interop_imaging_table output with 49 columns
+
+    :param imaging_file: Output path
+    :param lanes: Number of lanes
+    :param surfaces: Number of surfaces
+    :param swaths: Number of swaths per surface
+    :param tiles_per_swath: Number of tiles per swath
+    :param reads: A list of (read number, cycles, is index Y/N) tuples
+    :param seed: Random seed, default 0
+    :param sections: Number of sections per swath, default 1
+    """
+    rng = np.random.default_rng(seed)
+    tile_ids = get_benchmark_tile_ids(surfaces, swaths, tiles_per_swath, sections=sections)
+    total_cycles = sum([r[1] for r in reads])
+    with open(imaging_file, 'w') as fp:
+        fp.write('# Version: v1.1.23\n')
+        fp.write('# Column Count: 49\n')
+        fp.write('Lane,Tile,Cycle,Read,Cycle Within Read,...\n')
+        for lane in range(1, lanes + 1):
+            rows = len(tile_ids) * total_cycles
+            imaging = \
+                pd.DataFrame({
+                    'Lane': lane,
+                    'Tile': np.repeat(tile_ids, total_cycles),
+                    'Cycle': np.tile(np.arange(1, total_cycles + 1), len(tile_ids)),
+                    'Read': 1,
+                    'Cycle Within Read': np.tile(np.arange(1, total_cycles + 1), len(tile_ids))})
+            values = rng.uniform(0, 100, (rows, 44))
+            imaging = \
+                pd.concat([
+                    imaging,
+                    pd.DataFrame(values, columns=['c{0}'.format(i) for i in range(44)])],
+                    axis=1)
+            imaging.to_csv(fp, header=False, index=False, float_format='%.3f')
+
+
+def generate_benchmark_run(
+    run_dir, lanes, surfaces, swaths, tiles_per_swath, reads, channels,
+    generate_imaging=True, seed=0, sections=1):
+    """
+    A function for generating a synthetic run with RunInfo.xml, dump.csv and imaging.csv files
+
+    :param run_dir: Output dir path
+    :param lanes: Number of lanes
+    :param surfaces: Number of surfaces
+    :param swaths: Number of swaths per surface
+    :param tiles_per_swath: Number of tiles per swath
+    :param reads: A list of (read number, cycles, is index Y/N) tuples
+    :param channels: A list of image channel names
+    :param generate_imaging: Toggle for writing the imaging table, default True
+    :param seed: Random seed, default 0
+    :param sections: Number of sections per swath, more than 1 for FiveDigit tile names, default 1
+    :returns: A dict with runinfo_file, dump_file and imaging_file (None if not generated) paths
+    """
+    try:
+        os.makedirs(run_dir, exist_ok=True)
+        runinfo_file = os.path.join(run_dir, 'RunInfo.xml')
+        dump_file = os.path.join(run_dir, 'dump.csv')
+        imaging_file = None
+        write_benchmark_runinfo(
+            runinfo_file, lanes, surfaces, swaths, tiles_per_swath, reads, sections=sections)
+        write_benchmark_dump(
+            dump_file, lanes, surfaces, swaths, tiles_per_swath, reads, channels,
+            seed=seed, sections=sections)
+        if generate_imaging:
+            imaging_file = os.path.join(run_dir, 'imaging.csv')
+            write_benchmark_imaging_table(
+                imaging_file, lanes, surfaces, swaths, tiles_per_swath, reads,
+                seed=seed, sections=sections)
+        return {
+            'runinfo_file': runinfo_file,
+            'dump_file': dump_file,
+            'imaging_file': imaging_file}
+    except Exception as e:
+        raise ValueError('Failed to generate benchmark run, error: {0}'.format(e))
+
+
+def get_benchmark_call(function, run_files):
+    """
+    A function for preparing the inputs of a benchmarked function, the preparation is not timed
+
+    :param function: Benchmarked function name, see BENCHMARK_FUNCTIONS
+    :param run_files: A dict from generate_benchmark_run
+    :returns: A function without arguments
+    """
+    from interop_data_plot import read_interop_data
+    from interop_data_plot import read_runinfo_xml
+    from interop_data_plot import get_summary_stats
+    from interop_data_plot import summary_report_and_plots_for_interop_dump
+    from interop_data_for_db import get_interop_data_for_db
+    dump_file = run_files.get('dump_file')
+    runinfo_file = run_files.get('runinfo_file')
+    if function == 'read_interop_data':
+        def call():
+            data = read_interop_data(dump_file, sections=DB_INTEROP_SECTIONS)
+            return {k: data.get(k) for k in DB_INTEROP_SECTIONS}
+    elif function == 'get_summary_stats':
+        data = read_interop_data(dump_file, sections=DB_INTEROP_SECTIONS)
+        data = {k: data.get(k) for k in DB_INTEROP_SECTIONS}
+        runinfoDf = read_runinfo_xml(runinfo_file)
+        def call():
+            return \
+                get_summary_stats(
+                    tileDf=data.get('Tile'),
+                    q2030Df=data.get('Q2030'),
+                    extractionDf=data.get('Extraction'),
+                    errorDf=data.get('Error'),
+                    empiricalPhasingDf=data.get('EmpiricalPhasing'),
+                    runinfoDf=runinfoDf)
+    elif function == 'get_interop_data_for_db':
+        def call():
+            return \
+                get_interop_data_for_db(
+                    run_name='BENCHMARK_RUN',
+                    dump_file=dump_file,
+                    runinfo_file=runinfo_file,
+                    imaging_table_data=run_files.get('imaging_file'))
+    elif function == 'summary_report_and_plots_for_interop_dump':
+        def call():
+            return \
+                summary_report_and_plots_for_interop_dump(
+                    interop_dump=dump_file,
+                    runInfoXml_path=runinfo_file)
+    else:
+        raise ValueError('Unknown benchmark function {0}'.format(function))
+    return call
+
+
+def run_benchmark_function(function, run_files, repeat=3):
+    """
+    A function for timing and memory profiling one function, it is run in a fresh worker process
+
+    The function is called repeat times for the wall and CPU time, the peak RSS covers these calls.
+    One more call is traced with tracemalloc for the peak Python / numpy allocation.
+
+    :param function: Benchmarked function name, see BENCHMARK_FUNCTIONS
+    :param run_files: A dict from generate_benchmark_run
+    :param repeat: Number of timed calls, default 3
+    :returns: A dict with the timings in seconds and memory in MB, or an error
+    """
+    result = {'function': function}
+    try:
+        call = get_benchmark_call(function, run_files)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        times = list()
+        cpu_times = list()
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            start_cpu = time.process_time()
+            output = call()
+            cpu_times.append(time.process_time() - start_cpu)
+            times.append(time.perf_counter() - start_time)
+            del output
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        tracemalloc.start()
+        output = call()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del output
+        result.update({
+            'times': [round(t, 4) for t in times],
+            'min_time': round(min(times), 4),
+            'median_time': round(float(np.median(times)), 4),
+            'median_cpu_time': round(float(np.median(cpu_times)), 4),
+            'peak_rss_mb': round(peak_rss, 1),
+            'rss_increase_mb': round(max(peak_rss - rss_before, 0), 1),
+            'traced_peak_mb': round(traced_peak / 1024 ** 2, 1),
+            'error': None})
+    except Exception as e:
+        result.update({'error': '{0}: {1}'.format(type(e).__name__, e)})
+    return result
+
+
+def run_benchmark_suite(
+    scales=('miseq', 'nextseq', 'novaseq_s4'), functions=BENCHMARK_FUNCTIONS,
+    data_dir=None, repeat=3, generate_imaging=True, custom_scales=None):
+    """
+    A function for running the benchmark suite
+
+    Each scale is generated once in data_dir (reused if the files are already present) and
+    each function is measured in a new worker process, so the peak RSS is not shared.
+
+    :param scales: A list of scale names from BENCHMARK_SCALES or custom_scales
+    :param functions: A list of function names, default all BENCHMARK_FUNCTIONS
+    :param data_dir: Dir for the synthetic runs, default benchmark_data in the current dir
+    :param repeat: Number of timed calls for each function, default 3
+    :param generate_imaging: Toggle for the imaging table, used by get_interop_data_for_db, default True
+    :param custom_scales: A dict of extra scale name and parameters, same keys as BENCHMARK_SCALES
+    :returns: A dict with environment details and a list of results
+    """
+    try:
+        if data_dir is None:
+            data_dir = os.path.join(os.getcwd(), 'benchmark_data')
+        all_scales = dict(BENCHMARK_SCALES)
+        if custom_scales is not None:
+            all_scales.update(custom_scales)
+        results = list()
+        for scale in scales:
+            if scale not in all_scales:
+                raise KeyError('Unknown benchmark scale {0}'.format(scale))
+            params = all_scales.get(scale)
+            run_dir = os.path.join(data_dir, scale)
+            run_files = {
+                'runinfo_file': os.path.join(run_dir, 'RunInfo.xml'),
+                'dump_file': os.path.join(run_dir, 'dump.csv'),
+                'imaging_file': os.path.join(run_dir, 'imaging.csv') if generate_imaging else None}
+            if not all([os.path.exists(f) for f in run_files.values() if f is not None]):
+                start_time = time.perf_counter()
+                run_files = \
+                    generate_benchmark_run(
+                        run_dir=run_dir,
+                        generate_imaging=generate_imaging,
+                        **params)
+                logging.info(
+                    'Generated {0} run in {1:.1f}s'.\
+                        format(scale, time.perf_counter() - start_time))
+            for function in functions:
+                with ProcessPoolExecutor(
+                        max_workers=1,
+                        mp_context=multiprocessing.get_context('fork')) as executor:
+                    result = \
+                        executor.submit(
+                            run_benchmark_function,
+                            function=function,
+                            run_files=run_files,
+                            repeat=repeat).result()
+                result.update({
+                    'scale': scale,
+                    'tiles': params.get('lanes') * params.get('surfaces') * \
+                             params.get('swaths') * params.get('sections', 1) * \
+                             params.get('tiles_per_swath'),
+                    'cycles': sum([r[1] for r in params.get('reads')]),
+                    'dump_size_mb': round(os.path.getsize(run_files.get('dump_file')) / 1024 ** 2, 1)})
+                logging.info(
+                    '{0} {1}: {2}'.format(
+                        scale, function,
+                        result.get('error') or '{0}s, {1} MB peak RSS'.format(
+                            result.get('median_time'), result.get('peak_rss_mb'))))
+                results.append(result)
+        return {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+            'results': results}
+    except Exception as e:
+        raise ValueError('Failed to run benchmark suite, error: {0}'.format(e))
+
+
+def compare_benchmark_results(results, baseline, time_threshold=0.1, memory_threshold=0.1):
+    """
+    A function for comparing benchmark results with a stored baseline
+
+    A function is flagged as a regression if its median time or peak RSS is more than the
+    threshold fraction above the baseline. A function which failed now but not in the baseline
+    is also flagged, with the error. Functions missing in either file are skipped.
+
+    :param results: A dict from run_benchmark_suite
+    :param baseline: A dict from run_benchmark_suite, e.g. loaded from a json file
+    :param time_threshold: Allowed median time increase, default 0.1 for 10%
+    :param memory_threshold: Allowed peak RSS increase, default 0.1 for 10%
+    :returns: A list of dicts with scale, function, ratios, error and regression flag
+    """
+    baseline_results = {
+        (r.get('scale'), r.get('function')): r
+            for r in baseline.get('results')
+                if r.get('error') is None}
+    comparison = list()
+    for result in results.get('results'):
+        base = baseline_results.get((result.get('scale'), result.get('function')))
+        if base is None:
+            continue
+        if result.get('error') is not None:
+            comparison.append({
+                'scale': result.get('scale'),
+                'function': result.get('function'),
+                'baseline_time': base.get('median_time'),
+                'time': None,
+                'time_ratio': None,
+                'baseline_peak_rss_mb': base.get('peak_rss_mb'),
+                'peak_rss_mb': None,
+                'memory_ratio': None,
+                'error': result.get('error'),
+                'regression': True})
+            continue
+        time_ratio = result.get('median_time') / max(base.get('median_time'), 1e-6)
+        memory_ratio = result.get('peak_rss_mb') / max(base.get('peak_rss_mb'), 1e-6)
+        comparison.append({
+            'scale': result.get('scale'),
+            'function': result.get('function'),
+            'baseline_time': base.get('median_time'),
+            'time': result.get('median_time'),
+            'time_ratio': round(time_ratio, 3),
+            'baseline_peak_rss_mb': base.get('peak_rss_mb'),
+            'peak_rss_mb': result.get('peak_rss_mb'),
+            'memory_ratio': round(memory_ratio, 3),
+            'error': None,
+            'regression': bool(time_ratio > 1 + time_threshold or \
+                               memory_ratio > 1 + memory_threshold)})
+    return comparison
@@ -0,0 +1,448 @@
+import os, mmap
+import numpy as np
+import pandas as pd
+
+INTEROP_BINARY_FILES = {
+  'Tile': 'TileMetricsOut.bin',
+  'Q2030': 'QMetricsOut.bin',
+  'Extraction': 'ExtractionMetricsOut.bin',
+  'Error': 'ErrorMetricsOut.bin',
+  'EmpiricalPhasing': 'EmpiricalPhasingMetricsOut.bin',
+  'QByLane': 'QMetricsByLaneOut.bin'}
+
+INTEROP_CHANNEL_NAMES = {
+  2: ['Red', 'Green'],
+  4: ['A', 'C', 'G', 'T']}
+
+def get_interop_id_dtype(record_size, fields_size, tile_bytes=None):
+  """
+  A function for building the Lane, Tile, Cycle part of a record dtype
+
+  Newer record versions store Tile as uint32, older ones as uint16. If tile_bytes is not
+  given it is derived from the record size.
+
+  :param record_size: Record size in bytes from the file header
+  :param fields_size: Size of the metric fields after the ids
+  :param tile_bytes: Size of the Tile field, 2 or 4, default None for auto
+  :returns: A list of (name, dtype) tuples
+  """
+  if tile_bytes is None:
+    tile_bytes = record_size - fields_size - 4
+  if tile_bytes not in (2, 4):
+    raise ValueError(
+            'Unsupported record size {0} for {1} bytes of metric fields'.\
+              format(record_size, fields_size))
+  return [
+    ('Lane', '<u2'),
+    ('Tile', '<u{0}'.format(tile_bytes)),
+    ('Cycle', '<u2')]
+
+def read_interop_records(filepath, header_parser, dtype_builder, min_cycle=None):
+  """
+  A function for reading the records of a InterOp binary file with numpy.frombuffer over a memory mapped file
+
+  All the InterOp metric files start with a version byte and a record size byte, followed by
+  a version specific header and fixed size records. A partly written last record is ignored.
+
+  :param filepath: Path of the InterOp binary file
+  :param header_parser: A function(buffer, version, record_size) returning (header dict, header size)
+  :param dtype_builder: A function(version, record_size, header) returning the record numpy dtype
+  :param min_cycle: Skip the records till this cycle (inclusive), default None for all records
+  :returns: A tuple of (header dict, dict of record field name and numpy array copies)
+  """
+  with open(filepath, 'rb') as fp:
+    size = os.fstat(fp.fileno()).st_size
+    if size < 2:
+      raise ValueError('Empty InterOp file {0}'.format(filepath))
+    buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+  try:
+    version = buffer[0]
+    record_size = buffer[1]
+    header, header_size = \
+      header_parser(buffer, version, record_size)
+    header.update({'version': version, 'record_size': record_size})
+    dtype = dtype_builder(version, record_size, header)
+    if dtype.itemsize != record_size:
+      raise ValueError(
+              'Record size mismatch for {0} version {1}: {2} != {3}'.\
+                format(filepath, version, dtype.itemsize, record_size))
+    count = (size - header_size) // record_size
+    records = \
+      np.frombuffer(
+        buffer,
+        dtype=dtype,
+        count=count,
+        offset=header_size)
+    if min_cycle is not None and \
+       'Cycle' in dtype.names:
+      keep = records['Cycle'] > min_cycle
+      fields = {
+        name: records[name][keep]
+          for name in dtype.names}
+    else:
+      fields = {
+        name: np.array(records[name])
+          for name in dtype.names}
+    del records
+  finally:
+    buffer.close()
+  return header, fields
+
+def parse_no_header(buffer, version, record_size):
+  return dict(), 2
+
+def parse_q_header(buffer, version, record_size):
+  """
+  Q metrics version 5 and later have an optional bin definition after the record size
+  """
+  header = {'bins': None}
+  offset = 2
+  if version >= 5:
+    has_bins = buffer[offset]
+    offset += 1
+    if has_bins:
+      bin_count = buffer[offset]
+      offset += 1
+      lower = list(buffer[offset: offset + bin_count])
+      offset += bin_count
+      upper = list(buffer[offset: offset + bin_count])
+      offset += bin_count
+      values = list(buffer[offset: offset + bin_count])
+      offset += bin_count
+      header.update({
+        'bins': {'lower': lower, 'upper': upper, 'values': values}})
+  return header, offset
+
+def parse_extraction_header(buffer, version, record_size):
+  """
+  Extraction metrics version 3 and later keep the channel count after the record size
+  """
+  if version >= 3:
+    return {'channel_count': buffer[2]}, 3
+  return {'channel_count': 4}, 2
+
+def parse_tile_header(buffer, version, record_size):
+  """
+  Tile metrics version 3 keeps the tile area (mm2) after the record size
+  """
+  if version >= 3:
+    area = np.frombuffer(buffer, dtype='<f4', count=1, offset=2)[0]
+    return {'area': float(area)}, 6
+  return dict(), 2
+
+def build_tile_dtype(version, record_size, header):
+  if version == 2:
+    return np.dtype([
+      ('Lane', '<u2'), ('Tile', '<u2'), ('code', '<u2'), ('value', '<f4')])
+  if version == 3:
+    return np.dtype([
+      ('Lane', '<u2'), ('Tile', '<u4'), ('code', 'u1'),
+      ('value1', '<f4'), ('value2', '<f4')])
+  raise ValueError('Unsupported TileMetrics version {0}'.format(version))
+
+def build_q_dtype(version, record_size, header):
+  if version < 4:
+    raise ValueError('Unsupported QMetrics version {0}'.format(version))
+  tile_bytes = 4 if version >= 7 else 2
+  bin_bytes = record_size - 4 - tile_bytes
+  if bin_bytes <= 0 or bin_bytes % 4 != 0:
+    raise ValueError('Unsupported QMetrics record size {0}'.format(record_size))
+  return np.dtype(
+    get_interop_id_dtype(record_size, bin_bytes, tile_bytes=tile_bytes) + \
+    [('hist', '<u4', (bin_bytes // 4,))])
+
+def build_extraction_dtype(version, record_size, header):
+  channels = header.get('channel_count')
+  if version == 2:
+    return np.dtype([
+      ('Lane', '<u2'), ('Tile', '<u2'), ('Cycle', '<u2'),
+      ('fwhm', '<f4', (channels,)), ('p90', '<u2', (channels,)),
+      ('TimeStamp', '<u8')])
+  if version >= 3:
+    fields = [('fwhm', '<f4', (channels,)), ('p90', '<u2', (channels,))]
+    fields_size = 6 * channels
+    if record_size - 8 - fields_size == 8:
+      fields.append(('TimeStamp', '<u8'))
+      fields_size += 8
+    return np.dtype(
+      get_interop_id_dtype(record_size, fields_size) + fields)
+  raise ValueError('Unsupported ExtractionMetrics version {0}'.format(version))
+
+def build_error_dtype(version, record_size, header):
+  if version == 3:
+    return np.dtype([
+      ('Lane', '<u2'), ('Tile', '<u2'), ('Cycle', '<u2'),
+      ('ErrorRate', '<f4'), ('mismatch', '<u4', (5,))])
+  if version >= 4:
+    fields = [('ErrorRate', '<f4')]
+    fields_size = 4
+    if record_size - 8 - fields_size == 4:
+      fields.append(('PhiXAdapterRate', '<f4'))
+      fields_size += 4
+    return np.dtype(
+      get_interop_id_dtype(record_size, fields_size) + fields)
+  raise ValueError('Unsupported ErrorMetrics version {0}'.format(version))
+
+def build_empirical_phasing_dtype(version, record_size, header):
+  return np.dtype(
+    get_interop_id_dtype(record_size, 8) + \
+    [('Phasing', '<f4'), ('Prephasing', '<f4')])
+
+def get_id_columns(fields, names=('Lane', 'Tile', 'Cycle')):
+  return {
+    name: fields.get(name).astype('int32')
+      for name in names}
+
+def read_tile_metrics_binary(filepath):
+  """
+  A function for reading TileMetricsOut.bin (version 2 or 3) as the Tile section
+
+  :param filepath: Path of TileMetricsOut.bin
+  :returns: A Pandas dataframe with one row per lane, tile and read
+  """
+  header, fields = \
+    read_interop_records(filepath, parse_tile_header, build_tile_dtype)
+  lane = fields.get('Lane').astype('int32')
+  tile = fields.get('Tile').astype('int32')
+  if header.get('version') == 2:
+    code = fields.get('code').astype(np.int64)
+    value = fields.get('value').astype(np.float64)
+    tile_metrics = \
+      pd.DataFrame({'Lane': lane, 'Tile': tile, 'code': code, 'value': value}).\
+      drop_duplicates(['Lane', 'Tile', 'code'], keep='last').\
+      pivot(index=['Lane', 'Tile'], columns='code', values='value')
+    tile_data = \
+      pd.DataFrame({
+        'ClusterCount': tile_metrics.get(102, np.nan),
+        'ClusterCountPF': tile_metrics.get(103, np.nan),
+        'Density': tile_metrics.get(100, np.nan),
+        'DensityPF': tile_metrics.get(101, np.nan)},
+        index=tile_metrics.index)
+    read_rows = list()
+    for c in tile_metrics.columns:
+      if 200 <= c < 300 or 300 <= c < 400:
+        read_id = (c - 200) // 2 + 1 if c < 300 else c - 300 + 1
+        name = 'Aligned' if c >= 300 else ('Phasing' if c % 2 == 0 else 'Prephasing')
+        read_rows.append(
+          pd.DataFrame({
+            'Read': read_id,
+            'name': name,
+            'value': tile_metrics[c]}).\
+          reset_index())
+  else:
+    code = fields.get('code')
+    is_tile = code == ord('t')
+    is_read = code == ord('r')
+    counts = \
+      pd.DataFrame({
+        'Lane': lane[is_tile],
+        'Tile': tile[is_tile],
+        'ClusterCount': fields.get('value1')[is_tile].astype(np.float64),
+        'ClusterCountPF': fields.get('value2')[is_tile].astype(np.float64)}).\
+      drop_duplicates(['Lane', 'Tile'], keep='last').\
+      set_index(['Lane', 'Tile'])
+    area = header.get('area')
+    if area:
+      counts['Density'] = counts['ClusterCount'] / area
+      counts['DensityPF'] = counts['ClusterCountPF'] / area
+    else:
+      counts['Density'] = np.nan
+      counts['DensityPF'] = np.nan
+    tile_data = counts
+    read_rows = list()
+    if is_read.any():
+      read_rows.append(
+        pd.DataFrame({
+          'Lane': lane[is_read],
+          'Tile': tile[is_read],
+          'Read': fields.get('value1')[is_read].view('<u4').astype('int32'),
+          'name': 'Aligned',
+          'value': fields.get('value2')[is_read].astype(np.float64)}))
+  tile_data = tile_data.reset_index()
+  if len(read_rows) == 0:
+    tile_data['Read'] = np.nan
+    for c in ('Aligned', 'Prephasing', 'Phasing'):
+      tile_data[c] = np.nan
+  else:
+    read_data = \
+      pd.concat(read_rows, ignore_index=True).\
+      pivot_table(index=['Lane', 'Tile', 'Read'], columns='name', values='value', aggfunc='last').\
+      reset_index()
+    for c in ('Aligned', 'Prephasing', 'Phasing'):
+      if c not in read_data.columns:
+        read_data[c] = np.nan
+    tile_data = \
+      tile_data.merge(read_data, on=['Lane', 'Tile'], how='left')
+    if tile_data['Read'].notna().all():
+      tile_data['Read'] = tile_data['Read'].astype('int32')
+  tile_data['Lane'] = tile_data['Lane'].astype('int32')
+  tile_data['Tile'] = tile_data['Tile'].astype('int32')
+  return \
+    tile_data[[
+      'Lane', 'Tile', 'Read', 'ClusterCount', 'ClusterCountPF',
+      'Density', 'DensityPF', 'Aligned', 'Prephasing', 'Phasing']].\
+    sort_values(['Lane', 'Tile', 'Read']).\
+    reset_index(drop=True)
+
+def get_qscore_values(header, bin_count):
+  bins = header.get('bins')
+  if bin_count != 50 and \
+     bins is not None and \
+     len(bins.get('values')) == bin_count:
+    return np.array(bins.get('values'), dtype=np.int64)
+  return np.arange(1, bin_count + 1, dtype=np.int64)
+
+def read_q_metrics_binary(filepath, min_cycle=None):
+  """
+  A function for reading QMetricsOut.bin (version 4 to 7) as the Q2030 section
+
+  :param filepath: Path of QMetricsOut.bin
+  :param min_cycle: Skip the records till this cycle (inclusive), default None
+  :returns: A tuple of (Q2030 Pandas dataframe, Q histogram dataframe with Bin_ columns)
+  """
+  header, fields = \
+    read_interop_records(filepath, parse_q_header, build_q_dtype, min_cycle=min_cycle)
+  hist = fields.get('hist').astype(np.int64)
+  qscores = get_qscore_values(header, hist.shape[1])
+  total = hist.sum(axis=1)
+  cumulative = np.cumsum(hist, axis=1)
+  median_idx = np.argmax(cumulative >= ((total + 1) // 2)[:, None], axis=1)
+  q2030 = \
+    pd.DataFrame(get_id_columns(fields))
+  q2030['Q20'] = hist[:, qscores >= 20].sum(axis=1)
+  q2030['Q30'] = hist[:, qscores >= 30].sum(axis=1)
+  q2030['Total'] = total
+  q2030['MedianQScore'] = \
+    np.where(total > 0, qscores[median_idx], 0).astype('int32')
+  histogram = \
+    pd.DataFrame(get_id_columns(fields))
+  for i in range(hist.shape[1]):
+    histogram['Bin_{0}'.format(i + 1)] = hist[:, i]
+  return q2030, histogram
+
+def read_extraction_metrics_binary(filepath, channel_names=None, min_cycle=None):
+  """
+  A function for reading ExtractionMetricsOut.bin (version 2 or 3) as the Extraction section
+
+  :param filepath: Path of ExtractionMetricsOut.bin
+  :param channel_names: A list of channel names, default A, C, G, T for 4 and Red, Green for 2 channels
+  :param min_cycle: Skip the records till this cycle (inclusive), default None
+  :returns: A Pandas dataframe
+  """
+  header, fields = \
+    read_interop_records(filepath, parse_extraction_header, build_extraction_dtype, min_cycle=min_cycle)
+  channels = header.get('channel_count')
+  if channel_names is None:
+    channel_names = \
+      INTEROP_CHANNEL_NAMES.get(
+        channels,
+        [str(i + 1) for i in range(channels)])
+  extraction = \
+    pd.DataFrame(get_id_columns(fields))
+  if 'TimeStamp' in fields:
+    extraction['TimeStamp'] = fields.get('TimeStamp').astype(np.int64)
+  for i, name in enumerate(channel_names):
+    extraction['MaxIntensity_{0}'.format(name)] = \
+      fields.get('p90')[:, i].astype(np.float32)
+  for i, name in enumerate(channel_names):
+    extraction['Focus_{0}'.format(name)] = \
+      fields.get('fwhm')[:, i].astype(np.float32)
+  return extraction
+
+def read_error_metrics_binary(filepath, min_cycle=None):
+  """
+  A function for reading ErrorMetricsOut.bin (version 3 to 5) as the Error section
+
+  :param filepath: Path of ErrorMetricsOut.bin
+  :param min_cycle: Skip the records till this cycle (inclusive), default None
+  :returns: A Pandas dataframe
+  """
+  header, fields = \
+    read_interop_records(filepath, parse_no_header, build_error_dtype, min_cycle=min_cycle)
+  error = \
+    pd.DataFrame(get_id_columns(fields))
+  error['ErrorRate'] = fields.get('ErrorRate').astype(np.float32)
+  if 'PhiXAdapterRate' in fields:
+    error['PhiXAdapterRate'] = fields.get('PhiXAdapterRate').astype(np.float32)
+  return error
+
+def read_empirical_phasing_metrics_binary(filepath, min_cycle=None):
+  """
+  A function for reading EmpiricalPhasingMetricsOut.bin as the EmpiricalPhasing section
+
+  :param filepath: Path of EmpiricalPhasingMetricsOut.bin
+  :param min_cycle: Skip the records till this cycle (inclusive), default None
+  :returns: A Pandas dataframe
+  """
+  header, fields = \
+    read_interop_records(filepath, parse_no_header, build_empirical_phasing_dtype, min_cycle=min_cycle)
+  phasing = \
+    pd.DataFrame(get_id_columns(fields))
+  phasing['Phasing'] = fields.get('Phasing').astype(np.float32)
+  phasing['Prephasing'] = fields.get('Prephasing').astype(np.float32)
+  return phasing
+
+def read_interop_binary_data(run_path, sections=None, channel_names=None, min_cycle=None):
+  """
+  This function reads InterOp binary files from a run and returns the same sections as read_interop_data
+
+  Supported sections are Tile, Q2030, Extraction, Error, EmpiricalPhasing and QByLane
+  (from QMetricsByLaneOut.bin, or summed from QMetricsOut.bin over tiles if it is missing).
+  Missing files and other sections are returned as empty dataframes.
+
+  :param run_path: Path to the run, or to its InterOp dir
+  :param sections: A list of section names to load, default None for all supported sections
+  :param channel_names: A list of image channel names for the Extraction columns, default None
+  :param min_cycle: Skip the cycle metrics till this cycle (inclusive), Tile section is always read in full, default None
+  :returns: A dict containing section names and Pandas dataframes
+  """
+  try:
+    interop_dir = os.path.join(run_path, 'InterOp')
+    if not os.path.exists(interop_dir):
+      interop_dir = run_path
+    if not os.path.exists(interop_dir):
+      raise IOError('InterOp dir not found for run {0}'.format(run_path))
+    if sections is None:
+      sections = list(INTEROP_BINARY_FILES.keys())
+    output_dict = dict()
+    q_data = None
+    for section in sections:
+      filepath = \
+        os.path.join(interop_dir, INTEROP_BINARY_FILES.get(section, ''))
+      df = pd.DataFrame()
+      if section == 'QByLane':
+        if os.path.isfile(filepath):
+          _, df = read_q_metrics_binary(filepath, min_cycle=min_cycle)
+        else:
+          q_file = os.path.join(interop_dir, INTEROP_BINARY_FILES.get('Q2030'))
+          if q_data is None and \
+             os.path.isfile(q_file):
+            q_data = read_q_metrics_binary(q_file, min_cycle=min_cycle)
+          if q_data is not None:
+            df = \
+              q_data[1].drop(columns=['Tile']).\
+              groupby(['Lane', 'Cycle']).\
+              sum().\
+              reset_index()
+            df.insert(1, 'Tile', np.int32(0))
+      elif os.path.isfile(filepath):
+        if section == 'Tile':
+          df = read_tile_metrics_binary(filepath)
+        elif section == 'Q2030':
+          if q_data is None:
+            q_data = read_q_metrics_binary(filepath, min_cycle=min_cycle)
+          df = q_data[0]
+        elif section == 'Extraction':
+          df = \
+            read_extraction_metrics_binary(
+              filepath,
+              channel_names=channel_names,
+              min_cycle=min_cycle)
+        elif section == 'Error':
+          df = read_error_metrics_binary(filepath, min_cycle=min_cycle)
+        elif section == 'EmpiricalPhasing':
+          df = read_empirical_phasing_metrics_binary(filepath, min_cycle=min_cycle)
+      output_dict.update({section: df})
+    return output_dict
+  except Exception as e:
+    raise ValueError('Failed to read InterOp binary data, error: {0}'.format(e))
@@ -0,0 +1,358 @@
+import os, json, time, shutil, logging
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+from interop_dump_cache import write_file_atomic
+from interop_data_plot import get_cycle_read_map
+from interop_data_plot import get_lane_read_index
+from interop_data_plot import get_intensity_medians
+
+CYCLE_STATE_FILE = 'state.json'
+CYCLE_STATE_SECTIONS = (
+    'Q2030', 'Extraction', 'EmpiricalPhasing', 'Error', 'QByLane')
+
+def get_current_cycle(data, sections=CYCLE_STATE_SECTIONS):
+    """
+    A function for finding the latest cycle with metrics in any of the cycle sections
+
+    :param data: A dict or Mapping of section name and Pandas dataframe
+    :param sections: A list of cycle indexed section names
+    :returns: Latest cycle number, or 0 if there are no cycle metrics
+    """
+    current_cycle = 0
+    for section in sections:
+        df = data.get(section)
+        if df is not None and \
+           'Cycle' in df.columns and \
+           len(df.index) > 0:
+            current_cycle = max(current_cycle, int(df['Cycle'].max()))
+    return current_cycle
+
+
+def get_new_cycle_rows(df, first_cycle, last_cycle):
+    if df is None or \
+       'Cycle' not in df.columns:
+        return pd.DataFrame(columns=['Lane', 'Cycle'])
+    cycles = df['Cycle'].astype(int)
+    return df[(cycles >= first_cycle) & (cycles <= last_cycle)].copy()
+
+
+def aggregate_extraction_cycles(extractionDf, runinfoDf):
+    """
+    A function for aggregating new Extraction rows
+
+    :param extractionDf: A Pandas dataframe with the Extraction rows of the new cycles
+    :param runinfoDf: A Pandas dataframe from read_runinfo_xml
+    :returns: A tuple of (per lane and cycle median of MaxIntensity columns, tile rows of the first cycle of each read)
+    """
+    intensity_columns, medians = \
+        get_intensity_medians(extractionDf)
+    intensity = medians.reset_index()
+    extractionDf['Cycle'] = extractionDf['Cycle'].astype(int)
+    cycle_map = \
+        get_cycle_read_map(extractionDf['Cycle'].values, runinfoDf)
+    first_cycle = \
+        extractionDf.loc[
+            (cycle_map['read_cycle'] == 1).values,
+            ['Lane', 'Tile', 'Cycle'] + intensity_columns].\
+        reset_index(drop=True)
+    return intensity, first_cycle
+
+
+def aggregate_q2030_cycles(q2030Df):
+    """
+    A function for aggregating new Q2030 rows
+
+    :param q2030Df: A Pandas dataframe with the Q2030 rows of the new cycles
+    :returns: A Pandas dataframe with per lane and cycle Q30 and Total sums and MedianQScore mean
+    """
+    median_qscore = q2030Df['MedianQScore'].astype(int)
+    return \
+        pd.DataFrame({
+            'Lane': q2030Df['Lane'].astype(int).values,
+            'Cycle': q2030Df['Cycle'].astype(int).values,
+            'Q30': q2030Df['Q30'].astype(int).values,
+            'Total': q2030Df['Total'].astype(int).values,
+            'MedianQScore': np.where(median_qscore > 50, 0, median_qscore)}).\
+        groupby(['Lane', 'Cycle']).\
+        agg({'Q30': 'sum', 'Total': 'sum', 'MedianQScore': 'mean'}).\
+        reset_index()
+
+
+def aggregate_qbylane_cycles(qByLane):
+    """
+    A function for aggregating new QByLane rows
+
+    :param qByLane: A Pandas dataframe with the QByLane rows of the new cycles
+    :returns: A Pandas dataframe with per lane and cycle sums of the Bin columns and a Rows count
+    """
+    bin_columns = [
+        c for c in qByLane.columns
+            if c.startswith('Bin_')]
+    qByLane_filt = \
+        qByLane[qByLane['Lane'].isin(range(0, 9))][['Lane', 'Cycle'] + bin_columns].\
+        fillna(0).\
+        astype(np.int64)
+    qByLane_filt['Rows'] = 1
+    return \
+        qByLane_filt.\
+            groupby(['Lane', 'Cycle']).\
+            sum().\
+            reset_index()
+
+
+def aggregate_phasing_cycles(empiricalPhasingDf):
+    """
+    A function for aggregating new EmpiricalPhasing rows
+
+    :param empiricalPhasingDf: A Pandas dataframe with the EmpiricalPhasing rows of the new cycles
+    :returns: A Pandas dataframe with per lane and cycle Phasing and Prephasing medians, Tile is set to 0
+    """
+    phasing = \
+        pd.DataFrame({
+            'Lane': empiricalPhasingDf['Lane'].astype(int).values,
+            'Cycle': empiricalPhasingDf['Cycle'].astype(int).values,
+            'Phasing': empiricalPhasingDf['Phasing'].astype(float).values,
+            'Prephasing': empiricalPhasingDf['Prephasing'].astype(float).values}).\
+        groupby(['Lane', 'Cycle'])[['Phasing', 'Prephasing']].\
+        median().\
+        reset_index()
+    phasing.insert(1, 'Tile', 0)
+    return phasing
+
+
+def aggregate_error_cycles(errorDf):
+    """
+    A function for aggregating new Error rows
+
+    :param errorDf: A Pandas dataframe with the Error rows of the new cycles
+    :returns: A Pandas dataframe with per lane and cycle ErrorRate sum and count
+    """
+    error_rate = errorDf['ErrorRate'].astype(float)
+    return \
+        pd.DataFrame({
+            'Lane': errorDf['Lane'].astype(int).values,
+            'Cycle': errorDf['Cycle'].astype(int).values,
+            'ErrorRateSum': error_rate.fillna(0).values,
+            'ErrorRateCount': error_rate.notna().astype(int).values}).\
+        groupby(['Lane', 'Cycle']).\
+        sum().\
+        reset_index()
+
+
+def get_error_data_from_cycle_aggregates(errorCycleDf, runinfoDf):
+    """
+    A function for calculating the error columns of the summary table from the per cycle aggregates
+
+    The output matches get_data_from_errorDf for the full Error section.
+
+    :param errorCycleDf: A Pandas dataframe from aggregate_error_cycles
+    :param runinfoDf: A Pandas dataframe from read_runinfo_xml
+    :returns: A Pandas dataframe with lane_id, read_id, error_cycles and error_rate columns
+    """
+    try:
+        cycle_map = \
+            get_cycle_read_map(errorCycleDf['Cycle'].values, runinfoDf)
+        mask = (cycle_map['read_cycle'] < cycle_map['read_cycles']).values # skip last cycle of each read
+        lane_data = \
+            pd.DataFrame({
+                'lane_id': errorCycleDf['Lane'].values[mask],
+                'read_id': cycle_map['read_id'].values[mask],
+                'Cycle': errorCycleDf['Cycle'].values[mask],
+                'ErrorRateSum': errorCycleDf['ErrorRateSum'].values[mask],
+                'ErrorRateCount': errorCycleDf['ErrorRateCount'].values[mask]}).\
+            groupby(['lane_id', 'read_id']).\
+            agg({'Cycle': 'nunique', 'ErrorRateSum': 'sum', 'ErrorRateCount': 'sum'}).\
+            reindex(get_lane_read_index(errorCycleDf['Lane'].values, runinfoDf))
+        error_rates = list()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_rates = \
+                lane_data['ErrorRateSum'].values / lane_data['ErrorRateCount'].values
+        for error_rate in mean_rates:
+            error_rate = '{0:.3f}'.format(error_rate)
+            if error_rate == 'nan':
+                error_rate = 0
+            error_rates.append(error_rate)
+        error_data = \
+            pd.DataFrame({
+                'lane_id': lane_data.index.get_level_values('lane_id'),
+                'read_id': lane_data.index.get_level_values('read_id'),
+                'error_cycles': lane_data['Cycle'].fillna(0).astype(int).astype(str).values,
+                'error_rate': error_rates})
+        error_data['lane_id'] = error_data['lane_id'].astype(int)
+        error_data['read_id'] = error_data['read_id'].astype(int)
+        return error_data
+    except Exception as e:
+        raise ValueError('Failed to get error data from cycle aggregates, error: {0}'.format(e))
+
+
+class InteropCycleState:
+    """
+    Per lane and cycle aggregates of a run, kept on disk between polls of an in-progress run
+
+    Each poll only aggregates the cycles after the last processed cycle and appends them to the
+    stored aggregates. The latest cycle is held back till the next cycle shows up (or the run has
+    finished), as its metrics may still be written. Rows arriving later for an already processed
+    cycle are ignored.
+
+    :param state_dir: State directory path, one sub dir is used for each run
+    :param run_name: Run name
+    """
+    aggregate_names = (
+        'intensity', 'first_cycle_extraction', 'q2030', 'qbylane', 'phasing', 'error')
+
+    def __init__(self, state_dir, run_name):
+        self.state_dir = state_dir
+        self.run_name = run_name
+        self.run_dir = os.path.join(state_dir, run_name)
+        self.last_cycle_processed = 0
+        self.total_cycles = None
+        self.aggregates = dict()
+        self.load()
+
+    def get_aggregate_path(self, name):
+        return os.path.join(self.run_dir, '{0}.feather'.format(name))
+
+    def load(self):
+        """
+        Load the state from the run dir, aggregate rows after the watermark are dropped
+        """
+        state_file = os.path.join(self.run_dir, CYCLE_STATE_FILE)
+        if not os.path.exists(state_file):
+            return
+        try:
+            with open(state_file, 'r') as fp:
+                state = json.load(fp)
+            aggregates = dict()
+            last_cycle = int(state.get('last_cycle_processed'))
+            for name in self.aggregate_names:
+                path = self.get_aggregate_path(name)
+                if os.path.exists(path):
+                    df = feather.read_feather(path)
+                    aggregates.update({
+                        name: df[df['Cycle'] <= last_cycle].reset_index(drop=True)})
+            self.last_cycle_processed = last_cycle
+            self.total_cycles = state.get('total_cycles')
+            self.aggregates = aggregates
+        except Exception as e:
+            logging.warning(
+                'Failed to load cycle state for run {0}, starting again, error: {1}'.\
+                    format(self.run_name, e))
+            self.reset()
+
+    def reset(self):
+        self.last_cycle_processed = 0
+        self.total_cycles = None
+        self.aggregates = dict()
+
+    def clear(self):
+        """
+        Remove the stored state for this run
+        """
+        self.reset()
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def is_complete(self):
+        return self.total_cycles is not None and \
+               self.last_cycle_processed >= self.total_cycles
+
+    def update(self, data, runinfoDf):
+        """
+        Aggregate the new complete cycles from the interop sections and merge them into the state
+
+        :param data: A dict or Mapping of section name and Pandas dataframe
+        :param runinfoDf: A Pandas dataframe from read_runinfo_xml
+        :returns: A list of the newly processed cycles
+        """
+        try:
+            total_cycles = int(runinfoDf['cycles'].astype(int).sum())
+            if self.total_cycles is not None and \
+               self.total_cycles != total_cycles:
+                logging.warning(
+                    'Total cycles changed for run {0}, starting again'.format(self.run_name))
+                self.reset()
+            self.total_cycles = total_cycles
+            current_cycle = get_current_cycle(data)
+            last_cycle = current_cycle
+            if current_cycle < total_cycles:
+                last_cycle = current_cycle - 1
+            first_cycle = self.last_cycle_processed + 1
+            if last_cycle < first_cycle:
+                return list()
+            new_aggregates = dict()
+            extractionDf = \
+                get_new_cycle_rows(data.get('Extraction'), first_cycle, last_cycle)
+            if len(extractionDf.index) > 0:
+                intensity, first_cycle_extraction = \
+                    aggregate_extraction_cycles(extractionDf, runinfoDf)
+                new_aggregates.update({
+                    'intensity': intensity,
+                    'first_cycle_extraction': first_cycle_extraction})
+            q2030Df = \
+                get_new_cycle_rows(data.get('Q2030'), first_cycle, last_cycle)
+            if len(q2030Df.index) > 0:
+                new_aggregates.update({
+                    'q2030': aggregate_q2030_cycles(q2030Df)})
+            qByLane = \
+                get_new_cycle_rows(data.get('QByLane'), first_cycle, last_cycle)
+            if len(qByLane.index) > 0:
+                new_aggregates.update({
+                    'qbylane': aggregate_qbylane_cycles(qByLane)})
+            empiricalPhasingDf = \
+                get_new_cycle_rows(data.get('EmpiricalPhasing'), first_cycle, last_cycle)
+            if len(empiricalPhasingDf.index) > 0:
+                new_aggregates.update({
+                    'phasing': aggregate_phasing_cycles(empiricalPhasingDf)})
+            errorDf = \
+                get_new_cycle_rows(data.get('Error'), first_cycle, last_cycle)
+            if len(errorDf.index) > 0:
+                new_aggregates.update({
+                    'error': aggregate_error_cycles(errorDf)})
+            for name, df in new_aggregates.items():
+                if name in self.aggregates:
+                    df = \
+                        pd.concat(
+                            [self.aggregates.get(name), df],
+                            ignore_index=True)
+                self.aggregates.update({name: df})
+            self.last_cycle_processed = last_cycle
+            return list(range(first_cycle, last_cycle + 1))
+        except Exception as e:
+            raise ValueError(
+                    'Failed to update cycle state for run {0}, error: {1}'.\
+                        format(self.run_name, e))
+
+    def get(self, name):
+        """
+        :param name: Aggregate name
+        :returns: A copy of the aggregate Pandas dataframe, or None if there is no data yet
+        """
+        df = self.aggregates.get(name)
+        if df is None:
+            return None
+        return df.copy()
+
+    def save(self):
+        """
+        Write the aggregates and the watermark to the run dir, the watermark is written last
+        """
+        try:
+            os.makedirs(self.run_dir, exist_ok=True)
+            for name, df in self.aggregates.items():
+                write_file_atomic(
+                    self.get_aggregate_path(name),
+                    lambda path: feather.write_feather(df, path))
+            def write_json(path):
+                with open(path, 'w') as fp:
+                    json.dump({
+                        'run_name': self.run_name,
+                        'last_cycle_processed': self.last_cycle_processed,
+                        'total_cycles': self.total_cycles,
+                        'updated': time.time()}, fp)
+            write_file_atomic(
+                os.path.join(self.run_dir, CYCLE_STATE_FILE),
+                write_json)
+        except Exception as e:
+            raise ValueError(
+                    'Failed to save cycle state for run {0}, error: {1}'.\
+                        format(self.run_name, e))
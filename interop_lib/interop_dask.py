@@ -0,0 +1,299 @@
+import os, logging
+import pandas as pd
+try:
+    import dask
+    import dask.dataframe as dd
+    from dask import delayed
+    from distributed import Client, LocalCluster
+except ImportError:
+    dask = None
+from interop_data_plot import SEQRUN_FEATURE_SECTIONS
+from interop_data_plot import read_interop_data
+from interop_data_plot import read_runinfo
+from interop_data_plot import RunMetrics
+from interop_data_plot import get_run_summary_stats
+from interop_data_plot import get_run_features
+from interop_binary_reader import read_interop_binary_data
+
+DASK_RUN_FUNCTIONS = ('summary', 'features')
+
+
+def check_dask():
+    if dask is None:
+        raise ValueError('dask and distributed packages are required for multi-run processing')
+
+
+def get_dask_client(
+    scheduler_address=None, n_workers=None, threads_per_worker=1, memory_limit='auto',
+    dashboard_address=':8787'):
+    """
+    A function for connecting to a dask scheduler, or starting a local cluster of worker processes
+
+    The returned client is the default scheduler for the dask functions in this module.
+    Parsing a run holds the GIL for most of the time, so the local cluster uses one process
+    per worker and one thread per process by default. Use close_dask_client to stop the
+    client and its local cluster.
+
+    :param scheduler_address: Address of a running dask scheduler, default None for a new LocalCluster
+    :param n_workers: Number of worker processes of the local cluster, default None for one per core
+    :param threads_per_worker: Number of threads per worker process, default 1
+    :param memory_limit: Memory limit per worker process, e.g. '4GB', default 'auto'
+    :param dashboard_address: Dashboard address of the local cluster, default ':8787'
+    :returns: A distributed Client object
+    """
+    try:
+        check_dask()
+        if scheduler_address is not None:
+            client = Client(scheduler_address)
+        else:
+            cluster = \
+                LocalCluster(
+                    n_workers=n_workers,
+                    threads_per_worker=threads_per_worker,
+                    processes=True,
+                    memory_limit=memory_limit,
+                    dashboard_address=dashboard_address)
+            client = Client(cluster)
+        logging.info('Dask dashboard: {0}'.format(client.dashboard_link))
+        return client
+    except Exception as e:
+        raise ValueError('Failed to start dask client, error: {0}'.format(e))
+
+
+def close_dask_client(client):
+    """
+    A function for closing a client from get_dask_client, with the worker processes and dashboard of its local cluster
+
+    The scheduler and workers are not stopped if the client was connected to a running scheduler.
+
+    :param client: A distributed Client object
+    """
+    cluster = client.cluster
+    client.close()
+    if cluster is not None:
+        cluster.close()
+
+
+def load_run_metrics(run, sections=None, cache_dir=None):
+    """
+    A function for reading the interop sections of one run
+
+    Runs with an interop_dump are read from the dumptext output, with the section cache if
+    cache_dir is set. Other runs are read from the InterOp binary files of run_path.
+
+    :param run: A dict with run_id and run_path, and optional interop_dump and runinfo_xml, see read_runs_for_batch
+    :param sections: A list of section names, default SEQRUN_FEATURE_SECTIONS
+    :param cache_dir: Interop section cache dir for the dumptext output, default None
+    :returns: A RunMetrics object
+    """
+    if sections is None:
+        sections = SEQRUN_FEATURE_SECTIONS
+    run_path = run.get('run_path')
+    runinfo_xml = run.get('runinfo_xml')
+    if runinfo_xml is None:
+        runinfo_xml = os.path.join(run_path, 'RunInfo.xml')
+    interop_dump = run.get('interop_dump')
+    if interop_dump is not None:
+        data = \
+            read_interop_data(
+                filepath=interop_dump,
+                sections=sections,
+                use_cache=cache_dir is not None,
+                cache_dir=cache_dir)
+    else:
+        data = \
+            read_interop_binary_data(
+                run_path=run_path,
+                sections=sections)
+    return RunMetrics(data, read_runinfo(runinfo_xml))
+
+
+def read_run_sections(run, sections=None, cache_dir=None):
+    """
+    A function for reading the normalized interop sections of one run, with a seqrun_id column
+
+    :param run: A dict with run_id and run_path, see load_run_metrics
+    :param sections: A list of section names, default SEQRUN_FEATURE_SECTIONS
+    :param cache_dir: Interop section cache dir, default None
+    :returns: A dict of section name and Pandas dataframe
+    """
+    if sections is None:
+        sections = SEQRUN_FEATURE_SECTIONS
+    run_metrics = \
+        load_run_metrics(
+            run=run,
+            sections=sections,
+            cache_dir=cache_dir)
+    output_dict = dict()
+    for section in sections:
+        df = run_metrics.get(section)
+        if df is None:
+            df = pd.DataFrame()
+        df = df.copy()
+        df.insert(0, 'seqrun_id', run.get('run_id'))
+        output_dict.update({section: df})
+    return output_dict
+
+
+def get_section_meta(run_sections, section):
+    return run_sections.get(section).iloc[:0]
+
+
+def get_section_partition(run_sections, section, columns):
+    return run_sections.get(section).reindex(columns=columns)
+
+
+def load_interop_sections_as_dask(runs, sections=None, cache_dir=None):
+    """
+    A function for loading the interop sections of many runs as dask dataframes, with one partition per run
+
+    Each run is parsed once by a worker for all the sections. Columns of a section are taken
+    from the first run and the other runs are aligned to them, e.g. Extraction channels
+    missing in a run are NaN. Nothing is read on the client, the first run is computed on
+    the cluster for the dataframe metadata.
+
+    :param runs: A list of dicts with run_id and run_path, see read_runs_for_batch
+    :param sections: A list of section names, default SEQRUN_FEATURE_SECTIONS
+    :param cache_dir: Interop section cache dir, default None
+    :returns: A dict of section name and dask dataframe, with seqrun_id as the first column
+    """
+    try:
+        check_dask()
+        if len(runs) == 0:
+            raise ValueError('No run found')
+        if sections is None:
+            sections = SEQRUN_FEATURE_SECTIONS
+        run_sections = [
+            delayed(read_run_sections)(
+                run,
+                sections=sections,
+                cache_dir=cache_dir,
+                dask_key_name='read_run_sections-{0}'.format(run.get('run_id')))
+                for run in runs]
+        metas = \
+            dask.compute(
+                *[delayed(get_section_meta)(run_sections[0], section)
+                    for section in sections])
+        output_dict = dict()
+        for section, meta in zip(sections, metas):
+            output_dict.update({
+                section: dd.from_delayed(
+                    [delayed(get_section_partition)(r, section, list(meta.columns))
+                        for r in run_sections],
+                    meta=meta,
+                    verify_meta=False)})
+        return output_dict
+    except Exception as e:
+        raise ValueError('Failed to load interop sections with dask, error: {0}'.format(e))
+
+
+def process_run_for_dask(run, function, sections=None, cache_dir=None):
+    """
+    A function for calculating one per run table in a dask worker, errors are returned as part of the result
+
+    :param run: A dict with run_id and run_path, see load_run_metrics
+    :param function: Name of the run function, one of DASK_RUN_FUNCTIONS
+    :param sections: A list of section names, default SEQRUN_FEATURE_SECTIONS
+    :param cache_dir: Interop section cache dir, default None
+    :returns: A dict with run_id, status, error and data (a Pandas dataframe or None)
+    """
+    result = {'run_id': run.get('run_id'), 'status': 'success', 'error': '', 'data': None}
+    try:
+        run_metrics = \
+            load_run_metrics(
+                run=run,
+                sections=sections,
+                cache_dir=cache_dir)
+        if function == 'features':
+            data = get_run_features(run_metrics, seqrun_id=run.get('run_id'))
+        else:
+            data = get_run_summary_stats(run_metrics)
+            data.insert(0, 'seqrun_id', run.get('run_id'))
+        result.update({'data': data})
+    except Exception as e:
+        result.update({
+            'status': 'failed',
+            'error': '{0}: {1}'.format(type(e).__name__, e)})
+    return result
+
+
+def compute_multi_run_table(runs, function, cache_dir=None):
+    """
+    A function for calculating a per run table for many runs in parallel on the dask scheduler
+
+    A failed run is logged and returned in the failed list, it doesn't stop the job.
+
+    :param runs: A list of dicts with run_id and run_path, see read_runs_for_batch
+    :param function: Name of the run function, 'summary' for get_run_summary_stats or 'features' for get_run_features
+    :param cache_dir: Interop section cache dir, default None
+    :returns: A tuple of (Pandas dataframe of all the successful runs with a seqrun_id column, list of failed run dicts)
+    """
+    try:
+        check_dask()
+        if function not in DASK_RUN_FUNCTIONS:
+            raise ValueError('Unknown run function {0}'.format(function))
+        results = \
+            dask.compute(
+                *[delayed(process_run_for_dask)(
+                    run,
+                    function,
+                    cache_dir=cache_dir,
+                    dask_key_name='{0}-{1}'.format(function, run.get('run_id')))
+                    for run in runs])
+        tables = list()
+        failed = list()
+        for result in results:
+            if result.get('status') == 'success':
+                tables.append(result.get('data'))
+            else:
+                logging.error(
+                    'Run {0} failed, error: {1}'.format(result.get('run_id'), result.get('error')))
+                failed.append({
+                    'run_id': result.get('run_id'),
+                    'error': result.get('error')})
+        data = pd.DataFrame()
+        if len(tables) > 0:
+            data = pd.concat(tables, ignore_index=True)
+        logging.info(
+            'Finished {0} for {1} runs, {2} failed'.format(function, len(runs), len(failed)))
+        return data, failed
+    except Exception as e:
+        raise ValueError('Failed to compute {0} for runs, error: {1}'.format(function, e))
+
+
+def get_multi_run_summary_stats(runs, cache_dir=None):
+    """
+    A function for calculating the get_summary_stats table of many runs in parallel, see compute_multi_run_table
+
+    :param runs: A list of dicts with run_id and run_path, see read_runs_for_batch
+    :param cache_dir: Interop section cache dir, default None
+    :returns: A tuple of (Pandas dataframe with one row per run, lane and read, list of failed runs)
+    """
+    return compute_multi_run_table(runs, 'summary', cache_dir=cache_dir)
+
+
+def get_multi_run_features(runs, cache_dir=None, labels=None):
+    """
+    A function for calculating the sequencing run ML model features of many runs in parallel, see get_run_features
+
+    :param runs: A list of dicts with run_id and run_path, see read_runs_for_batch
+    :param cache_dir: Interop section cache dir, default None
+    :param labels: A Pandas dataframe with seqrun_id (and optional lane_id) and label columns (e.g. obs_failed) for the training data, default None
+    :returns: A tuple of (Pandas dataframe with one row per run and lane, list of failed runs)
+    """
+    data, failed = compute_multi_run_table(runs, 'features', cache_dir=cache_dir)
+    if labels is not None and \
+       len(data.index) > 0:
+        try:
+            keys = [c for c in ('seqrun_id', 'lane_id') if c in labels.columns]
+            if 'seqrun_id' not in keys:
+                raise KeyError('Missing column seqrun_id in labels')
+            labels = labels.copy()
+            labels['seqrun_id'] = labels['seqrun_id'].astype(str)
+            if 'lane_id' in keys:
+                labels['lane_id'] = labels['lane_id'].astype(int)
+            data['seqrun_id'] = data['seqrun_id'].astype(str)
+            data = data.merge(labels, how='left', on=keys)
+        except Exception as e:
+            raise ValueError('Failed to merge run features with labels, error: {0}'.format(e))
+    return data, failed
@@ -2,56 +2,69 @@ import json
 from shutil import copy2
 import pandas as pd
 import numpy as np
-import os, tempfile, subprocess, json, logging
+import os, time, shlex, cProfile, resource, tempfile, subprocess, json, logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from interop_data_plot import read_interop_data
-from interop_data_plot import read_runinfo_xml
-from interop_data_plot import get_summary_stats
+from interop_data_plot import read_interop_data_from_stream
+from interop_data_plot import read_runinfo
+from interop_data_plot import RunMetrics
+from interop_data_plot import get_run_summary_stats
+from interop_data_plot import get_intensity_medians
+from interop_data_plot import get_box_plot_stats
+from interop_data_plot import get_heatmap_values
+from interop_binary_reader import read_interop_binary_data
+from interop_cycle_state import InteropCycleState
+from interop_cycle_state import get_error_data_from_cycle_aggregates
+from interop_stage_timer import InteropStageTimer
+from interop_json import encode_chart_data
+from interop_json import write_interop_json
+from interop_json import INTEROP_JSON_COMPRESSION
 
-def get_intensity_data(extractionDf, colors):
+DB_INTEROP_SECTIONS = [
+    'Tile', 'Q2030', 'Extraction', 'EmpiricalPhasing', 'Error', 'QByLane']
+
+def get_intensity_data(run_metrics, colors):
+    try:
+        intensity_columns, medians = \
+            get_intensity_medians(run_metrics.get('Extraction'))
+        return format_intensity_data(medians, intensity_columns, colors)
+    except Exception as e:
+        raise ValueError(e)
+
+
+def format_intensity_data(medians, intensity_columns, colors):
+    """
+    A function for formatting the intensity chart data
+
+    :param medians: A Pandas dataframe of MaxIntensity medians indexed by sorted Lane and Cycle, see get_intensity_medians
+    :param intensity_columns: A list of MaxIntensity column names
+    :param colors: A list of colors for the intensity columns
+    :returns: A dict with chart_data and labels
+    """
     try:
-        intensity_columns = [
-            c for c in extractionDf.columns
-                if c.startswith('MaxIntensity_')]
-        if len(intensity_columns) == 0:
-            raise ValueError('No intensity columns found')
-        extractionDf['Lane'] = extractionDf['Lane'].astype(int)
-        extractionDf['Cycle'] = extractionDf['Cycle'].astype(int)
-        for c in intensity_columns:
-            extractionDf[c] = extractionDf[c].astype(float)
-        formatted_data = list()
-        for lane_id, l_data in extractionDf.groupby('Lane'):
-            for cycle, c_data in l_data.groupby('Cycle'):
-                row = {'Lane':lane_id, 'Cycle':cycle}
-                for c in intensity_columns:
-                    row.update({c: c_data[c].median()})
-                formatted_data.append(row)
-        formatted_data = pd.DataFrame(formatted_data)
         chart_data = dict()
         labels = []
-        for lane_id, l_data in formatted_data.groupby('Lane'):
-            labels = l_data.sort_values('Cycle').set_index('Cycle').index.tolist()
+        for lane_id, l_data in medians.groupby(level='Lane'):
+            labels = l_data.index.get_level_values('Cycle').values
             lane_data = list()
             for c, color in zip(intensity_columns, colors):
-                intensity_data = l_data.sort_values('Cycle').set_index('Cycle')[c].astype(int).values.tolist()
+                intensity_data = l_data[c].astype(int).values
                 lane_data.append({
                     "label": c,
                     "data": intensity_data,
                     "color": color })
-            chart_data.update({lane_id: lane_data})
+            chart_data.update({int(lane_id): lane_data})
         return {"chart_data":chart_data, "labels":labels}
     except Exception as e:
         raise ValueError(e)
 
 
-def get_table_data(tile, q2030, extraction, empiricalphasing, error, runinfo):
-    merged_data = \
-      get_summary_stats(
-        tileDf=tile,
-        q2030Df=q2030,
-        extractionDf=extraction,
-        empiricalPhasingDf=empiricalphasing,
-        errorDf=error,
-        runinfoDf=runinfo)
+def get_table_data(run_metrics):
+    merged_data = get_run_summary_stats(run_metrics)
+    return format_table_data(merged_data)
+
+
+def format_table_data(merged_data):
     merged_data.columns = \
         [c.capitalize().replace("_"," ") \
              for c in merged_data.columns]
@@ -66,107 +79,111 @@ def get_table_data(tile, q2030, extraction, empiricalphasing, error, runinfo):
     return table_data
 
 
-def get_surface_data(tilesDf):
-    surface1_data = dict()
-    surface2_data = dict()
-    tileDf_filt = tilesDf[tilesDf['Lane']!=''].copy()
-    tileDf_filt['Lane'] = tileDf_filt['Lane'].astype(int)
-    tileDf_filt['Tile'] = tileDf_filt['Tile'].astype(int)
-    tileDf_filt['ClusterCountPF'] = tileDf_filt['ClusterCountPF'].astype(float)
-    surface1_zdata = list()
-    surface2_zdata = list()
-    lanes = list()
-    for lane_id,l_data in tileDf_filt.groupby('Lane'):
-        lanes.append('Lane {0}'.format(lane_id))
-        surface1_zdata.append(
-            list(l_data[l_data['Tile'] < 2200].\
-                groupby('Tile')['ClusterCountPF'].agg('median').values))
-        surface2_zdata.append(
-            list(l_data[l_data['Tile'] >= 2200].\
-                groupby('Tile')['ClusterCountPF'].agg('median').values))
-    surface1_tiles = \
-        list(tileDf_filt[(tileDf_filt['Lane']==lane_id) & (tileDf_filt['Tile'] < 2200)].\
-             groupby('Tile').groups.keys())
-    surface2_tiles = \
-        list(tileDf_filt[(tileDf_filt['Lane']==lane_id) & (tileDf_filt['Tile'] >= 2200)].\
-             groupby('Tile').groups.keys())
-    surface1_tiles = [
-        'Tile {0}'.format(t)
-            for t in surface1_tiles
-                if int(t) < 2200]
-    surface2_tiles = [
-        'Tile {0}'.format(t)
-            for t in surface2_tiles
-                if int(t) >= 2200]
-    surface1_data = {
-        "z":surface1_zdata,
-        "x":surface1_tiles,
-        "y":lanes}
-    surface2_data = {
-        "z":surface2_zdata,
-        "x":surface2_tiles,
-        "y":lanes}
-    return {"surface1":surface1_data, "surface2":surface2_data}
-
-
-def get_cluster_and_density_counts(tilesDf, colors):
-    tilesDf.dropna(inplace=True)
-    tilesDf['ClusterCountPF'] = tilesDf['ClusterCountPF'].astype(float)
-    tilesDf['ClusterCount'] = tilesDf['ClusterCount'].astype(float)
-    tilesDf['Density'] = tilesDf['Density'].astype(float)
-    tilesDf['DensityPF'] = tilesDf['DensityPF'].astype(float)
-    tilesDf['Lane'] = tilesDf['Lane'].astype(int)
+def get_surface_data(run_metrics):
+    grid = run_metrics.get_flowcell_grid('ClusterCountPF')
+    surface_data = dict()
+    for surface_id in sorted(set(grid.keys()) | {1, 2}):
+        surface = grid.get(surface_id, {'z': [], 'x': [], 'y': []})
+        surface_data.update({
+            "surface{0}".format(surface_id): {
+                "z": get_heatmap_values(surface['z']),
+                "x": surface['x'],
+                "y": surface['y']}})
+    return surface_data
+
+
+def get_cluster_and_density_counts(run_metrics, colors, box_stats=False):
+    count_columns = ['ClusterCount', 'ClusterCountPF', 'Density', 'DensityPF']
+    tileDf = run_metrics.get('Tile')
+    has_counts = tileDf[count_columns].notna().all(axis=1).values
+    stats = None
+    if box_stats:
+        stats = \
+            get_box_plot_stats(
+                tileDf[has_counts],
+                value_columns=count_columns)
     density_box_data = list()
-    lane_data = list()
     clusterCount_box_data = list()
-    for lane_id,l_data in tilesDf.groupby('Lane'):
+    for lane_id, index in run_metrics.get_lane_groups('Tile').items():
+        index = index[has_counts[index]]
+        if len(index) == 0:
+            continue
+        l_data = tileDf.iloc[index]
+        lane_counts = dict()
+        for column in count_columns:
+            if stats is None:
+                lane_counts.update({column: l_data[column].values})
+            else:
+                column_stats = stats.loc[(lane_id, column)]
+                lane_counts.update({
+                    column: {
+                        'count': int(column_stats['count']),
+                        'mean': float(column_stats['mean']),
+                        'q1': float(column_stats['q1']),
+                        'median': float(column_stats['median']),
+                        'q3': float(column_stats['q3']),
+                        'lowerfence': float(column_stats['lowerfence']),
+                        'upperfence': float(column_stats['upperfence']),
+                        'outliers': column_stats['outliers']}})
         clusterCount_box_data.append({
-            'ClusterCount': l_data['ClusterCount'].values.tolist(),
-            'ClusterCountPF': l_data['ClusterCountPF'].values.tolist(),
+            'ClusterCount': lane_counts.get('ClusterCount'),
+            'ClusterCountPF': lane_counts.get('ClusterCountPF'),
             'lane_id': lane_id,
             'color': colors[lane_id - 1]})
         density_box_data.append({
-            'Density': l_data['Density'].values.tolist(),
-            'DensityPF': l_data['DensityPF'].values.tolist(),
+            'Density': lane_counts.get('Density'),
+            'DensityPF': lane_counts.get('DensityPF'),
             'lane_id': lane_id,
             'color': colors[lane_id - 1]})
     return clusterCount_box_data, density_box_data
 
 
-def get_qscore_bin_data(qByLane, colors):
-    key_cols = ['Lane']
-    for i in qByLane.columns.tolist():
-        if i.startswith("Bin_"):
-            key_cols.append(i)
-    qByLane.fillna(0,inplace=True)
-    qByLane_filt = qByLane[qByLane['Lane'].isin(['0','1','2','3','4','5','6','7','8'])].copy()
-    qByLane_filt = qByLane_filt.applymap(lambda x: int(x))
-    max_q30_line = \
-        int(qByLane_filt.groupby('Lane').agg('mean')[key_cols[-1]].max()) + 10000
-    key_cols.pop(0)
+def get_qscore_bin_data(run_metrics, colors):
+    qByLane = run_metrics.get('QByLane')
+    key_cols = [
+        c for c in qByLane.columns
+            if c.startswith("Bin_")]
+    qByLane_filt = qByLane[qByLane['Lane'].isin(range(0, 9))]
+    lane_means = \
+        qByLane_filt[key_cols].\
+            fillna(0).\
+            astype(np.int64).\
+            groupby(qByLane_filt['Lane'].values).\
+            mean()
+    lane_means.index.name = 'Lane'
+    return format_qscore_bin_data(lane_means, colors)
+
+
+def format_qscore_bin_data(lane_means, colors):
+    key_cols = lane_means.columns.tolist()
     qscore_dist_data = list()
-    for lane_id,l_data in qByLane_filt.groupby('Lane'):
+    for lane_id, l_data in lane_means.iterrows():
         lane_id = int(lane_id)
         qscore_dist_data.append({
             "label": 'Lane {0}'.format(lane_id),
-            "data": list(l_data[key_cols].mean().astype(int).values.tolist()),
+            "data": l_data[key_cols].astype(int).values,
             "backgroundColor":colors[lane_id - 1]})
     return {'data': qscore_dist_data, 'labels': key_cols}
 
 
-def get_QScore_by_cycle_data(q2030Df, colors):
-    q2030Df['Lane'] = q2030Df['Lane'].astype(int)
-    q2030Df['Cycle'] = q2030Df['Cycle'].astype(int)
-    q2030Df['MedianQScore'] = q2030Df['MedianQScore'].astype(int)
-    q2030Df['MedianQScore'] = \
-        np.where(q2030Df['MedianQScore'] > 50,0,q2030Df['MedianQScore'])
-    q2030Df['Tile'] = q2030Df['Tile'].astype(int)
+def get_QScore_by_cycle_data(run_metrics, colors):
+    q2030Df = run_metrics.get('Q2030')
+    median_qscore = q2030Df['MedianQScore'].astype(int).values
+    cycle_means = \
+        pd.Series(np.where(median_qscore > 50, 0, median_qscore)).\
+            groupby([
+                q2030Df['Lane'].astype(int).rename('Lane'),
+                q2030Df['Cycle'].astype(int).rename('Cycle')]).\
+            mean()
+    return format_qscore_cycles_data(cycle_means, colors)
+
+
+def format_qscore_cycles_data(cycle_means, colors):
     qscore_bar_plots = list()
-    for lane_id,l_data in q2030Df.groupby('Lane'):
+    for lane_id, l_data in cycle_means.groupby(level='Lane'):
         lane_id = int(lane_id)
-        dataset = list(l_data.groupby('Cycle')['MedianQScore'].mean().values.tolist())
-        dataset = [int(i) for i in dataset]
-        labels = list(l_data.groupby('Cycle')['MedianQScore'].mean().index.tolist())
+        dataset = l_data.values.astype(int)
+        labels = l_data.index.get_level_values('Cycle').values
         qscore_bar_plots.append({
             'lane_id': lane_id,
             'labels': labels,
@@ -175,7 +192,18 @@ def get_QScore_by_cycle_data(q2030Df, colors):
         })
     return qscore_bar_plots
 
-def get_occupied_pass_filter(imaging_table_data):
+def get_occupied_pass_filter(imaging_table_data, chunk_size=None):
+    """
+    A function for the % Occupied vs % Pass Filter chart data from a interop_imaging_table output
+
+    Only Lane, Tile, % Occupied and % Pass Filter columns are read. With chunk_size the table is
+    read in chunks and the per tile means are calculated from running sums and counts, so the
+    memory use doesn't grow with the number of cycles.
+
+    :param imaging_table_data: Path to the interop_imaging_table output
+    :param chunk_size: Number of rows per chunk, default None for reading the whole table at once
+    :returns: A list of dicts with x, y, lane_id and color for each lane
+    """
     mod_headers = [
         'Lane', 'Tile', 'Cycle', 'Read', 'Cycle Within Read', 'Density(k/mm2)',
         'Density Pf(k/mm2)', 'Cluster Count (k)', 'Cluster Count Pf (k)', '% Pass Filter',
@@ -197,21 +225,46 @@ def get_occupied_pass_filter(imaging_table_data):
         'rgb(153, 102, 255)',
         'rgb(63, 245, 57)',
         'rgb(159, 20, 193)']
-    imaging_table = \
-        pd.read_csv(
+    read_options = {
+        'skiprows': 3,
+        'header': None,
+        'names': mod_headers,
+        'usecols': ['Lane', 'Tile', '% Occupied', '% Pass Filter'],
+        'dtype': {'% Occupied': float, '% Pass Filter': float},
+        'index_col': False}
+    if chunk_size is None:
+        imaging_table = \
+            pd.read_csv(
+                imaging_table_data,
+                **read_options)
+        data = \
+            imaging_table.groupby(['Lane', 'Tile']).\
+            agg(np.mean).\
+            reset_index()[['Lane', '% Occupied', '% Pass Filter']]
+    else:
+        totals = None
+        for chunk in pd.read_csv(
             imaging_table_data,
-            skiprows=3,
-            header=None,
-            names=mod_headers,
-            index_col=False)
-    data = \
-        imaging_table.groupby(['Lane', 'Tile']).\
-        agg(np.mean).\
-        reset_index()[['Lane', '% Occupied', '% Pass Filter']]
+            chunksize=chunk_size,
+            **read_options):
+            chunk_totals = \
+                chunk.groupby(['Lane', 'Tile'])[['% Occupied', '% Pass Filter']].\
+                agg(['sum', 'count'])
+            if totals is None:
+                totals = chunk_totals
+            else:
+                totals = totals.add(chunk_totals, fill_value=0)
+        if totals is None:
+            return list()
+        totals = totals.sort_index()
+        data = pd.DataFrame({
+            c: totals[(c, 'sum')] / totals[(c, 'count')].replace(0, np.nan)
+                for c in ('% Occupied', '% Pass Filter')}).\
+            reset_index()[['Lane', '% Occupied', '% Pass Filter']]
     dataset = list()
     for lane_id, l_data in data.groupby('Lane'):
-        x = l_data['% Occupied'].values.tolist()
-        y = l_data['% Pass Filter'].values.tolist()
+        x = l_data['% Occupied'].values
+        y = l_data['% Pass Filter'].values
         dataset.append({
             "x": x,
             "y": y,
@@ -219,7 +272,98 @@ def get_occupied_pass_filter(imaging_table_data):
             "color": colors[lane_id-1]})
     return dataset
 
-def get_interop_data_for_db(run_name, dump_file, runinfo_file, imaging_table_data=None):
+def get_cycle_state_chart_data(cycle_state, run_metrics, colors):
+    """
+    A function for building the cycle based charts and the summary table from the stored per cycle aggregates
+
+    :param cycle_state: A InteropCycleState object
+    :param run_metrics: A RunMetrics object for the run, only its Tile section and RunInfo are used
+    :param colors: A list of lane colors
+    :returns: A tuple of (table_data, intensity_data, qscore_dist_data, qscore_bar_plots)
+    """
+    intensityDf = cycle_state.get('intensity')
+    q2030Df = cycle_state.get('q2030')
+    qByLaneDf = cycle_state.get('qbylane')
+    if intensityDf is None or \
+       q2030Df is None or \
+       qByLaneDf is None:
+        raise ValueError(
+                'No complete cycle found for run {0}'.format(cycle_state.run_name))
+    intensity_columns = [
+        c for c in intensityDf.columns
+            if c.startswith('MaxIntensity_')]
+    intensity_data = \
+        format_intensity_data(
+            intensityDf.set_index(['Lane', 'Cycle']).sort_index(),
+            intensity_columns,
+            colors)
+    runinfoDf = run_metrics.runinfo
+    merged_data = \
+        get_run_summary_stats(
+            RunMetrics({
+                'Tile': run_metrics.get('Tile'),
+                'Q2030': q2030Df,
+                'Extraction': cycle_state.get('first_cycle_extraction'),
+                'EmpiricalPhasing': cycle_state.get('phasing')},
+                runinfoDf))
+    errorCycleDf = cycle_state.get('error')
+    if errorCycleDf is not None and \
+       len(errorCycleDf.index) > 0:
+        error_data = \
+            get_error_data_from_cycle_aggregates(
+                errorCycleDf=errorCycleDf,
+                runinfoDf=runinfoDf)
+        merged_data = \
+            merged_data.\
+                merge(error_data, how='left', on=['lane_id', 'read_id']).\
+                fillna(0)
+    table_data = format_table_data(merged_data)
+    bin_columns = [
+        c for c in qByLaneDf.columns
+            if c.startswith('Bin_')]
+    lane_data = qByLaneDf.groupby('Lane')[bin_columns + ['Rows']].sum()
+    lane_means = \
+        lane_data[bin_columns].div(lane_data['Rows'], axis=0)
+    qscore_dist_data = format_qscore_bin_data(lane_means, colors)
+    qscore_bar_plots = \
+        format_qscore_cycles_data(
+            q2030Df.set_index(['Lane', 'Cycle'])['MedianQScore'],
+            colors)
+    return table_data, intensity_data, qscore_dist_data, qscore_bar_plots
+
+
+def get_interop_data_for_db(
+    run_name, dump_file, runinfo_file, imaging_table_data=None,
+    use_cache=False, cache_dir=None, refresh_cache=False, cache_key='stat',
+    interop_data=None, cycle_state=None, stage_timer=None, json_format=1, fast_json=False,
+    box_stats=False, imaging_chunk_size=None, run_path=None):
+    """
+    A function for building the DB json fields of a run from a interop_dumptext output
+
+    With json_format 1 the charts are json strings and the returned dict can be written
+    with json.dump. With json_format 2 the charts are nested objects with NumPy arrays and
+    scalars, and with json_format 3 the numeric arrays are packed by pack_array. These are
+    not supported by json.dump, use write_interop_json or dumps_interop_json instead.
+    decode_interop_json returns the same chart data for all the formats.
+
+    :param run_name: Run name
+    :param dump_file: Path to the interop_dumptext output
+    :param runinfo_file: Path to the RunInfo.xml file
+    :param imaging_table_data: Path to the interop_imaging_table output, default None
+    :param use_cache: Toggle for the interop section cache, default False
+    :param cache_dir: Interop section cache dir, default None
+    :param refresh_cache: Toggle for refreshing the cached sections, default False
+    :param cache_key: Cache key type, stat, hash or run, default stat
+    :param interop_data: Interop sections already read from the dump, default None
+    :param cycle_state: A InteropCycleState for incremental runs, default None
+    :param stage_timer: A InteropStageTimer, default None
+    :param json_format: DB json format version, 1, 2 or 3, default 1
+    :param fast_json: Toggle for using orjson for the format 1 charts, default False
+    :param box_stats: Toggle for box plot stats instead of tile values, default False
+    :param imaging_chunk_size: Rows per chunk for the imaging table, default None
+    :param run_path: Path to the run, required for the run cache key, default None
+    :returns: A dict of the DB json fields
+    """
     try:
         colors = [
             'rgb(255, 99, 132, 0.8)',
@@ -230,86 +374,436 @@ def get_interop_data_for_db(run_name, dump_file, runinfo_file, imaging_table_dat
             'rgb(153, 102, 255, 0.8)',
             'rgb(63, 245, 57, 0.8)',
             'rgb(159, 20, 193, 0.8)']
-        data = read_interop_data(dump_file)
-        runinfoDf = read_runinfo_xml(runinfo_file)
-        extractionDf = data.get("Extraction")
-        intensity_data = get_intensity_data(extractionDf, colors)
-        tile = data.get('Tile')
-        q2030 = data.get('Q2030')
-        extraction = data.get('Extraction')
-        empiricalphasing = data.get('EmpiricalPhasing')
-        error = data.get('Error')
-        table_data = \
-            get_table_data(tile, q2030, extraction, empiricalphasing, error, runinfoDf)
-        surface_data = get_surface_data(tile)
-        clusterCount_box_data, density_box_data = \
-            get_cluster_and_density_counts(tile, colors)
-        qByLane = data.get('QByLane')
-        qscore_dist_data = get_qscore_bin_data(qByLane, colors)
-        qscore_bar_plots = get_QScore_by_cycle_data(q2030, colors)
-        occupied_data = ''
+        if stage_timer is None:
+            stage_timer = InteropStageTimer(run_name, log_stages=False)
+        data = interop_data
+        with stage_timer.stage('read_interop_data') as counts:
+            if data is None:
+                data = \
+                    read_interop_data(
+                        dump_file,
+                        sections=DB_INTEROP_SECTIONS,
+                        use_cache=use_cache,
+                        cache_dir=cache_dir,
+                        refresh_cache=refresh_cache,
+                        cache_key=cache_key,
+                        run_path=run_path)
+            counts.update({
+                'rows': sum(
+                    len(data.get(section))
+                        for section in DB_INTEROP_SECTIONS
+                            if data.get(section) is not None)})
+        with stage_timer.stage('read_runinfo'):
+            run_metrics = RunMetrics(data, read_runinfo(runinfo_file))
+            runinfoDf = run_metrics.runinfo
+        if cycle_state is not None:
+            with stage_timer.stage('cycle_state_update'):
+                cycle_state.update(data, runinfoDf)
+            with stage_timer.stage('cycle_state_charts'):
+                table_data, intensity_data, qscore_dist_data, qscore_bar_plots = \
+                    get_cycle_state_chart_data(cycle_state, run_metrics, colors)
+        else:
+            with stage_timer.stage('normalize') as counts:
+                counts.update({
+                    'rows': sum(
+                        len(run_metrics.get(section))
+                            for section in DB_INTEROP_SECTIONS
+                                if run_metrics.get(section) is not None)})
+            with stage_timer.stage('intensity_data'):
+                intensity_data = get_intensity_data(run_metrics, colors)
+            with stage_timer.stage('summary_stats'):
+                table_data = get_table_data(run_metrics)
+            with stage_timer.stage('qscore_bins_data'):
+                qscore_dist_data = get_qscore_bin_data(run_metrics, colors)
+            with stage_timer.stage('qscore_cycles_data'):
+                qscore_bar_plots = get_QScore_by_cycle_data(run_metrics, colors)
+        with stage_timer.stage('surface_data'):
+            surface_data = get_surface_data(run_metrics)
+        with stage_timer.stage('cluster_and_density_data'):
+            clusterCount_box_data, density_box_data = \
+                get_cluster_and_density_counts(
+                    run_metrics,
+                    colors,
+                    box_stats=box_stats)
+        occupied_data = '' if json_format == 1 else None
         if imaging_table_data is not None:
-            occupied_data = \
-                get_occupied_pass_filter(
-                    imaging_table_data=imaging_table_data)
-            occupied_data = json.dumps(occupied_data)
-        json_data = {
-            "run_name": run_name,
-            "table_data": table_data,
-            "flowcell_data": json.dumps(surface_data),
-            "intensity_data": json.dumps(intensity_data),
-            "cluster_count_data": json.dumps(clusterCount_box_data),
-            "density_data": json.dumps(density_box_data),
-            "qscore_bins_data": json.dumps(qscore_dist_data),
-            "qscore_cycles_data": json.dumps(qscore_bar_plots),
-            "occupied_pass_filter": occupied_data}
+            with stage_timer.stage('occupied_pass_filter'):
+                occupied_data = \
+                    get_occupied_pass_filter(
+                        imaging_table_data=imaging_table_data,
+                        chunk_size=imaging_chunk_size)
+                occupied_data = \
+                    encode_chart_data(
+                        occupied_data,
+                        json_format=json_format,
+                        fast_json=fast_json)
+        with stage_timer.stage('serialize_charts') as counts:
+            json_data = {
+                "run_name": run_name,
+                "table_data": table_data}
+            for key, chart_data in (
+                ("flowcell_data", surface_data),
+                ("intensity_data", intensity_data),
+                ("cluster_count_data", clusterCount_box_data),
+                ("density_data", density_box_data),
+                ("qscore_bins_data", qscore_dist_data),
+                ("qscore_cycles_data", qscore_bar_plots)):
+                json_data.update({
+                    key: encode_chart_data(
+                        chart_data,
+                        json_format=json_format,
+                        fast_json=fast_json)})
+            json_data.update({"occupied_pass_filter": occupied_data})
+            if json_format != 1:
+                json_data.update({"format_version": json_format})
+            counts.update({
+                'bytes': sum(
+                    len(v) for v in json_data.values()
+                        if isinstance(v, str))})
+        if cycle_state is not None:
+            with stage_timer.stage('cycle_state_save'):
+                cycle_state.save()
+            json_data.update({
+                "last_cycle_processed": cycle_state.last_cycle_processed})
         return json_data
     except:
         raise
 
 
+def start_interop_tool(exe, run_path, output_file):
+    """
+    A function for starting a InterOp tool (interop_dumptext or interop_imaging_table) in background
+
+    :param exe: Path to the InterOp exe, extra options can be added after the path
+    :param run_path: Path to the run
+    :param output_file: Path for the tool output
+    :returns: A subprocess.Popen object
+    """
+    cmd = shlex.split(exe) + [run_path]
+    with open(output_file, 'w') as fp:
+        process = \
+            subprocess.Popen(
+                cmd,
+                stdout=fp)
+    return process
+
+
+def wait_for_interop_tool(process):
+    """
+    A function for waiting for a InterOp tool started by start_interop_tool
+
+    :param process: A subprocess.Popen object
+    :raises: subprocess.CalledProcessError if the tool failed
+    """
+    returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, process.args)
+
+
 def generate_data_dumps_and_create_json_for_db(
-    run_id, run_path, output_dir, generate_imaging, interop_dumptext_exe, interop_imaging_tablet_exe):
+    run_id, run_path, output_dir, generate_imaging, interop_dumptext_exe, interop_imaging_tablet_exe,
+    cache_dir=None, refresh_cache=False, stream_dumptext=False, tee_dumptext=None,
+    binary_reader=False, state_dir=None, write_stages=False, profile=False,
+    json_format=1, fast_json=False, compression=None, box_stats=False,
+    imaging_chunk_size=None):
+    profiler = None
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
     try:
+        stage_timer = InteropStageTimer(run_id, log_stages=write_stages)
         with tempfile.TemporaryDirectory() as temp_dir :
             if not os.path.exists(run_path):
                 raise IOError('Run path {0} not found'.format(run_path))
+            if compression not in INTEROP_JSON_COMPRESSION:
+                raise ValueError('Unknown json compression {0}'.format(compression))
             final_json_output = \
-                os.path.join(output_dir, "{0}.json".format(run_id))
-            if os.path.exists(final_json_output):
+                os.path.join(
+                    output_dir,
+                    "{0}.json{1}".format(run_id, INTEROP_JSON_COMPRESSION.get(compression, '')))
+            cycle_state = None
+            if state_dir is not None:
+                cycle_state = InteropCycleState(state_dir, run_id)
+            elif os.path.exists(final_json_output):
                 raise IOError('Output file {0} already present'.format(final_json_output))
             dumptext_csv = \
                 os.path.join(temp_dir, "{0}.csv".format(run_id))
-            dumptext_cmd = \
-                "{0} {1} > {2}".\
-                    format(
-                        interop_dumptext_exe,
-                        run_path,
-                        dumptext_csv)
-            subprocess.check_call(dumptext_cmd, shell=True)
             imaging_csv = None
-            if generate_imaging:
-                imaging_csv = \
-                    os.path.join(temp_dir, "{0}_imaging.csv".format(run_id))
-                imaging_table_cmd = \
-                    "{0} {1} > {2}".\
-                        format(
-                            interop_imaging_tablet_exe,
-                            run_path,
-                            imaging_csv)
-                subprocess.check_call(imaging_table_cmd, shell=True)
-            temp_json_output = \
-                os.path.join(temp_dir, "{0}.json".format(run_id))
-            os.makedirs(output_dir, exist_ok=True)
-            json_data = \
-                get_interop_data_for_db(
-                    run_name=run_id,
-                    dump_file=dumptext_csv,
-                    runinfo_file=os.path.join(run_path, 'RunInfo.xml'),
-                    imaging_table_data=imaging_csv)
-            with open(temp_json_output, 'w') as fp:
-                json.dump(json_data, fp)
-            copy2(temp_json_output, final_json_output)
+            imaging_process = None
+            interop_data = None
+            dumptext_process = None
+            try:
+                if generate_imaging:
+                    imaging_csv = \
+                        os.path.join(temp_dir, "{0}_imaging.csv".format(run_id))
+                    imaging_process = \
+                        start_interop_tool(
+                            exe=interop_imaging_tablet_exe,
+                            run_path=run_path,
+                            output_file=imaging_csv)
+                if binary_reader:
+                    with stage_timer.stage('read_binary'):
+                        interop_data = \
+                            read_interop_binary_data(
+                                run_path=run_path,
+                                sections=DB_INTEROP_SECTIONS,
+                                min_cycle=\
+                                    cycle_state.last_cycle_processed \
+                                        if cycle_state is not None else None)
+                elif stream_dumptext:
+                    with stage_timer.stage('dumptext_stream'):
+                        dumptext_process = \
+                            subprocess.Popen(
+                                shlex.split(interop_dumptext_exe) + [run_path],
+                                stdout=subprocess.PIPE)
+                        interop_data = \
+                            read_interop_data_from_stream(
+                                dumptext_process.stdout,
+                                sections=DB_INTEROP_SECTIONS,
+                                tee_file=tee_dumptext)
+                        dumptext_process.stdout.close()
+                        wait_for_interop_tool(dumptext_process)
+                else:
+                    with stage_timer.stage('dumptext') as counts:
+                        dumptext_process = \
+                            start_interop_tool(
+                                exe=interop_dumptext_exe,
+                                run_path=run_path,
+                                output_file=dumptext_csv)
+                        wait_for_interop_tool(dumptext_process)
+                        counts.update({'bytes': os.path.getsize(dumptext_csv)})
+                temp_json_output = \
+                    os.path.join(temp_dir, "{0}.json".format(run_id))
+                os.makedirs(output_dir, exist_ok=True)
+                json_data = \
+                    get_interop_data_for_db(
+                        run_name=run_id,
+                        dump_file=dumptext_csv,
+                        runinfo_file=os.path.join(run_path, 'RunInfo.xml'),
+                        imaging_table_data=None,
+                        use_cache=cache_dir is not None,
+                        cache_dir=cache_dir,
+                        refresh_cache=refresh_cache,
+                        cache_key='run',
+                        run_path=run_path,
+                        interop_data=interop_data,
+                        cycle_state=cycle_state,
+                        stage_timer=stage_timer,
+                        json_format=json_format,
+                        fast_json=fast_json,
+                        box_stats=box_stats)
+                if imaging_process is not None:
+                    with stage_timer.stage('imaging_table_wait'):
+                        wait_for_interop_tool(imaging_process)
+                    with stage_timer.stage('occupied_pass_filter'):
+                        occupied_data = \
+                            get_occupied_pass_filter(
+                                imaging_table_data=imaging_csv,
+                                chunk_size=imaging_chunk_size)
+                        json_data.update({
+                            "occupied_pass_filter": \
+                                encode_chart_data(
+                                    occupied_data,
+                                    json_format=json_format,
+                                    fast_json=fast_json)})
+            finally:
+                for process in (dumptext_process, imaging_process):
+                    if process is not None and \
+                       process.poll() is None:
+                        process.kill()
+                        process.wait()
+            with stage_timer.stage('write_json') as counts:
+                write_interop_json(
+                    json_data,
+                    temp_json_output,
+                    fast_json=fast_json,
+                    compression=compression)
+                counts.update({'bytes': os.path.getsize(temp_json_output)})
+            with stage_timer.stage('copy_json'):
+                copy2(temp_json_output, final_json_output)
+        if write_stages:
+            stage_timer.write(
+                os.path.join(output_dir, "{0}_stages.json".format(run_id)))
+        return json_data
     except Exception as e:
         logging.error(e)
         raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            if os.path.exists(output_dir):
+                profiler.dump_stats(
+                    os.path.join(output_dir, "{0}.prof".format(run_id)))
+
+
+def read_runs_for_batch(manifest=None, runs_dir=None):
+    """
+    A function for listing the runs for batch processing
+
+    :param manifest: A csv file with run_id and run_path columns, and optional interop_dump and runinfo_xml columns
+    :param runs_dir: A dir of run folders, each with a RunInfo.xml file, folder name is used as run_id
+    :returns: A list of dicts with run_id and run_path, and interop_dump and runinfo_xml if they are in the manifest
+    """
+    try:
+        runs = list()
+        if manifest is not None:
+            manifest_data = pd.read_csv(manifest, dtype=str)
+            for i in ('run_id', 'run_path'):
+                if i not in manifest_data.columns:
+                    raise KeyError('Missing column {0} in manifest {1}'.format(i, manifest))
+            columns = [
+                c for c in ('run_id', 'run_path', 'interop_dump', 'runinfo_xml')
+                    if c in manifest_data.columns]
+            manifest_data = \
+                manifest_data[columns].\
+                    dropna(subset=['run_id', 'run_path'])
+            runs.extend(
+                manifest_data.\
+                    astype(object).\
+                    where(manifest_data.notna(), None).\
+                    to_dict(orient='records'))
+        if runs_dir is not None:
+            for run_id in sorted(os.listdir(runs_dir)):
+                run_path = os.path.join(runs_dir, run_id)
+                if os.path.exists(os.path.join(run_path, 'RunInfo.xml')):
+                    runs.append({'run_id': run_id, 'run_path': run_path})
+        return runs
+    except Exception as e:
+        raise ValueError('Failed to get runs for batch, error: {0}'.format(e))
+
+
+def set_worker_memory_limit(memory_limit=None):
+    """
+    A function for setting the address space limit of a batch worker process, used as the process pool initializer
+
+    The limit applies to the whole worker process for its lifetime, i.e. to every run it
+    processes, and it is inherited by the InterOp tools started by the worker.
+
+    :param memory_limit: Address space limit in bytes, default None for no limit
+    """
+    if memory_limit is not None:
+        _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(
+            resource.RLIMIT_AS,
+            (int(memory_limit), hard_limit))
+
+
+def process_run_for_batch(run_id, run_path, **kwargs):
+    """
+    A function for processing one run in a batch worker, errors are returned as part of the result
+
+    :param run_id: Run name
+    :param run_path: Path to the run
+    :param kwargs: Other arguments for generate_data_dumps_and_create_json_for_db
+    :returns: A dict with run_id, status, error and elapsed seconds
+    """
+    start_time = time.perf_counter()
+    result = {'run_id': run_id, 'run_path': run_path, 'status': 'success', 'error': ''}
+    try:
+        generate_data_dumps_and_create_json_for_db(
+            run_id=run_id,
+            run_path=run_path,
+            **kwargs)
+    except Exception as e:
+        result.update({
+            'status': 'failed',
+            'error': '{0}: {1}'.format(type(e).__name__, e)})
+    result.update({'elapsed': round(time.perf_counter() - start_time, 3)})
+    return result
+
+
+def generate_json_for_db_in_batch(
+    runs, output_dir, generate_imaging, interop_dumptext_exe, interop_imaging_tablet_exe,
+    workers=4, memory_limit=None, cache_dir=None, refresh_cache=False, summary_file=None,
+    stream_dumptext=False, binary_reader=False, write_stages=False, profile=False,
+    json_format=1, fast_json=False, compression=None, box_stats=False,
+    imaging_chunk_size=None):
+    """
+    A function for generating the DB json for many runs on a process pool
+
+    A failed run is logged and recorded in the summary, it doesn't stop the batch.
+
+    :param runs: A list of dicts with run_id and run_path, see read_runs_for_batch
+    :param output_dir: Output dir path
+    :param generate_imaging: Toggle for generating imaging data
+    :param interop_dumptext_exe: Path to InterOp dumptext exe
+    :param interop_imaging_tablet_exe: Path to InterOp imaging table exe
+    :param workers: Number of worker processes, default 4
+    :param memory_limit: Address space limit in bytes for each worker process and its subprocesses, default None
+    :param cache_dir: Interop section cache dir, default None
+    :param refresh_cache: Toggle for refreshing the interop section cache, default False
+    :param summary_file: Summary json output path, default batch_summary.json in output_dir
+    :param stream_dumptext: Toggle for parsing interop_dumptext stdout without a temp file, default False
+    :param binary_reader: Toggle for reading InterOp binary files directly, without interop_dumptext, default False
+    :param write_stages: Toggle for writing stage timings of each run to <run_id>_stages.json in output_dir, default False
+    :param profile: Toggle for writing a cProfile dump of each run to <run_id>.prof in output_dir, default False
+    :param json_format: DB json format version, 1 for charts as json strings, 2 for nested chart objects or 3 for nested chart objects with packed arrays, default 1
+    :param fast_json: Toggle for serializing with orjson if it is installed, default False
+    :param compression: None, gzip or zstd for compressing the DB json, default None
+    :param box_stats: Toggle for storing quartiles, whiskers and outliers per lane instead of all the tile counts, default False
+    :param imaging_chunk_size: Number of rows per chunk for reading the imaging table, default None for reading it at once
+    :returns: A list of dicts with run_id, run_path, status, error and elapsed seconds
+    """
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        if summary_file is None:
+            summary_file = os.path.join(output_dir, 'batch_summary.json')
+        results = list()
+        batch_start = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=set_worker_memory_limit,
+            initargs=(memory_limit,)) as executor:
+            futures = {
+                executor.submit(
+                    process_run_for_batch,
+                    run_id=run.get('run_id'),
+                    run_path=run.get('run_path'),
+                    output_dir=output_dir,
+                    generate_imaging=generate_imaging,
+                    interop_dumptext_exe=interop_dumptext_exe,
+                    interop_imaging_tablet_exe=interop_imaging_tablet_exe,
+                    cache_dir=cache_dir,
+                    refresh_cache=refresh_cache,
+                    stream_dumptext=stream_dumptext,
+                    binary_reader=binary_reader,
+                    write_stages=write_stages,
+                    profile=profile,
+                    json_format=json_format,
+                    fast_json=fast_json,
+                    compression=compression,
+                    box_stats=box_stats,
+                    imaging_chunk_size=imaging_chunk_size): run
+                    for run in runs}
+            for future in as_completed(futures):
+                run = futures.get(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {
+                        'run_id': run.get('run_id'),
+                        'run_path': run.get('run_path'),
+                        'status': 'failed',
+                        'error': '{0}: {1}'.format(type(e).__name__, e),
+                        'elapsed': None}
+                if result.get('status') == 'success':
+                    logging.info(
+                        'Run {0} finished in {1}s'.format(result.get('run_id'), result.get('elapsed')))
+                else:
+                    logging.error(
+                        'Run {0} failed, error: {1}'.format(result.get('run_id'), result.get('error')))
+                results.append(result)
+        summary = {
+            'total': len(results),
+            'success': len([r for r in results if r.get('status') == 'success']),
+            'failed': len([r for r in results if r.get('status') != 'success']),
+            'elapsed': round(time.perf_counter() - batch_start, 3),
+            'runs': results}
+        with open(summary_file, 'w') as fp:
+            json.dump(summary, fp, indent=2)
+        logging.info(
+            'Batch finished: {0} success, {1} failed'.\
+                format(summary.get('success'), summary.get('failed')))
+        return results
+    except Exception as e:
+        raise ValueError('Failed to generate json for batch, error: {0}'.format(e))
@@ -1,18 +1,376 @@
-import os,re
+import os,re,io,mmap
+from functools import lru_cache
+import xml.etree.ElementTree as ET
 import numpy as np
 import pandas as pd
 from collections import defaultdict
+from collections.abc import Mapping
 import seaborn as sns
-import iplotter
-from scipy.stats import linregress
 from IPython.display import HTML
+from interop_dump_cache import InteropDumpCache
+from interop_dump_cache import INTEROP_CACHE_MAX_SIZE
+from interop_report_render import plot_chart
 
-def read_interop_data(filepath):
+INTEROP_SKIPPED_COMMENTS = (
+  b'# Version',
+  b'# Column Count',
+  b'# Bin Count',
+  b'# Channel Count')
+
+INTEROP_ID_COLUMNS = ('Lane', 'Tile', 'Cycle', 'Read')
+INTEROP_COMPACT_ID_COLUMNS = INTEROP_ID_COLUMNS + ('Surface', 'Swath')
+
+RUNINFO_CACHE_SIZE = 32
+
+FLOWCELL_TILE_NAMING = {
+  'FourDigit': 1000,                                                            # surface, swath, tile (2 digits)
+  'FiveDigit': 10000}                                                           # surface, swath, section, tile (2 digits)
+
+SEQRUN_FEATURE_SECTIONS = [
+  'Tile', 'Q2030', 'Extraction', 'EmpiricalPhasing', 'Error']                   # sections used by get_run_features and get_run_summary_stats
+
+SEQRUN_FEATURE_COLUMNS = [
+  'q30_pct_mean', 'total_median', 'median_qscore', 'cluster_count_pct',
+  'densityPf_pct', 'MaxIntensity_A', 'MaxIntensity_G', 'MaxIntensity_T',
+  'MaxIntensity_C', 'Focus_A', 'Focus_G', 'Focus_T', 'Focus_C',
+  'error_rate', 'phasing_slope', 'phasing_offset', 'prephasing_slope',
+  'prephasing_offset']
+
+INTEROP_SECTION_DTYPES = {
+  'Tile': {'default': 'float64'},                                               # per tile values are exported as is
+  'Q2030': {
+    'default': 'float32',
+    'Q20': 'int64',
+    'Q30': 'int64',
+    'Total': 'int64',
+    'MedianQScore': 'int32'},
+  'Extraction': {
+    'default': 'float32',
+    'TimeStamp': 'int64'},
+  'Error': {'default': 'float32'},
+  'EmpiricalPhasing': {'default': 'float32'},
+  'CorrectedInt': {'default': 'float32'},
+  'QByLane': {'default': 'float32'},
+  'ExtendedTile': {'default': 'float32'},
+  'DynamicPhasing': {'default': 'float32'},
+  'Image': {'default': 'float32'},
+  'Q': {'default': 'float32'},
+  'Index': {'default': None}}
+
+def index_interop_dump_sections(buffer):
+  """
+  A function for finding the byte range of each metric block in a interop dumptext output
+
+  :param buffer: A bytes like object (or mmap) containing the dumptext output
+  :returns: A dict of section name and list of (start, end) byte offsets, starting at the column header line
+  """
+  sections = defaultdict(list)
+  size = len(buffer)
+  header = None
+  if buffer[:1] == b'#':
+    pos = 0
+  else:
+    pos = buffer.find(b'\n#')
+    pos = -1 if pos == -1 else pos + 1
+  while pos != -1 and pos < size:
+    line_end = buffer.find(b'\n', pos)
+    if line_end == -1:
+      line_end = size
+    next_comment = buffer.find(b'\n#', line_end)
+    block_end = size if next_comment == -1 else next_comment + 1
+    line = buffer[pos:line_end].strip()
+    if not line.startswith(INTEROP_SKIPPED_COMMENTS):
+      header = line.decode().strip('# ').split(',')[0]
+    data_start = line_end + 1
+    while header is not None and \
+          data_start < block_end:
+      data_line_end = buffer.find(b'\n', data_start, block_end)
+      if data_line_end == -1:
+        data_line_end = block_end
+      if b'Lane' in buffer[data_start:data_line_end].strip().split(b','):
+        sections[header].append((data_start, block_end))
+        break
+      data_start = data_line_end + 1
+    pos = -1 if next_comment == -1 else next_comment + 1
+  return sections
+
+def get_interop_section_dtypes(section, columns):
+  """
+  A function for building the explicit dtype schema for a metric section
+
+  :param section: Metric section name, e.g. Tile or Q2030
+  :param columns: List of column names from the section header line
+  :returns: A dict of column name and dtype for non-identifier columns
+  """
+  schema = INTEROP_SECTION_DTYPES.get(section, {'default': None})
+  dtypes = dict()
+  for c in columns:
+    if c in INTEROP_ID_COLUMNS:
+      continue
+    dtype = schema.get(c, schema.get('default'))
+    if dtype is not None:
+      dtypes.update({c: dtype})
+  return dtypes
+
+def parse_interop_rows(data, section, columns=None):
+  """
+  A function for parsing a block of metric rows using the Pandas C engine and the section dtype schema
+
+  :param data: A bytes object with the rows
+  :param section: Metric section name
+  :param columns: A list of column names, default None if the first line is the column header
+  :returns: A Pandas dataframe
+  """
+  if columns is None:
+    header_columns = data[:data.find(b'\n')].decode().strip().split(',')
+    kwargs = {'header': 0}
+  else:
+    header_columns = columns
+    kwargs = {'header': None, 'names': columns}
+  try:
+    df = \
+      pd.read_csv(
+        io.BytesIO(data),
+        dtype=get_interop_section_dtypes(section, header_columns),
+        index_col=False,
+        engine='c',
+        **kwargs)
+  except (ValueError, TypeError):
+    df = \
+      pd.read_csv(
+        io.BytesIO(data),
+        index_col=False,
+        engine='c',
+        **kwargs)
+  return df
+
+def downcast_interop_id_columns(df):
+  """
+  A function for converting Lane, Tile, Cycle and Read columns to int32, if they have no missing values
+
+  :param df: A Pandas dataframe
+  :returns: The same Pandas dataframe
+  """
+  for c in INTEROP_ID_COLUMNS:
+    if c in df.columns and \
+       pd.api.types.is_numeric_dtype(df[c]) and \
+       df[c].notna().all():
+      df[c] = df[c].astype('int32')
+  return df
+
+def compact_interop_section(df):
+  """
+  A function for converting a metric section to compact dtypes
+
+  Identifier columns (Lane, Tile, Cycle, Read, Surface, Swath) without missing values are converted
+  to the smallest unsigned int, float columns to float32, int columns to the smallest int which can
+  hold their values and string columns to category. Float32 keeps about 7 significant digits, so
+  compact Tile values are not exported verbatim.
+
+  :param df: A Pandas dataframe
+  :returns: A new Pandas dataframe
+  """
+  columns = dict()
+  for c in df.columns:
+    values = df[c]
+    if c in INTEROP_COMPACT_ID_COLUMNS and \
+       pd.api.types.is_numeric_dtype(values) and \
+       values.notna().all() and \
+       (len(values.index) == 0 or values.min() >= 0):
+      values = pd.to_numeric(values, downcast='unsigned')
+    elif pd.api.types.is_float_dtype(values):
+      values = values.astype(np.float32)
+    elif pd.api.types.is_integer_dtype(values):
+      values = pd.to_numeric(values, downcast='integer')
+    elif pd.api.types.is_object_dtype(values):
+      values = values.astype('category')
+    columns.update({c: values})
+  return pd.DataFrame(columns, columns=df.columns)
+
+def get_interop_memory_usage(data):
+  """
+  A function for reporting the memory footprint of parsed metric sections
+
+  :param data: A dict of section name and Pandas dataframe, or a InteropDumpData object (only the parsed sections are counted)
+  :returns: A Pandas dataframe with section, rows, columns and bytes, with a Total row at the end
+  """
+  if isinstance(data, InteropDumpData):
+    data = data.get_loaded_sections()
+  usage = list()
+  for section, df in data.items():
+    if df is None:
+      continue
+    usage.append({
+      'section': section,
+      'rows': len(df.index),
+      'columns': len(df.columns),
+      'bytes': int(df.memory_usage(index=True, deep=True).sum())})
+  usage = pd.DataFrame(usage, columns=['section', 'rows', 'columns', 'bytes'])
+  total = {
+    'section': 'Total',
+    'rows': int(usage['rows'].sum()),
+    'columns': int(usage['columns'].sum()),
+    'bytes': int(usage['bytes'].sum())}
+  return pd.concat([usage, pd.DataFrame([total])], ignore_index=True)
+
+def read_interop_section(buffer, section, ranges):
+  """
+  A function for parsing the byte ranges of a single metric section using the Pandas C engine
+
+  :param buffer: A bytes like object (or mmap) containing the dumptext output
+  :param section: Metric section name
+  :param ranges: A list of (start, end) byte offsets from index_interop_dump_sections
+  :returns: A Pandas dataframe with int32 identifier columns and typed metric columns
+  """
+  frames = [
+    parse_interop_rows(buffer[start:end], section)
+      for start, end in ranges]
+  if len(frames) == 1:
+    df = frames[0]
+  else:
+    df = pd.concat(frames, ignore_index=True)
+  return downcast_interop_id_columns(df)
+
+INTEROP_METRIC_SECTIONS = (
+  'CorrectedInt',
+  'Tile',
+  'Error',
+  'Q2030',
+  'Extraction',
+  'EmpiricalPhasing',
+  'QByLane',
+  'ExtendedTile',
+  'DynamicPhasing',
+  'Image',
+  'Q',
+  'Index')
+
+class InteropDumpData(Mapping):
+  """
+  A read-only dict like object for the metric sections of a interop dumptext output
+
+  The dump is scanned once for the byte range of each metric block and a section is
+  parsed only when it is accessed for the first time. Parsed sections are cached.
+
+  :param filepath: A interop dumptext output path
+  :param sections: A list of metric section names to expose, default all sections
+  :param cache: An optional InteropDumpCache object for storing parsed sections on disk
+  :param compact: Toggle for converting parsed sections with compact_interop_section, default False
+  """
+  def __init__(self, filepath, sections=None, cache=None, compact=False):
+    if sections is None:
+      sections = INTEROP_METRIC_SECTIONS
+    for key in sections:
+      if key not in INTEROP_METRIC_SECTIONS:
+        raise KeyError('Unknown interop metric section {0}'.format(key))
+    self.filepath = filepath
+    self.sections = tuple(sections)
+    self.cache = cache
+    self.compact = compact
+    self._data = dict()
+    self._buffer = None
+    self._ranges = None
+    if cache is not None:
+      self._ranges = cache.read_manifest()
+
+  def _get_buffer(self):
+    if self._buffer is None:
+      self._buffer = b''
+      with open(self.filepath,'rb') as fp:
+        if os.fstat(fp.fileno()).st_size > 0:
+          self._buffer = \
+            mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    return self._buffer
+
+  def _get_ranges(self):
+    if self._ranges is None:
+      self._ranges = \
+        dict(index_interop_dump_sections(self._get_buffer()))
+      if self.cache is not None:
+        self.cache.write_manifest(self._ranges)
+    return self._ranges
+
+  def __getitem__(self, key):
+    if key not in self.sections:
+      raise KeyError(key)
+    if key not in self._data:
+      ranges = self._get_ranges().get(key)
+      try:
+        if ranges is None:
+          df = pd.DataFrame()
+        elif self.cache is not None and \
+             self.cache.has_section(key):
+          df = self.cache.read_section(key)
+        else:
+          df = read_interop_section(self._get_buffer(), key, ranges)
+          if self.cache is not None:
+            self.cache.write_section(key, df)
+        if self.compact:
+          df = compact_interop_section(df)
+      except Exception as e:
+        raise ValueError(
+                'Failed to extract {0} data from interop dump, error:{1}'.\
+                  format(key, e))
+      self._data.update({key: df})
+    return self._data.get(key)
+
+  def __iter__(self):
+    return iter(self.sections)
+
+  def get_loaded_sections(self):
+    """
+    :returns: A dict of the already parsed section names and Pandas dataframes
+    """
+    return dict(self._data)
+
+  def memory_usage(self):
+    """
+    :returns: Memory footprint of the parsed sections, see get_interop_memory_usage
+    """
+    return get_interop_memory_usage(self._data)
+
+  def __len__(self):
+    return len(self.sections)
+
+  def __repr__(self):
+    return '{0}({1!r}, loaded={2})'.format(
+      self.__class__.__name__, self.filepath, list(self._data.keys()))
+
+  def close(self):
+    """
+    Release the memory mapped dump, already parsed sections are still available
+    """
+    if isinstance(self._buffer, mmap.mmap):
+      self._buffer.close()
+    self._buffer = None
+
+def read_interop_data(
+      filepath, sections=None, use_cache=False, cache_dir=None,
+      refresh_cache=False, cache_key='stat', max_cache_size=INTEROP_CACHE_MAX_SIZE,
+      compact=False, run_path=None):
   """
   This function reads a dump file generated by interop_dumptext tool and returns a list of Pandas dataframe
 
+  The dump is memory mapped and scanned once for the byte range of each metric block, and
+  each block is parsed by the Pandas C engine with an explicit dtype schema: int32 for
+  Lane, Tile, Cycle and Read (if they have no missing values) and float32 for metrics.
+  Sections are parsed lazily, when they are accessed for the first time. If use_cache is
+  True, parsed sections are stored as Feather files and later calls for the same dump
+  memory map them instead of parsing the text again. With compact=True ids are stored as the
+  smallest unsigned int and all metrics (including Tile) as float32, see compact_interop_section,
+  and the footprint of the parsed sections is reported by the memory_usage method.
+
   :param filepath: A interop dumptext output path
-  :returns: A dict containing following key and value of Pandas dataframes
+  :param sections: A list of metric section names to load, default None for all sections
+  :param use_cache: Toggle for the on-disk section cache, default False
+  :param cache_dir: Cache directory path, default .interop_cache next to the dump
+  :param refresh_cache: Toggle for removing the existing cache entry for this dump, default False
+  :param cache_key: Cache key type, 'stat' for path, size and mtime, 'hash' for file content or 'run'
+                    for the InterOp binary files of run_path, for a dump which is regenerated every time, default 'stat'
+  :param max_cache_size: Maximum cache size in bytes, least recently used dumps are removed first, default 5 GB
+  :param compact: Toggle for compact dtypes, default False
+  :param run_path: Path to the run folder of the dump, required for the 'run' cache key, default None
+  :returns: A dict like InteropDumpData object containing following key and value of Pandas dataframes
 
     * Tile
     * Q2030
@@ -31,104 +389,649 @@ def read_interop_data(filepath):
   try:
     if not os.path.exists(filepath):
       raise IOError('File {0} not found'.format(filepath))
-    data = defaultdict(list)
-    header = None
-    data_header = None
-    with open(filepath,'r') as fp:
-      for line in fp:
-        line = line.strip()
-        if line.startswith('#'):
-          if line.startswith('# Version') or \
-             line.startswith('# Column Count') or \
-             line.startswith('# Bin Count') or \
-             line.startswith('# Channel Count'):
-            pass
-          else:
-            header = line.strip('# ').split(',')[0]
-        else:
-          if header is not None:
-            if 'Lane' in line.split(','):
-              data_header = line.split(',')
-              continue
-            if data_header is not None:
-              data[header].append(dict(zip(data_header, line.split(','))))
-    list_of_metrix = [
-        'CorrectedInt',
-        'Tile',
-        'Error',
-        'Q2030',
-        'Extraction',
-        'EmpiricalPhasing',
-        'QByLane',
-        'ExtendedTile'
-        'DynamicPhasing',
-        'Image',
-        'Q',
-        'Index']
+    cache = None
+    if use_cache:
+      cache = \
+        InteropDumpCache(
+          filepath=filepath,
+          cache_dir=cache_dir,
+          cache_key=cache_key,
+          max_cache_size=max_cache_size,
+          run_path=run_path)
+      if refresh_cache:
+        cache.clear()
+    return \
+      InteropDumpData(
+        filepath=filepath,
+        sections=sections,
+        cache=cache,
+        compact=compact)
+  except Exception as e:
+    raise ValueError('Failed to extract data from interop dump, error:{0}'.format(e))
+
+class InteropStreamParser:
+  """
+  An incremental parser for interop dumptext output read from a stream, e.g. the tool stdout
+
+  Data is fed in blocks, only rows of the selected sections are kept and they are parsed in
+  chunks of chunk_size bytes, so the full text is never held in memory or written to disk.
+
+  :param sections: A list of metric section names to keep, default all sections
+  :param chunk_size: Size of text in bytes to collect before parsing, default 64 MB
+  :param compact: Toggle for converting the sections with compact_interop_section, default False
+  """
+  def __init__(self, sections=None, chunk_size=64 * 1024 * 1024, compact=False):
+    if sections is None:
+      sections = INTEROP_METRIC_SECTIONS
+    for key in sections:
+      if key not in INTEROP_METRIC_SECTIONS:
+        raise KeyError('Unknown interop metric section {0}'.format(key))
+    self.sections = tuple(sections)
+    self.chunk_size = chunk_size
+    self.compact = compact
+    self._frames = defaultdict(list)
+    self._carry = b''
+    self._header = None
+    self._columns = None
+    self._rows = list()
+    self._rows_size = 0
+
+  def _flush_rows(self):
+    if self._rows_size > 0:
+      df = \
+        parse_interop_rows(
+          b''.join(self._rows),
+          self._header,
+          columns=self._columns)
+      if self.compact:
+        df = compact_interop_section(df)
+      self._frames[self._header].append(df)
+    self._rows = list()
+    self._rows_size = 0
+
+  def _add_data(self, data):
+    if self._header is None:
+      return
+    if self._columns is None:
+      pos = 0
+      while pos < len(data):
+        line_end = data.find(b'\n', pos)
+        if line_end == -1:
+          line_end = len(data)
+        fields = data[pos:line_end].strip().split(b',')
+        pos = line_end + 1
+        if b'Lane' in fields:
+          self._columns = [f.decode() for f in fields]
+          break
+      data = data[pos:]
+    if self._columns is not None and \
+       self._header in self.sections and \
+       len(data) > 0:
+      self._rows.append(data)
+      self._rows_size += len(data)
+      if self._rows_size >= self.chunk_size:
+        self._flush_rows()
+
+  def _add_comment(self, line):
+    line = line.strip()
+    if not line.startswith(INTEROP_SKIPPED_COMMENTS):
+      self._flush_rows()
+      self._header = line.decode().strip('# ').split(',')[0]
+      self._columns = None
+
+  def feed(self, data):
+    """
+    :param data: A bytes object with the next part of the dump
+    """
+    data = self._carry + data
+    last_line_end = data.rfind(b'\n')
+    if last_line_end == -1:
+      self._carry = data
+      return
+    self._carry = data[last_line_end + 1:]
+    data = data[:last_line_end + 1]
+    pos = 0
+    size = len(data)
+    while pos < size:
+      if data[pos:pos + 1] == b'#':
+        line_end = data.find(b'\n', pos)
+        self._add_comment(data[pos:line_end])
+        pos = line_end + 1
+      else:
+        next_comment = data.find(b'\n#', pos)
+        block_end = size if next_comment == -1 else next_comment + 1
+        self._add_data(data[pos:block_end])
+        pos = block_end
+
+  def close(self):
+    """
+    :returns: A dict containing the selected metric sections as Pandas dataframes
+    """
+    if len(self._carry) > 0:
+      self.feed(b'\n')
+    self._flush_rows()
     output_dict = dict()
-    for key in list_of_metrix:
-      if data.get(key) is None:
+    for key in self.sections:
+      frames = self._frames.get(key)
+      if frames is None:
         output_dict.update({key: pd.DataFrame()})
       else:
-        output_dict.update({key: pd.DataFrame(data.get(key))})
+        df = \
+          downcast_interop_id_columns(
+            pd.concat(frames, ignore_index=True))
+        if self.compact:
+          df = compact_interop_section(df)
+        output_dict.update({key: df})
     return output_dict
+
+def read_interop_data_from_stream(
+      stream, sections=None, tee_file=None, block_size=8 * 1024 * 1024, compact=False):
+  """
+  This function reads interop dumptext output from a binary stream (e.g. subprocess stdout) and returns the metric sections
+
+  :param stream: A binary file like object
+  :param sections: A list of metric section names to load, default None for all sections
+  :param tee_file: An optional file path for writing a copy of the stream, for debugging
+  :param block_size: Size of each read from the stream in bytes, default 8 MB
+  :param compact: Toggle for compact dtypes, see compact_interop_section, default False
+  :returns: A dict containing the selected metric sections as Pandas dataframes, see read_interop_data
+  """
+  try:
+    parser = InteropStreamParser(sections=sections, compact=compact)
+    tee_fp = None
+    if tee_file is not None:
+      tee_fp = open(tee_file, 'wb')
+    try:
+      for data in iter(lambda: stream.read(block_size), b''):
+        if tee_fp is not None:
+          tee_fp.write(data)
+        parser.feed(data)
+    finally:
+      if tee_fp is not None:
+        tee_fp.close()
+    return parser.close()
   except Exception as e:
-    raise ValueError('Failed to extract data from interop dump, error:{0}'.format(e))
+    raise ValueError('Failed to extract data from interop stream, error:{0}'.format(e))
 
-def read_runinfo_xml(runInfoXml_path):
+def parse_runinfo_date(date):
   """
-  A function for reading RunInfo.xml file from Illumina sequencing run and returns data as Pandas DataFrame
+  A function for parsing the Date field of RunInfo.xml, e.g. 201001 (yymmdd) or 10/1/2020 1:23:45 PM
+
+  :param date: Date string from RunInfo.xml
+  :returns: A Pandas Timestamp, or None if the date is missing or can't be parsed
+  """
+  if date is None or \
+     date.strip() == '':
+    return None
+  date = date.strip()
+  try:
+    if re.match(r'^\d{6}$', date):
+      return pd.to_datetime(date, format='%y%m%d')
+    return pd.to_datetime(date)
+  except (ValueError, OverflowError):
+    return None
+
+def get_flowcell_layout_from_xml(layout):
+  """
+  A function for reading a FlowcellLayout element of RunInfo.xml
+
+  :param layout: A FlowcellLayout ElementTree element
+  :returns: A dict with lane_count, surface_count, swath_count, tile_count, section_count, tile_naming
+            and tiles (a list of tile ids from the TileSet, can be empty)
+  """
+  tile_set = layout.find('TileSet')
+  tiles = sorted(set(
+    int(t.text.strip().split('_')[-1])
+      for t in layout.iter('Tile')
+        if t.text is not None and t.text.strip() != ''))
+  tile_naming = None
+  if tile_set is not None:
+    tile_naming = tile_set.get('TileNamingConvention')
+  if tile_naming not in FLOWCELL_TILE_NAMING:
+    tile_naming = \
+      'FiveDigit' if len(tiles) > 0 and max(tiles) >= 10000 else 'FourDigit'
+  return {
+    'lane_count': int(layout.get('LaneCount', 1)),
+    'surface_count': int(layout.get('SurfaceCount', 1)),
+    'swath_count': int(layout.get('SwathCount', 1)),
+    'tile_count': int(layout.get('TileCount', 0)),
+    'section_count': int(layout.get('SectionPerLane', 1)),
+    'tile_naming': tile_naming,
+    'tiles': tiles}
+
+class RunInfo:
+  """
+  Run configuration and flowcell metadata from RunInfo.xml, see read_runinfo
+
+  Cycle lookup arrays are indexed by cycle number, index 0 and cycles outside the reads
+  have read id -1.
+
+  :param reads: A Pandas dataframe with read_id, cycles, start_cycle and index_read columns
+  :param run_id: Run id, default None
+  :param run_number: Run number, default None
+  :param flowcell: Flowcell id, default None
+  :param instrument: Instrument id, default None
+  :param date: Run date string from RunInfo.xml, default None
+  :param flowcell_layout: A dict from get_flowcell_layout_from_xml, default None
+  """
+  def __init__(self, reads, run_id=None, run_number=None, flowcell=None, instrument=None,
+               date=None, flowcell_layout=None):
+    self.reads = reads
+    self.run_id = run_id
+    self.run_number = run_number
+    self.flowcell = flowcell
+    self.instrument = instrument
+    self.date = date
+    self.run_date = parse_runinfo_date(date)
+    self.flowcell_layout = flowcell_layout
+    total_cycles = 0
+    if len(reads.index) > 0:
+      total_cycles = int((reads['start_cycle'] + reads['cycles']).max())
+    self.cycle_read = np.full(total_cycles + 1, -1, dtype=np.int64)
+    self.cycle_read_cycle = np.zeros(total_cycles + 1, dtype=np.int64)
+    self.cycle_read_cycles = np.zeros(total_cycles + 1, dtype=np.int64)
+    self.cycle_is_index = np.zeros(total_cycles + 1, dtype=bool)
+    for read_id, cycles, start_cycle, index_read in \
+      zip(reads['read_id'].values,
+          reads['cycles'].values,
+          reads['start_cycle'].values,
+          reads['index_read'].values):
+      read_cycles = slice(start_cycle + 1, start_cycle + cycles + 1)
+      self.cycle_read[read_cycles] = read_id
+      self.cycle_read_cycle[read_cycles] = np.arange(1, cycles + 1)
+      self.cycle_read_cycles[read_cycles] = cycles
+      self.cycle_is_index[read_cycles] = index_read == 'Y'
+
+  @property
+  def total_cycles(self):
+    return len(self.cycle_read) - 1
+
+  def get_cycle_read_map(self, cycles):
+    """
+    :param cycles: A list or array of cycle numbers
+    :returns: A Pandas dataframe same as get_cycle_read_map
+    """
+    cycles = np.asarray(cycles, dtype=np.int64)
+    valid = (cycles > 0) & (cycles < len(self.cycle_read))
+    idx = np.where(valid, cycles, 0)
+    return pd.DataFrame({
+      'read_id': self.cycle_read[idx],
+      'read_cycle': self.cycle_read_cycle[idx],
+      'read_cycles': self.cycle_read_cycles[idx]})
+
+  def __repr__(self):
+    return '{0}({1!r}, reads={2}, cycles={3})'.format(
+      self.__class__.__name__, self.run_id, len(self.reads.index), self.total_cycles)
+
+@lru_cache(maxsize=RUNINFO_CACHE_SIZE)
+def _parse_runinfo_xml(runInfoXml_path, mtime_ns, size):
+  run = ET.parse(runInfoXml_path).getroot().find('Run')
+  if run is None:
+    raise ValueError('Missing Run element')
+  reads_stat = list()
+  read_start = 0
+  for read in run.iter('Read'):
+    if read.get('NumCycles') is not None:
+      numcycle = int(read.get('NumCycles'))
+    else:
+      numcycle = int(read.get('LastCycle')) - int(read.get('FirstCycle')) + 1
+    reads_stat.append({
+      'read_id': int(read.get('Number')),
+      'cycles': numcycle,
+      'start_cycle': read_start,
+      'index_read': read.get('IsIndexedRead', 'N')})
+    read_start += numcycle
+  reads_stat = pd.DataFrame(reads_stat)
+  if len(reads_stat.index) > 0:
+    reads_stat['read_id'] = reads_stat['read_id'].astype(int)
+  layout = run.find('FlowcellLayout')
+  return \
+    RunInfo(
+      reads=reads_stat,
+      run_id=run.get('Id'),
+      run_number=run.get('Number'),
+      flowcell=run.findtext('Flowcell'),
+      instrument=run.findtext('Instrument'),
+      date=run.findtext('Date'),
+      flowcell_layout=\
+        get_flowcell_layout_from_xml(layout) if layout is not None else None)
+
+def read_runinfo(runInfoXml_path):
+  """
+  A function for reading RunInfo.xml file from Illumina sequencing run
+
+  Parsed files are memoized by path, modification time and size. The same RunInfo object
+  is returned for every call, so it must not be changed in place.
 
   :param runInfoXml_path: Filepath for RunInfo.xml
-  :returns: A Pandas dataframe containing the run configuration data
+  :returns: A RunInfo object
   """
   try:
     if not os.path.exists(runInfoXml_path):
       raise IOError('File {0} not found'.format(runInfoXml_path))
-    pattern = \
-      re.compile(r'<Read Number=\"(\d)\" NumCycles=\"(\d+)\" IsIndexedRead=\"(Y|N)\"')
-    read_info = list()
-    with open(runInfoXml_path,'r') as fp:
-      for line in fp:
-        line = line.strip()
-        if line.startswith('<Read Number'):
-          read_info.append(line)
-          read_start = 0
-          reads_stat = list()
-          for i in read_info:
-            if re.match(pattern,i):
-              read_number, numcycle, index_read = re.match(pattern,i).groups()
-              reads_stat.append({
-                'read_id': int(read_number),
-                'cycles': int(numcycle),
-                'start_cycle': int(read_start),
-                'index_read': index_read})
-              read_start += int(numcycle)
-    reads_stat = pd.DataFrame(reads_stat)
-    reads_stat['read_id'] = reads_stat['read_id'].astype(int)
-    return reads_stat
+    stat = os.stat(runInfoXml_path)
+    return \
+      _parse_runinfo_xml(
+        os.path.abspath(runInfoXml_path),
+        stat.st_mtime_ns,
+        stat.st_size)
   except Exception as e:
     raise ValueError('Failed to read RunInfo.xml for sequencing run, error: {0}'.format(e))
 
+def read_runinfo_xml(runInfoXml_path):
+  """
+  A function for reading RunInfo.xml file from Illumina sequencing run and returns data as Pandas DataFrame
+
+  :param runInfoXml_path: Filepath for RunInfo.xml
+  :returns: A Pandas dataframe containing the run configuration data
+  """
+  return read_runinfo(runInfoXml_path).reads.copy()
+
+def get_cycle_read_map(cycles, runinfoDf):
+  """
+  A function for mapping cycle numbers to reads using interval lookup against the read table from RunInfo.xml
+
+  :param cycles: A list or array of cycle numbers
+  :param runinfoDf: A Pandas dataframe from read_runinfo_xml, or a RunInfo object
+  :returns: A Pandas dataframe aligned with cycles and following columns
+
+    * read_id: Read id of the cycle, -1 for cycles outside the reads
+    * read_cycle: Position of the cycle within the read, starting from 1, 0 for cycles outside the reads
+    * read_cycles: Total cycles of the read, 0 for cycles outside the reads
+
+  """
+  try:
+    if isinstance(runinfoDf, RunInfo):
+      return runinfoDf.get_cycle_read_map(cycles)
+    cycles = np.asarray(cycles, dtype=np.int64)
+    runinfo = runinfoDf.sort_values('start_cycle')
+    starts = runinfo['start_cycle'].astype(int).values
+    lengths = runinfo['cycles'].astype(int).values
+    read_ids = runinfo['read_id'].astype(int).values
+    if len(starts) == 0:
+      mapped = np.zeros(len(cycles), dtype=bool)
+      idx = np.zeros(len(cycles), dtype=np.int64)
+      starts = lengths = read_ids = np.zeros(1, dtype=np.int64)
+    else:
+      idx = np.searchsorted(starts + lengths, cycles, side='left')
+      mapped = idx < len(starts)
+      idx = np.where(mapped, idx, 0)
+      mapped = mapped & (cycles > starts[idx])
+    return pd.DataFrame({
+      'read_id': np.where(mapped, read_ids[idx], -1),
+      'read_cycle': np.where(mapped, cycles - starts[idx], 0),
+      'read_cycles': np.where(mapped, lengths[idx], 0)})
+  except Exception as e:
+    raise ValueError('Failed to map cycles to reads, error: {0}'.format(e))
+
+def get_lane_read_index(lanes, runinfoDf):
+  """
+  A function for building the (lane_id, read_id) index of the summary table, reads are kept in RunInfo.xml order
+
+  :param lanes: A list of lane ids
+  :param runinfoDf: A Pandas dataframe from read_runinfo_xml
+  :returns: A Pandas MultiIndex
+  """
+  return \
+    pd.MultiIndex.from_product(
+      [sorted(set(lanes)), runinfoDf['read_id'].tolist()],
+      names=['lane_id', 'read_id'])
+
+def read_flowcell_layout(runInfoXml_path):
+  """
+  A function for reading the FlowcellLayout of a RunInfo.xml file
+
+  :param runInfoXml_path: Filepath for RunInfo.xml
+  :returns: A dict from get_flowcell_layout_from_xml, or None if FlowcellLayout is missing
+  """
+  flowcell_layout = read_runinfo(runInfoXml_path).flowcell_layout
+  if flowcell_layout is not None:
+    flowcell_layout = dict(flowcell_layout)
+  return flowcell_layout
+
+def get_flowcell_layout_from_tiles(lanes, tiles):
+  """
+  A function for guessing the flowcell layout from the lane and tile ids, for runs without FlowcellLayout in RunInfo.xml
+
+  :param lanes: A list or array of lane ids
+  :param tiles: A list or array of tile ids
+  :returns: A dict same as get_flowcell_layout_from_xml
+  """
+  tiles = np.unique(np.asarray(tiles, dtype=np.int64))
+  if len(tiles) == 0:
+    tiles = np.array([1101], dtype=np.int64)
+  tile_naming = 'FiveDigit' if tiles.max() >= 10000 else 'FourDigit'
+  base = FLOWCELL_TILE_NAMING.get(tile_naming)
+  return {
+    'lane_count': int(np.max(lanes)) if len(lanes) > 0 else 1,
+    'surface_count': int((tiles // base).max()),
+    'swath_count': int(((tiles % base) // (base // 10)).max()),
+    'tile_count': int((tiles % 100).max()),
+    'section_count': int(((tiles % 1000) // 100).max()) if tile_naming == 'FiveDigit' else 1,
+    'tile_naming': tile_naming,
+    'tiles': tiles.tolist()}
+
+def get_flowcell_tile_positions(flowcell_layout):
+  """
+  A function for listing the tile positions of a flowcell surface, i.e. tile ids without the surface digit
+
+  :param flowcell_layout: A dict from read_flowcell_layout or get_flowcell_layout_from_tiles
+  :returns: A sorted NumPy array of tile positions, ordered by swath (and section) and tile
+  """
+  base = FLOWCELL_TILE_NAMING.get(flowcell_layout.get('tile_naming'), 1000)
+  tiles = flowcell_layout.get('tiles')
+  if tiles is not None and \
+     len(tiles) > 0:
+    return np.unique(np.asarray(tiles, dtype=np.int64) % base)
+  swaths = np.arange(1, flowcell_layout.get('swath_count', 1) + 1)
+  tile_numbers = np.arange(1, flowcell_layout.get('tile_count', 0) + 1)
+  if base == 10000:
+    sections = np.arange(1, flowcell_layout.get('section_count', 1) + 1)
+    positions = \
+      swaths[:, None, None] * 1000 + \
+      sections[None, :, None] * 100 + \
+      tile_numbers[None, None, :]
+  else:
+    positions = \
+      swaths[:, None] * 100 + \
+      tile_numbers[None, :]
+  return np.unique(positions.ravel().astype(np.int64))
+
+def get_flowcell_grid(tileDf, key='ClusterCountPF', flowcell_layout=None):
+  """
+  A function for building a dense lane x tile grid of a metric for each flowcell surface
+
+  Tile ids are decoded with the tile naming convention of the flowcell layout. The tile axis
+  of each surface has every tile position of the layout, tiles without data are NaN.
+  Tiles with more than one row (e.g. one per read) are merged with median.
+
+  :param tileDf: A Pandas dataframe containing the Tiles data
+  :param key: Metric column name, default 'ClusterCountPF'
+  :param flowcell_layout: A dict from read_flowcell_layout, default None for guessing it from the tile ids
+  :returns: A dict of surface number and a dict with z (a 2D NumPy array of lanes x tiles), x (tile labels) and y (lane labels)
+  """
+  try:
+    for i in ('Lane', 'Tile', key):
+      if i not in tileDf.columns:
+        raise KeyError('Missing key {0} in tileDf'.format(i))
+    tileDf = tileDf[tileDf['Lane'].notna() & tileDf['Tile'].notna()]
+    lanes = tileDf['Lane'].values.astype(np.int64)
+    tiles = tileDf['Tile'].values.astype(np.int64)
+    if flowcell_layout is None:
+      flowcell_layout = get_flowcell_layout_from_tiles(lanes, tiles)
+    base = FLOWCELL_TILE_NAMING.get(flowcell_layout.get('tile_naming'), 1000)
+    medians = \
+      pd.Series(tileDf[key].values.astype(float)).\
+        groupby([lanes, tiles]).\
+        median()
+    median_lanes = medians.index.get_level_values(0).values.astype(np.int64)
+    median_tiles = medians.index.get_level_values(1).values.astype(np.int64)
+    lane_ids = \
+      np.union1d(
+        np.arange(1, flowcell_layout.get('lane_count', 1) + 1),
+        median_lanes)
+    surface_ids = \
+      np.union1d(
+        np.arange(1, flowcell_layout.get('surface_count', 1) + 1),
+        median_tiles // base)
+    positions = \
+      np.union1d(
+        get_flowcell_tile_positions(flowcell_layout),
+        median_tiles % base)
+    grid = np.full((len(surface_ids), len(lane_ids), len(positions)), np.nan)
+    grid[
+      np.searchsorted(surface_ids, median_tiles // base),
+      np.searchsorted(lane_ids, median_lanes),
+      np.searchsorted(positions, median_tiles % base)] = medians.values
+    return {
+      int(surface_id): {
+        'z': grid[i],
+        'x': ['Tile {0}'.format(surface_id * base + p) for p in positions],
+        'y': ['Lane {0}'.format(lane_id) for lane_id in lane_ids]}
+          for i, surface_id in enumerate(surface_ids)}
+  except Exception as e:
+    raise ValueError('Failed to build flowcell grid, error: {0}'.format(e))
+
+def get_heatmap_values(z):
+  """
+  A function for converting a 2D NumPy array to nested lists for heatmaps, NaN is replaced with None
+
+  :param z: A 2D NumPy array
+  :returns: A list of lists
+  """
+  z = np.asarray(z, dtype=float)
+  return np.where(np.isnan(z), None, z).tolist()
+
+def normalize_interop_section(df):
+  """
+  A function for normalizing the dtypes of a interop section
+
+  Rows without Lane are removed, id columns (Lane, Tile, Cycle, Read) are converted to int64
+  (if they don't have any missing value), other float columns to float64 and int columns to int64.
+
+  :param df: A Pandas dataframe for a interop section
+  :returns: A new Pandas dataframe with a fresh index
+  """
+  if 'Lane' in df.columns:
+    df = df[df['Lane'].notna()]
+  columns = dict()
+  for c in df.columns:
+    values = df[c]
+    if c in INTEROP_ID_COLUMNS and \
+       values.notna().all():
+      values = values.astype(np.int64)
+    elif pd.api.types.is_float_dtype(values):
+      values = values.astype(np.float64)
+    elif pd.api.types.is_integer_dtype(values):
+      values = values.astype(np.int64)
+    columns.update({c: values.values})
+  return pd.DataFrame(columns, columns=df.columns)
+
+class RunMetrics:
+  """
+  Interop sections of a run with dtypes normalized once, shared by the summary and chart extractors
+
+  Sections are normalized with normalize_interop_section on first use, and the derived indexes
+  (cycle to read map, lane groups and flowcell grids) are cached. The same frames are returned to
+  every extractor, so extractors must not change them in place.
+
+  :param data: A dict or Mapping of section name and Pandas dataframe, e.g. from read_interop_data
+  :param runinfoDf: A RunInfo object from read_runinfo, or a Pandas dataframe from read_runinfo_xml
+  :param flowcell_layout: A dict from read_flowcell_layout, default None for the RunInfo layout or guessing it from the tile ids
+  """
+  def __init__(self, data, runinfoDf, flowcell_layout=None):
+    self.data = data
+    self.run_info = None
+    if isinstance(runinfoDf, RunInfo):
+      self.run_info = runinfoDf
+      runinfoDf = runinfoDf.reads
+      if flowcell_layout is None:
+        flowcell_layout = self.run_info.flowcell_layout
+    self.runinfo = runinfoDf
+    self.flowcell_layout = flowcell_layout
+    self._sections = dict()
+    self._cycle_maps = dict()
+    self._lane_groups = dict()
+    self._flowcell_grids = dict()
+
+  def get(self, section):
+    """
+    :param section: Metric section name
+    :returns: The normalized Pandas dataframe, or None if the section is missing
+    """
+    if section not in self._sections:
+      df = self.data.get(section)
+      if df is not None:
+        df = normalize_interop_section(df)
+      self._sections.update({section: df})
+    return self._sections.get(section)
+
+  def get_cycle_read_map(self, section):
+    """
+    :param section: Metric section name with a Cycle column
+    :returns: A Pandas dataframe from get_cycle_read_map, aligned with the section rows
+    """
+    if section not in self._cycle_maps:
+      self._cycle_maps.update({
+        section: get_cycle_read_map(
+          self.get(section)['Cycle'].values,
+          self.run_info if self.run_info is not None else self.runinfo)})
+    return self._cycle_maps.get(section)
+
+  def get_lane_groups(self, section):
+    """
+    :param section: Metric section name
+    :returns: A dict of lane id and array of row positions, sorted by lane id
+    """
+    if section not in self._lane_groups:
+      indices = self.get(section).groupby('Lane').indices
+      self._lane_groups.update({
+        section: {
+          int(lane_id): indices.get(lane_id)
+            for lane_id in sorted(indices.keys())}})
+    return self._lane_groups.get(section)
+
+  def get_flowcell_grid(self, key='ClusterCountPF'):
+    """
+    :param key: Tile section column name, default 'ClusterCountPF'
+    :returns: A dict of surface number and lane x tile grid, see get_flowcell_grid
+    """
+    if key not in self._flowcell_grids:
+      self._flowcell_grids.update({
+        key: get_flowcell_grid(
+          self.get('Tile'),
+          key=key,
+          flowcell_layout=self.flowcell_layout)})
+    return self._flowcell_grids.get(key)
+
 def extract_read_data_from_tileDf(tileDf):
   try:
+    tile_data = \
+      pd.DataFrame({
+        'read_id': tileDf['Read'],
+        'lane_id': tileDf['Lane'],
+        'ClusterCount': tileDf['ClusterCount'].astype(float),
+        'ClusterCountPF': tileDf['ClusterCountPF'].astype(float),
+        'Density': tileDf['Density'].astype(float)}).\
+      groupby(['read_id', 'lane_id']).\
+      agg({'ClusterCount': 'sum', 'ClusterCountPF': 'sum', 'Density': 'mean'})
     read_data = list()
-    for read_id, r_data in tileDf.groupby('Read'):
-      for lane_id, l_data in r_data.groupby('Lane'):
-        read_count = l_data['ClusterCount'].astype(float).sum()
-        read_count = int(read_count) / 1000000
-        read_count_pf = l_data['ClusterCountPF'].astype(float).sum()
-        read_count_pf = int(read_count_pf) / 1000000
-        density_count = l_data['Density'].astype(float).mean()
-        density_count = int(density_count) / 1000
-        pct_cluster_count_pf = '{0:.2f}'.format(int(read_count_pf) / int(read_count))
-        read_data.append({
-          'read_id': read_id,
-          'lane_id': lane_id,
-          'density': '{:.2f}'.format(density_count),
-          'read_count': '{:.2f}'.format(read_count),
-          'read_count_pf': '{:.2f}'.format(read_count_pf),
-          'cluster_pf': pct_cluster_count_pf})
+    for (read_id, lane_id), cluster_count, cluster_count_pf, density in \
+      zip(tile_data.index,
+          tile_data['ClusterCount'].values,
+          tile_data['ClusterCountPF'].values,
+          tile_data['Density'].values):
+      read_count = int(cluster_count) / 1000000
+      read_count_pf = int(cluster_count_pf) / 1000000
+      density_count = int(density) / 1000
+      pct_cluster_count_pf = '{0:.2f}'.format(int(read_count_pf) / int(read_count))
+      read_data.append({
+        'read_id': read_id,
+        'lane_id': lane_id,
+        'density': '{:.2f}'.format(density_count),
+        'read_count': '{:.2f}'.format(read_count),
+        'read_count_pf': '{:.2f}'.format(read_count_pf),
+        'cluster_pf': pct_cluster_count_pf})
     read_data = pd.DataFrame(read_data)
     read_data['read_id'] = read_data['read_id'].astype(int)
     read_data['lane_id'] = read_data['lane_id'].astype(int)
@@ -136,35 +1039,39 @@ def extract_read_data_from_tileDf(tileDf):
   except Exception as e:
     raise ValueError('Failed to extract data from TileDf, error: {0}'.format(e))
 
-def extract_yield_data_from_q2030Df(q2030Df, runinfoDf):
+def extract_yield_data_from_q2030Df(q2030Df, runinfoDf, cycle_map=None):
   try:
-    yield_data = list ()
-    q2030Df['Lane'] = q2030Df['Lane'].astype(int)
-    q2030Df['Cycle'] = q2030Df['Cycle'].astype(int)
-    for lane_id, l_data in q2030Df.groupby('Lane'):
-      for read_entry in runinfoDf.to_dict(orient='records'):
-        read_id = read_entry.get('read_id')
-        start_cycle = int(read_entry.get('start_cycle'))
-        total_cycle = int(read_entry.get('cycles'))
-        finish_cycle = start_cycle + total_cycle
-        r_q30 = \
-          l_data[(l_data['Cycle'] > start_cycle) & (l_data['Cycle'] < finish_cycle)]\
-            ['Q30'].astype(int).fillna(0).sum()
-        r_t = \
-          l_data[(l_data['Cycle'] > start_cycle) & (l_data['Cycle'] < finish_cycle)]\
-            ['Total'].astype(int).fillna(0).sum()
-        if int(r_q30) > 0 and \
-           int(r_t) > 0:
-          r_pct = '{:.2f}'.format(int(r_q30) / int(r_t) * 100)
-          r_yield = '{:.2f}'.format(int(r_t) / 1000000000)
-        else:
-          r_pct = 0
-          r_yield = 0 
-        yield_data.append({
-          'lane_id': lane_id,
-          'read_id': read_id,
-          'q30_pct': r_pct,
-          'yield': r_yield})
+    lanes = q2030Df['Lane'].astype(int).values
+    if cycle_map is None:
+      cycle_map = \
+        get_cycle_read_map(q2030Df['Cycle'].astype(int).values, runinfoDf)
+    mask = (cycle_map['read_cycle'] < cycle_map['read_cycles']).values   # skip last cycle of each read
+    lane_data = \
+      pd.DataFrame({
+        'lane_id': lanes[mask],
+        'read_id': cycle_map['read_id'].values[mask],
+        'Q30': q2030Df['Q30'].astype(int).values[mask],
+        'Total': q2030Df['Total'].astype(int).values[mask]}).\
+      groupby(['lane_id', 'read_id'])[['Q30', 'Total']].\
+      sum().\
+      reindex(
+        get_lane_read_index(lanes, runinfoDf),
+        fill_value=0)
+    yield_data = list()
+    for (lane_id, read_id), r_q30, r_t in \
+      zip(lane_data.index, lane_data['Q30'].values, lane_data['Total'].values):
+      if int(r_q30) > 0 and \
+         int(r_t) > 0:
+        r_pct = '{:.2f}'.format(int(r_q30) / int(r_t) * 100)
+        r_yield = '{:.2f}'.format(int(r_t) / 1000000000)
+      else:
+        r_pct = 0
+        r_yield = 0
+      yield_data.append({
+        'lane_id': lane_id,
+        'read_id': read_id,
+        'q30_pct': r_pct,
+        'yield': r_yield})
     yield_data = pd.DataFrame(yield_data)
     yield_data['read_id'] = yield_data['read_id'].astype(int)
     yield_data['lane_id'] = yield_data['lane_id'].astype(int)
@@ -172,144 +1079,216 @@ def extract_yield_data_from_q2030Df(q2030Df, runinfoDf):
   except Exception as e:
     raise ValueError('Failed to extract data from q2030Df, error: {0}'.format(e))
 
-def get_extraction_data_from_extractionDf(extractionDf, runinfoDf):
+def get_extraction_data_from_extractionDf(extractionDf, runinfoDf, cycle_map=None):
   try:
-    extractionDf['Lane'] = extractionDf['Lane'].astype(int)
-    extractionDf['Cycle'] = extractionDf['Cycle'].astype(int)
-    for c in extractionDf.columns:
-        if c.startswith('MaxIntensity_'):
-            extractionDf[c] = extractionDf[c].astype(int)
-    extraction_data = list()
+    lanes = extractionDf['Lane'].astype(int).values
     maxIntensity_col = [
       c for c in extractionDf.columns
         if c.startswith('MaxIntensity_')][0]
-    for lane_id, l_data in extractionDf.groupby('Lane'):
-      for read_entry in runinfoDf.to_dict(orient='records'):
-        read_id = read_entry.get('read_id')
-        start_cycle = int(read_entry.get('start_cycle')) + 1
-        intensity_c1 = \
-          l_data[l_data['Cycle']==start_cycle][maxIntensity_col].mean()
-        if intensity_c1 == 'nan':
-          intensity_c1 = 0
-        intensity_c1 = '{:.2f}'.format(intensity_c1)
-        extraction_data.append({
-          'lane_id': lane_id,
-          'read_id': read_id,
-          'intensity_c1': intensity_c1})
-    extraction_data = pd.DataFrame(extraction_data)
+    if cycle_map is None:
+      cycle_map = \
+        get_cycle_read_map(extractionDf['Cycle'].astype(int).values, runinfoDf)
+    mask = (cycle_map['read_cycle'] == 1).values                                # first cycle of each read
+    lane_data = \
+      pd.DataFrame({
+        'lane_id': lanes[mask],
+        'read_id': cycle_map['read_id'].values[mask],
+        'intensity': extractionDf[maxIntensity_col].astype(int).values[mask]}).\
+      groupby(['lane_id', 'read_id'])['intensity'].\
+      mean().\
+      reindex(get_lane_read_index(lanes, runinfoDf))
+    extraction_data = \
+      pd.DataFrame({
+        'lane_id': lane_data.index.get_level_values('lane_id'),
+        'read_id': lane_data.index.get_level_values('read_id'),
+        'intensity_c1': ['{:.2f}'.format(i) for i in lane_data.values]})
     extraction_data['lane_id'] = extraction_data['lane_id'].astype(int)
     extraction_data['read_id'] = extraction_data['read_id'].astype(int)
     return extraction_data
   except Exception as e:
     raise ValueError('Failed to get data from extractionDf, error: {0}'.format(e))
 
-def get_data_from_errorDf(errorDf, runinfoDf):
+def get_data_from_errorDf(errorDf, runinfoDf, cycle_map=None):
   try:
-    errorDf['Lane'] = errorDf['Lane'].astype(int)
-    errorDf['Cycle'] = errorDf['Cycle'].astype(int)
-    errorDf['ErrorRate'] = errorDf['ErrorRate'].astype(float)
-    error_data = list()
-    for lane_id, l_data in errorDf.groupby('Lane'):
-      for read_entry in runinfoDf.to_dict(orient='records'):
-        read_id = read_entry.get('read_id')
-        start_cycle = int(read_entry.get('start_cycle'))
-        total_cycle = int(read_entry.get('cycles'))
-        finish_cycle = start_cycle + total_cycle
-        error_cycles = \
-          l_data[(l_data['Cycle'] > start_cycle) & (l_data['Cycle'] < finish_cycle)]\
-            ['Cycle'].drop_duplicates().count()
-        error_rate = \
-          l_data[(l_data['Cycle'] > start_cycle) & (l_data['Cycle'] < finish_cycle)]\
-            ['ErrorRate'].mean()
+    lanes = errorDf['Lane'].astype(int).values
+    cycles = errorDf['Cycle'].astype(int).values
+    if len(errorDf.index) == 0:
+      error_data = \
+        pd.DataFrame(columns=['lane_id','read_id','error_cycles','error_rate'])
+    else:
+      if cycle_map is None:
+        cycle_map = \
+          get_cycle_read_map(cycles, runinfoDf)
+      mask = (cycle_map['read_cycle'] < cycle_map['read_cycles']).values # skip last cycle of each read
+      lane_data = \
+        pd.DataFrame({
+          'lane_id': lanes[mask],
+          'read_id': cycle_map['read_id'].values[mask],
+          'Cycle': cycles[mask],
+          'ErrorRate': errorDf['ErrorRate'].astype(float).values[mask]}).\
+        groupby(['lane_id', 'read_id']).\
+        agg({'Cycle': 'nunique', 'ErrorRate': 'mean'}).\
+        reindex(get_lane_read_index(lanes, runinfoDf))
+      error_rates = list()
+      for error_rate in lane_data['ErrorRate'].values:
         error_rate = '{0:.3f}'.format(error_rate)
         if error_rate == 'nan':
           error_rate = 0
-        error_data.append({
-          'lane_id': lane_id,
-          'read_id': read_id,
-          'error_cycles': str(error_cycles),
-          'error_rate': error_rate})
-    if len(error_data) == 0:
+        error_rates.append(error_rate)
       error_data = \
-        pd.DataFrame(columns=['lane_id','read_id','error_cycles','error_rate'])
-    else:
-      error_data = pd.DataFrame(error_data)
+        pd.DataFrame({
+          'lane_id': lane_data.index.get_level_values('lane_id'),
+          'read_id': lane_data.index.get_level_values('read_id'),
+          'error_cycles': lane_data['Cycle'].fillna(0).astype(int).astype(str).values,
+          'error_rate': error_rates})
     error_data['lane_id'] = error_data['lane_id'].astype(int)
     error_data['read_id'] = error_data['read_id'].astype(int)
     return error_data
   except Exception as e:
     raise ValueError('Failed to get data from errorDf, error: {0}'.format(e))
 
-def calculate_phasing_stats(empiricalPhasingDf, runinfoDf):
+def get_batched_linregress(group_codes, values):
+  """
+  A function for fitting least-squares lines for many groups in one pass, each group is regressed against 1..n
+
+  :param group_codes: A sorted array of group numbers (0..n_groups-1), one per row
+  :param values: A 2D array of y values, one column per regression
+  :returns: A tuple of (slopes, intercepts) arrays with shape n_groups x n_columns
+  """
+  group_codes = np.asarray(group_codes, dtype=np.int64)
+  values = np.asarray(values, dtype=np.float64).reshape(len(group_codes), -1)
+  counts = np.bincount(group_codes).astype(np.float64)
+  group_starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+  x = np.arange(len(group_codes)) - group_starts[group_codes] + 1                # 1..n within each group
+  x_mean = (counts + 1) / 2
+  x_centered = x - x_mean[group_codes]
+  ssxm = counts * (counts ** 2 - 1) / 12                                         # sum of (x - x_mean)^2 for x in 1..n
+  slopes = list()
+  intercepts = list()
+  with np.errstate(divide='ignore', invalid='ignore'):
+    for i in range(values.shape[1]):
+      y_mean = \
+        np.bincount(group_codes, weights=values[:, i], minlength=len(counts)) / counts
+      ssxym = \
+        np.bincount(group_codes, weights=x_centered * values[:, i], minlength=len(counts))
+      slope = ssxym / ssxm
+      slopes.append(slope)
+      intercepts.append(y_mean - slope * x_mean)
+  return np.column_stack(slopes), np.column_stack(intercepts)
+
+def calculate_phasing_stats(empiricalPhasingDf, runinfoDf, per_tile=False, cycle_map=None):
+  """
+  A function for calculating phasing and prephasing slope and offset for each lane and read
+
+  Per cycle medians of Phasing and Prephasing are calculated in one groupby (skipping the first
+  and last cycle of each read) and all the regressions are solved together with closed form
+  least-squares sums.
+
+  :param empiricalPhasingDf: A Pandas dataframe containing the EmpiricalPhasing data
+  :param runinfoDf: A Pandas dataframe from read_runinfo_xml
+  :param per_tile: Toggle for calculating the stats for each tile, default False
+  :param cycle_map: A precomputed get_cycle_read_map output for the rows, default None
+  :returns: A Pandas dataframe with lane_id, read_id (and tile_id for per_tile), phasing_slope,
+            phasing_offset, prephasing_slope and prephasing_offset columns
+  """
   try:
     for i in ('Lane', 'Cycle', 'Tile', 'Phasing', 'Prephasing'):
       if i not in empiricalPhasingDf.columns:
         raise KeyError('Missing key {0} in empiricalPhasingDf'.format(i))
 
-    empiricalPhasingDf['Lane'] = empiricalPhasingDf['Lane'].astype(int)
-    empiricalPhasingDf['Cycle'] = empiricalPhasingDf['Cycle'].astype(int)
-    empiricalPhasingDf['Tile'] = empiricalPhasingDf['Tile'].astype(int)
-    empiricalPhasingDf['Phasing'] = empiricalPhasingDf['Phasing'].astype(float)
-    empiricalPhasingDf['Prephasing'] = empiricalPhasingDf['Prephasing'].astype(float)
-    data = list()
-    for lane_id, l_data in empiricalPhasingDf.groupby('Lane'):
-      for read_entry in runinfoDf.to_dict(orient='records'):
-        read_id = read_entry.get('read_id')
-        index_read = read_entry.get('index_read')
-        start_cycle = int(read_entry.get('start_cycle'))
-        total_cycle = int(read_entry.get('cycles'))
-        finish_cycle = start_cycle + total_cycle
-        phasing_scores = \
-          list(l_data[(l_data['Cycle'] > start_cycle+1) & (l_data['Cycle'] < finish_cycle)].\
-            groupby('Cycle')['Phasing'].agg('median'))
-        prephasing_scores = \
-          list(l_data[(l_data['Cycle'] > start_cycle+1) & (l_data['Cycle'] < finish_cycle)].\
-            groupby('Cycle')['Prephasing'].agg('median'))
-        if index_read == 'N' and \
-           len(phasing_scores) > 0 and \
-           len(prephasing_scores) > 0:
-          linreg_phasing = \
-            linregress(range(1,len(phasing_scores) + 1), phasing_scores)
-          linreg_prephasing = \
-            linregress(range(1, len(prephasing_scores) + 1), prephasing_scores)
-          data.append({
-              'lane_id': lane_id,
-              'read_id': read_id,
-              'phasing_slope': '{0:.3f}'.format(linreg_phasing.slope),
-              'phasing_offset': '{0:.3f}'.format(linreg_phasing.intercept),
-              'prephasing_slope': '{0:.3f}'.format(linreg_prephasing.slope),
-              'prephasing_offset': '{0:.3f}'.format(linreg_prephasing.intercept),
-          })
-        else:
-          data.append({
-              'lane_id': lane_id,
-              'read_id': read_id,
-              'phasing_slope': 0,
-              'phasing_offset': 0,
-              'prephasing_slope': 0,
-              'prephasing_offset': 0,
-          })
-    data = pd.DataFrame(data)
+    lanes = empiricalPhasingDf['Lane'].astype(int).values
+    cycles = empiricalPhasingDf['Cycle'].astype(int).values
+    tiles = empiricalPhasingDf['Tile'].astype(int).values
+    group_keys = ['lane_id', 'read_id']
+    if per_tile:
+      group_keys = ['lane_id', 'tile_id', 'read_id']
+    if cycle_map is None:
+      cycle_map = \
+        get_cycle_read_map(cycles, runinfoDf)
+    mask = \
+      ((cycle_map['read_cycle'] > 1) & \
+       (cycle_map['read_cycle'] < cycle_map['read_cycles'])).values              # skip first and last cycle of each read
+    cycle_medians = \
+      pd.DataFrame({
+        'lane_id': lanes[mask],
+        'tile_id': tiles[mask],
+        'read_id': cycle_map['read_id'].values[mask],
+        'Cycle': cycles[mask],
+        'Phasing': empiricalPhasingDf['Phasing'].astype(float).values[mask],
+        'Prephasing': empiricalPhasingDf['Prephasing'].astype(float).values[mask]}).\
+      groupby(group_keys + ['Cycle'])[['Phasing', 'Prephasing']].\
+      median()
+    group_index = \
+      cycle_medians.index.droplevel('Cycle')
+    group_codes, group_labels = \
+      pd.factorize(group_index, sort=True)
+    slopes, intercepts = \
+      get_batched_linregress(
+        group_codes,
+        cycle_medians[['Phasing', 'Prephasing']].values)
+    stats = \
+      pd.DataFrame({
+        'phasing_slope': slopes[:, 0],
+        'phasing_offset': intercepts[:, 0],
+        'prephasing_slope': slopes[:, 1],
+        'prephasing_offset': intercepts[:, 1]},
+        index=pd.MultiIndex.from_tuples(list(group_labels), names=group_keys))
+    if per_tile:
+      lane_tiles = \
+        pd.DataFrame({'Lane': lanes, 'Tile': tiles}).\
+          drop_duplicates().\
+          sort_values(['Lane', 'Tile']).\
+          values.tolist()
+      full_index = \
+        pd.MultiIndex.from_tuples(
+          [(lane_id, tile_id, read_id)
+            for lane_id, tile_id in lane_tiles
+              for read_id in runinfoDf['read_id'].tolist()],
+          names=group_keys)
+    else:
+      full_index = \
+        get_lane_read_index(lanes, runinfoDf)
+    stats = stats.reindex(full_index)
+    index_reads = \
+      dict(zip(runinfoDf['read_id'].tolist(), runinfoDf['index_read'].tolist()))
+    has_data = \
+      full_index.isin(group_index.unique()) & \
+      np.array([index_reads.get(r) == 'N' for r in full_index.get_level_values('read_id')], dtype=bool)
+    data = stats.index.to_frame(index=False)
+    for c in ('phasing_slope', 'phasing_offset', 'prephasing_slope', 'prephasing_offset'):
+      data[c] = [
+        '{0:.3f}'.format(v) if flag else 0
+          for v, flag in zip(stats[c].values, has_data)]
     return data
   except Exception as e:
     raise ValueError('Failed to get phasing stats, error: {0}'.format(e))
 
-def get_summary_stats(tileDf, q2030Df, extractionDf, errorDf, empiricalPhasingDf, runinfoDf):
+def get_run_summary_stats(run_metrics):
+  """
+  A function for calculating the summary table of a run from a RunMetrics object
+
+  :param run_metrics: A RunMetrics object with Tile, Q2030, Extraction, EmpiricalPhasing and Error sections
+  :returns: A Pandas dataframe with one row per lane and read
+  """
   try:
+    runinfoDf = run_metrics.runinfo
     read_data = \
-      extract_read_data_from_tileDf(tileDf=tileDf)
+      extract_read_data_from_tileDf(tileDf=run_metrics.get('Tile'))
     yield_data = \
       extract_yield_data_from_q2030Df(
-        q2030Df=q2030Df,
-        runinfoDf=runinfoDf)
+        q2030Df=run_metrics.get('Q2030'),
+        runinfoDf=runinfoDf,
+        cycle_map=run_metrics.get_cycle_read_map('Q2030'))
     extraction_data = \
       get_extraction_data_from_extractionDf(
-        extractionDf=extractionDf,
-        runinfoDf=runinfoDf)
+        extractionDf=run_metrics.get('Extraction'),
+        runinfoDf=runinfoDf,
+        cycle_map=run_metrics.get_cycle_read_map('Extraction'))
     phasing_data = \
       calculate_phasing_stats(
-        empiricalPhasingDf=empiricalPhasingDf,
-        runinfoDf=runinfoDf)
+        empiricalPhasingDf=run_metrics.get('EmpiricalPhasing'),
+        runinfoDf=runinfoDf,
+        cycle_map=run_metrics.get_cycle_read_map('EmpiricalPhasing'))
     merged_data = \
       yield_data.\
         merge(read_data, how='left', on=['read_id', 'lane_id']).\
@@ -317,12 +1296,14 @@ def get_summary_stats(tileDf, q2030Df, extractionDf, errorDf, empiricalPhasingDf
         merge(extraction_data, how='left', on=['lane_id', 'read_id']).\
         merge(phasing_data, how='left', on=['lane_id', 'read_id']).\
         fillna(0)
+    errorDf = run_metrics.get('Error')
     if errorDf is not None and \
        len(errorDf.index) > 0:
       error_data = \
         get_data_from_errorDf(
           errorDf=errorDf,
-          runinfoDf=runinfoDf)
+          runinfoDf=runinfoDf,
+          cycle_map=run_metrics.get_cycle_read_map('Error'))
       merged_data = \
         merged_data.\
           merge(error_data, how='left', on=['lane_id', 'read_id']).\
@@ -331,33 +1312,165 @@ def get_summary_stats(tileDf, q2030Df, extractionDf, errorDf, empiricalPhasingDf
   except Exception as e:
     raise ValueError('Failed to get summary stats, error: {0}'.format(e))
 
-def plot_intensity_data(extractionDf, color_palette='colorblind', width=1000, height=600):
+def get_summary_stats(tileDf, q2030Df, extractionDf, errorDf, empiricalPhasingDf, runinfoDf):
+  run_metrics = \
+    RunMetrics({
+      'Tile': tileDf,
+      'Q2030': q2030Df,
+      'Extraction': extractionDf,
+      'EmpiricalPhasing': empiricalPhasingDf,
+      'Error': errorDf},
+      runinfoDf)
+  return get_run_summary_stats(run_metrics)
+
+def get_lane_tile_medians(df, columns, mask=None):
+  """
+  A function for calculating the median of each tile and then the mean of the tile medians for each lane
+
+  :param df: A normalized Pandas dataframe with Lane and Tile columns
+  :param columns: A list of metric column names
+  :param mask: A boolean array for selecting the rows, default None for all rows
+  :returns: A Pandas dataframe indexed by Lane
+  """
+  if mask is not None:
+    df = df[mask]
+  return \
+    df.groupby(['Lane', 'Tile'])[columns].\
+      median().\
+      groupby(level='Lane').\
+      mean()
+
+def get_run_features(run_metrics, seqrun_id=None):
+  """
+  A function for calculating the per lane features of the sequencing run ML model
+
+  Same features as get_run_matircs of the seqrun_ml notebook, all the lanes are calculated
+  together with one groupby per section. Cycle metrics use the cycles of the non-index reads,
+  excluding the last cycle of each read. Missing channels (e.g. A, G, T and C for two channel
+  runs) and lanes without data are filled with 0.
+
+  :param run_metrics: A RunMetrics object with Tile, Q2030, Extraction, EmpiricalPhasing and Error sections
+  :param seqrun_id: Sequencing run id for the seqrun_id column, default None
+  :returns: A Pandas dataframe with one row per lane and lane_id, SEQRUN_FEATURE_COLUMNS and seqrun_id columns
+  """
+  try:
+    runinfoDf = run_metrics.runinfo
+    non_index_ids = \
+      runinfoDf[runinfoDf['index_read'] == 'N']['read_id'].astype(int).values
+
+    def get_cycle_mask(section):
+      cycle_map = run_metrics.get_cycle_read_map(section)
+      return \
+        (np.isin(cycle_map['read_id'].values, non_index_ids) & \
+         (cycle_map['read_cycle'] < cycle_map['read_cycles']).values)               # skip last cycle of each read
+
+    q2030Df = run_metrics.get('Q2030')
+    lane_ids = np.unique(q2030Df['Lane'].values.astype(np.int64))
+    q2030_data = \
+      get_lane_tile_medians(
+        q2030Df,
+        ['Q30', 'Total', 'MedianQScore'],
+        mask=get_cycle_mask('Q2030'))
+    features = \
+      pd.DataFrame({
+        'q30_pct_mean': q2030_data['Q30'] / q2030_data['Total'],
+        'total_median': q2030_data['Total'],
+        'median_qscore': q2030_data['MedianQScore']})
+    tileDf = run_metrics.get('Tile')
+    tile_data = \
+      tileDf[np.isin(tileDf['Read'].values, non_index_ids)].\
+        groupby(['Lane', 'Tile'])[['ClusterCount', 'ClusterCountPF', 'Density', 'DensityPF']].\
+        sum().\
+        groupby(level='Lane').\
+        mean()
+    features = \
+      features.join(
+        pd.DataFrame({
+          'cluster_count_pct': tile_data['ClusterCountPF'] / tile_data['ClusterCount'],
+          'densityPf_pct': tile_data['DensityPF'] / tile_data['Density']}),
+        how='left')
+    extractionDf = run_metrics.get('Extraction')
+    extraction_columns = [
+      c for c in SEQRUN_FEATURE_COLUMNS
+        if c in extractionDf.columns]
+    if len(extraction_columns) > 0:
+      features = \
+        features.join(
+          get_lane_tile_medians(
+            extractionDf,
+            extraction_columns,
+            mask=get_cycle_mask('Extraction')),
+          how='left')
+    errorDf = run_metrics.get('Error')
+    if errorDf is not None and \
+       len(errorDf.index) > 0:
+      features = \
+        features.join(
+          get_lane_tile_medians(
+            errorDf,
+            ['ErrorRate'],
+            mask=get_cycle_mask('Error')).\
+            rename(columns={'ErrorRate': 'error_rate'}),
+          how='left')
+    phasing_columns = [
+      'phasing_slope', 'phasing_offset', 'prephasing_slope', 'prephasing_offset']
+    phasing_data = \
+      calculate_phasing_stats(
+        empiricalPhasingDf=run_metrics.get('EmpiricalPhasing'),
+        runinfoDf=runinfoDf,
+        cycle_map=run_metrics.get_cycle_read_map('EmpiricalPhasing'))
+    phasing_data = \
+      phasing_data[phasing_data['read_id'].isin(non_index_ids)]
+    features = \
+      features.join(
+        phasing_data[phasing_columns].\
+          astype(float).\
+          groupby(phasing_data['lane_id'].values).\
+          mean(),
+        how='left')
+    features = \
+      features.\
+        reindex(index=lane_ids, columns=SEQRUN_FEATURE_COLUMNS).\
+        fillna(0)
+    features.insert(0, 'lane_id', lane_ids)
+    features.reset_index(drop=True, inplace=True)
+    features['seqrun_id'] = seqrun_id
+    return features
+  except Exception as e:
+    raise ValueError('Failed to get run features, error: {0}'.format(e))
+
+def get_intensity_medians(extractionDf):
+  """
+  A function for calculating the median of MaxIntensity columns for each lane and cycle in one groupby
+
+  :param extractionDf: A Pandas dataframe containing the Extraction data
+  :returns: A tuple of (list of MaxIntensity column names, Pandas dataframe of medians indexed by sorted Lane and Cycle)
+  """
+  intensity_columns = [
+    c for c in extractionDf.columns
+      if c.startswith('MaxIntensity_')]
+  if len(intensity_columns) == 0:
+    raise ValueError('No intensity columns found')
+  medians = \
+    extractionDf[intensity_columns].\
+      astype(float).\
+      groupby([
+        extractionDf['Lane'].astype(int).rename('Lane'),
+        extractionDf['Cycle'].astype(int).rename('Cycle')]).\
+      median()
+  return intensity_columns, medians
+
+def plot_intensity_data(extractionDf, color_palette='colorblind', width=1000, height=600, render_mode='iframe'):
     try:
-        intensity_columns = [
-            c for c in extractionDf.columns
-                if c.startswith('MaxIntensity_')]
-        if len(intensity_columns) == 0:
-            raise ValueError('No intensity columns found')
-        extractionDf['Lane'] = extractionDf['Lane'].astype(int)
-        extractionDf['Cycle'] = extractionDf['Cycle'].astype(int)
-        for c in intensity_columns:
-            extractionDf[c] = extractionDf[c].astype(float)
-        formatted_data = list()
-        for lane_id, l_data in extractionDf.groupby('Lane'):
-            for cycle, c_data in l_data.groupby('Cycle'):
-                row = {'Lane':lane_id, 'Cycle':cycle}
-                for c in intensity_columns:
-                    row.update({c: c_data[c].median()})
-                formatted_data.append(row)
-        formatted_data = pd.DataFrame(formatted_data)
+        intensity_columns, medians = \
+          get_intensity_medians(extractionDf)
         plots = list()
         colors = sns.color_palette(color_palette, len(intensity_columns), as_cmap=False).as_hex()
-        chart_js = iplotter.ChartJSPlotter()
-        for lane_id, l_data in formatted_data.groupby('Lane'):
-            labels = l_data.sort_values('Cycle').set_index('Cycle').index
+        for lane_id, l_data in medians.groupby(level='Lane'):
+            labels = l_data.index.get_level_values('Cycle')
             datasets = list()
             for c, color in zip(intensity_columns, colors):
-                intensity_data = l_data.sort_values('Cycle').set_index('Cycle')[c].values
+                intensity_data = l_data[c].values
                 datasets.append({
                     "label": c,
                     "data": list(intensity_data),
@@ -394,13 +1507,67 @@ def plot_intensity_data(extractionDf, color_palette='colorblind', width=1000, he
                     }]
                 }
             }
-            plot = chart_js.plot(data_json, options=options, chart_type="line", w=width, h=height)
+            plot = \
+                plot_chart(
+                    'chartjs', data_json, options=options, chart_type="line",
+                    w=width, h=height, render_mode=render_mode)
             plots.append(plot)
         return plots
     except Exception as e:
         raise ValueError(e)
 
-def get_box_plots(tilesDf,color_palette='colorblind',width=800,height=600):
+def get_box_plot_stats(df, value_columns, group_column='Lane', whisker_iqr=1.5):
+  """
+  A function for calculating box plot statistics of each group in one vectorized pass
+
+  Quartiles are linear interpolated, same as Pandas quantile. Whiskers end at the last
+  value within whisker_iqr * IQR of the quartiles and the values outside are outliers.
+
+  :param df: A Pandas dataframe
+  :param value_columns: A list of value column names
+  :param group_column: Group column name, default 'Lane'
+  :param whisker_iqr: Whisker length as a multiple of IQR, default 1.5
+  :returns: A Pandas dataframe indexed by group_column and column, with count, mean, q1, median, q3, lowerfence, upperfence and outliers (a NumPy array)
+  """
+  try:
+    long_df = \
+      df[[group_column] + list(value_columns)].\
+        melt(id_vars=group_column, var_name='column', value_name='value').\
+        dropna(subset=['value'])
+    keys = [long_df[group_column], long_df['column']]
+    grouped = long_df['value'].groupby(keys, sort=True)
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    quartiles.columns = ['q1', 'median', 'q3']
+    stats = \
+      pd.concat([
+        grouped.count().rename('count'),
+        grouped.mean().rename('mean'),
+        quartiles], axis=1)
+    iqr = stats['q3'] - stats['q1']
+    limits = \
+      pd.DataFrame({
+        'low': stats['q1'] - whisker_iqr * iqr,
+        'high': stats['q3'] + whisker_iqr * iqr}).\
+      reindex(pd.MultiIndex.from_arrays(keys))
+    inside = \
+      (long_df['value'].values >= limits['low'].values) & \
+      (long_df['value'].values <= limits['high'].values)
+    inside_values = long_df['value'].where(inside)
+    stats['lowerfence'] = inside_values.groupby(keys).min()
+    stats['upperfence'] = inside_values.groupby(keys).max()
+    outlier_values = long_df['value'].values[~inside]
+    outlier_index = \
+      pd.Series(outlier_values).\
+        groupby([k.values[~inside] for k in keys]).\
+        indices
+    stats['outliers'] = [
+      outlier_values[outlier_index[i]] if i in outlier_index else outlier_values[:0]
+        for i in stats.index]
+    return stats
+  except Exception as e:
+    raise ValueError('Failed to calculate box plot stats, error: {0}'.format(e))
+
+def get_box_plots(tilesDf,color_palette='colorblind',width=800,height=600,box_stats=False,render_mode='iframe'):
   """
   A function for plotting Boxplot for the entries from interop data
   
@@ -408,6 +1575,8 @@ def get_box_plots(tilesDf,color_palette='colorblind',width=800,height=600):
   :param color_palette: Seaborn color palette name, default 'colorblind'
   :param width: Plot width, default 800
   :param height: Plot height, default 600
+  :param box_stats: Toggle for plotting precomputed quartiles, whiskers and outliers instead of all the tile values, default False
+  :param render_mode: iframe for iplotter plots or shared for plots using the get_report_js_bundle libraries, default iframe
   :returns: A list of IPythondisplay.HTML objects containing the following boxplots
 
   * ClusterCount
@@ -427,71 +1596,71 @@ def get_box_plots(tilesDf,color_palette='colorblind',width=800,height=600):
         color_palette,
         len(tilesDf.groupby('Lane').groups.keys()),
         as_cmap=False).as_hex()
-    tilesDf.dropna(inplace=True)
-    tilesDf['ClusterCountPF'] = tilesDf['ClusterCountPF'].astype(float)
-    tilesDf['ClusterCount'] = tilesDf['ClusterCount'].astype(float)
-    tilesDf['Density'] = tilesDf['Density'].astype(float)
-    tilesDf['DensityPF'] = tilesDf['DensityPF'].astype(float)
-    tilesDf['Lane'] = tilesDf['Lane'].astype(int)
+    tilesDf = \
+      tilesDf.dropna(
+        subset=['Lane', 'ClusterCount', 'ClusterCountPF', 'Density', 'DensityPF'])
+    tilesDf = \
+      tilesDf.astype({
+        'ClusterCountPF': float,
+        'ClusterCount': float,
+        'Density': float,
+        'DensityPF': float,
+        'Lane': int})
+    stats = None
+    if box_stats:
+      stats = \
+        get_box_plot_stats(
+          tilesDf,
+          value_columns=['ClusterCount', 'ClusterCountPF', 'Density', 'DensityPF'])
     clusterCount_box_data = list()
     density_box_data = list()
     for lane_id,l_data in tilesDf.groupby('Lane'):
-      clusterCount_box_data.extend([{
-        "y": list(l_data['ClusterCount'].values),
-        "type": 'box',
-        "name": 'Lane {0}'.format(lane_id),
-        "marker": {
-          "color": colors[lane_id - 1]
-        },
-        "boxpoints": 'Outliers'
-      },{
-        "y":list(l_data['ClusterCountPF'].values),
-        "type": 'box',
-        "name": 'Lane {0}'.format(lane_id),
-        "marker": {
-          "color": colors[lane_id - 1]
-        },
-        "boxpoints": 'Outliers'
-      }])
-      density_box_data.extend([{
-        "y": list(l_data['Density'].values),
-        "type": 'box',
-        "name": 'Lane {0}'.format(lane_id),
-        "marker": {
-          "color": colors[lane_id-1]
-        },
-        "boxpoints": 'Outliers'
-      },{
-        "y": list(l_data['DensityPF'].values),
-        "type": 'box',
-        "name": 'Lane {0}'.format(lane_id),
-        "marker": {
-          "color": colors[lane_id-1]
-        },
-        "boxpoints": 'Outliers'
-      }])
+      for box_data, columns in (
+        (clusterCount_box_data, ('ClusterCount', 'ClusterCountPF')),
+        (density_box_data, ('Density', 'DensityPF'))):
+        for column in columns:
+          box = dict()
+          if stats is None:
+            box.update({"y": list(l_data[column].values)})
+          box.update({
+            "type": 'box',
+            "name": 'Lane {0}'.format(lane_id),
+            "marker": {
+              "color": colors[lane_id - 1]
+            },
+            "boxpoints": 'Outliers'
+          })
+          if stats is not None:
+            column_stats = stats.loc[(lane_id, column)]
+            box.update({
+              "q1": [column_stats['q1']],
+              "median": [column_stats['median']],
+              "q3": [column_stats['q3']],
+              "lowerfence": [column_stats['lowerfence']],
+              "upperfence": [column_stats['upperfence']],
+              "mean": [column_stats['mean']],
+              "y": [list(column_stats['outliers'])]})
+          box_data.append(box)
     clusterCount_layout = {
       "title": 'ClusterCount'
     }
     density_layout = {
       "title": 'Density'
     }
-    clusterCount_plotter = iplotter.PlotlyPlotter()
-    density_plotter = iplotter.PlotlyPlotter()
-    return clusterCount_plotter.plot(clusterCount_box_data, layout=clusterCount_layout, w=width, h=height),\
-           density_plotter.plot(density_box_data, layout=density_layout, w=width, h=height)
+    return plot_chart('plotly', clusterCount_box_data, options=clusterCount_layout, w=width, h=height, render_mode=render_mode),\
+           plot_chart('plotly', density_box_data, options=density_layout, w=width, h=height, render_mode=render_mode)
   except Exception as e:
     raise ValueError('Failed to prepare data for boxplots, error: {0}'.format(e))
 
-def get_qscore_distribution_plots(qByLaneDf, color_palette='colorblind', width=800, height=400):
+def get_qscore_distribution_plots(qByLaneDf, color_palette='colorblind', width=800, height=400, render_mode='iframe'):
   try:
     key_cols = [c for c in qByLaneDf.columns if c.startswith('Bin_')]
     if not isinstance(qByLaneDf, pd.DataFrame):
       raise TypeError('Expecting a Pandas DataFrame and got {0}'.format(type(qByLaneDf)))
-    qByLaneDf.fillna(0,inplace=True)
     qByLane_filt = \
       qByLaneDf[qByLaneDf['Lane'].\
-        isin(['0', '1', '2', '3', '4', '5', '6', '7', '8'])].copy()
+        isin(range(0, 9))].copy()
+    qByLane_filt.fillna(0,inplace=True)
     qByLane_filt = qByLane_filt.applymap(lambda x: int(x))
     colors = \
       sns.color_palette(
@@ -557,24 +1726,23 @@ def get_qscore_distribution_plots(qByLaneDf, color_palette='colorblind', width=8
           }]
         }
     }
-    chart_js = iplotter.ChartJSPlotter()
-    return chart_js.plot(data, options=options, chart_type="bar", w=width, h=height)
+    return plot_chart('chartjs', data, options=options, chart_type="bar", w=width, h=height, render_mode=render_mode)
   except Exception as e:
     raise ValueError('Failed to get qscore plot, error: {0}'.format(e))
 
-def get_qscore_bar_plots(q2030Df, color_palette='colorblind', width=1000, height=400):
+def get_qscore_bar_plots(q2030Df, color_palette='colorblind', width=1000, height=400, render_mode='iframe'):
   try:
     if not isinstance(q2030Df,pd.DataFrame):
       raise TypeError('Expecting a Pandas Dataframe and got {0}'.format(type(q2030Df)))
     for i in ('Lane', 'Tile', 'Cycle', 'MedianQScore'):
       if i not in q2030Df.columns:
         raise KeyError('Missing key column {0} in Q2030 df'.format(i))
-    q2030Df['Lane'] = q2030Df['Lane'].astype(int)
-    q2030Df['Cycle'] = q2030Df['Cycle'].astype(int)
-    q2030Df['MedianQScore'] = q2030Df['MedianQScore'].astype(int)
-    q2030Df['MedianQScore'] = \
-      np.where(q2030Df['MedianQScore'] > 50, 0, q2030Df['MedianQScore'])
-    q2030Df['Tile'] = q2030Df['Tile'].astype(int)
+    median_qscore = q2030Df['MedianQScore'].astype(int).values
+    q2030Df = \
+      pd.DataFrame({
+        'Lane': q2030Df['Lane'].astype(int).values,
+        'Cycle': q2030Df['Cycle'].astype(int).values,
+        'MedianQScore': np.where(median_qscore > 50, 0, median_qscore)})
     qscore_bar_plots = list()
     colors = \
       sns.color_palette(
@@ -622,8 +1790,8 @@ def get_qscore_bar_plots(q2030Df, color_palette='colorblind', width=1000, height
           }]
         }
     }
-      chart_js = iplotter.ChartJSPlotter()
-      qscore_bar_plots.append(chart_js.plot(data, options=options, chart_type="bar", w=width, h=height))
+      qscore_bar_plots.append(
+        plot_chart('chartjs', data, options=options, chart_type="bar", w=width, h=height, render_mode=render_mode))
     return qscore_bar_plots
   except Exception as e:
     raise ValueError('Failed to get qscore heatmap, error: {0}'.format(e))
@@ -656,63 +1824,37 @@ def color_report_table(
   except Exception as e:
     raise ValueError('Failed to color target columns, error: {0}'.format(e))
 
-def get_flowcell_plot(tileDf, key='ClusterCountPF', surface_cutoff=2000, width=1000, height=500):
+def get_flowcell_plot(tileDf, key='ClusterCountPF', flowcell_layout=None, width=1000, height=500, render_mode='iframe'):
+  """
+  A function for plotting heatmaps of a tile metric for both flowcell surfaces
+
+  :param tileDf: A Pandas dataframe containing the Tiles data
+  :param key: Tile metric column name, default 'ClusterCountPF'
+  :param flowcell_layout: A dict from read_flowcell_layout, default None for guessing it from the tile ids
+  :param width: Plot width, default 1000
+  :param height: Plot height, default 500
+  :param render_mode: iframe for iplotter plots or shared for plots using the get_report_js_bundle libraries, default iframe
+  :returns: A list of IPythondisplay.HTML objects for surface 1 and surface 2
+  """
   try:
     if not isinstance(tileDf, pd.DataFrame):
       raise TypeError('Expecting a Pandas dataframe, got {0}'.format(type(tileDf)))
-
-    for i in ('Lane', 'Tile', key):
-      if i not in tileDf.columns:
-        raise KeyError('Missing key {0} in tileDf'.format(i))
-
-    surface1_zdata = list()
-    surface2_zdata = list()
-    tileDf_filt = tileDf[tileDf['Lane']!=''].copy()
-    tileDf_filt['Lane'] = tileDf_filt['Lane'].astype(int)
-    tileDf_filt['Tile'] = tileDf_filt['Tile'].astype(int)
-    tileDf_filt[key] = tileDf_filt[key].astype(float)
-    if surface_cutoff == 2000:
-      tiles_count_le_2k = \
-        len([i for i in tileDf_filt.groupby('Tile').groups.keys() if int(i) < 2000])
-      if tiles_count_le_2k == 0:
-        surface_cutoff = 2200                                                   # reset surface cutoff
-    lanes = list()
-    for lane_id,l_data in tileDf_filt.groupby('Lane'):
-      lanes.append('Lane {0}'.format(lane_id))
-      surface1_zdata.append(
-        list(l_data[l_data['Tile'] < surface_cutoff].\
-          groupby('Tile')[key].agg('median').values))
-      surface2_zdata.append(
-        list(l_data[l_data['Tile'] >= surface_cutoff].\
-          groupby('Tile')[key].agg('median').values))
-    surface1_tiles = \
-      list(tileDf_filt[(tileDf_filt['Lane']==lane_id) & (tileDf_filt['Tile'] < surface_cutoff)].\
-          groupby('Tile').groups.keys())
-    surface2_tiles = \
-      list(tileDf_filt[(tileDf_filt['Lane']==lane_id) & (tileDf_filt['Tile'] >= surface_cutoff)].\
-          groupby('Tile').groups.keys())
-    surface1_tiles = [
-      'Tile {0}'.format(t)
-        for t in surface1_tiles
-          if int(t) < surface_cutoff]
-    surface2_tiles = [
-      'Tile {0}'.format(t)
-        for t in surface2_tiles
-          if int(t) >= surface_cutoff]
-    surface1_data = [{
-      "z": surface1_zdata,
-      "x": surface1_tiles,
-      "y": lanes,
-      "type": 'heatmap',
-      "colorscale": 'Viridis'
-    }]
-    surface2_data = [{
-      "z": surface2_zdata,
-      "x": surface2_tiles,
-      "y": lanes,
-      "type": 'heatmap',
-      "colorscale": 'Viridis'
-    }]
+    grid = \
+      get_flowcell_grid(
+        tileDf,
+        key=key,
+        flowcell_layout=flowcell_layout)
+    surface_data = list()
+    for surface_id in (1, 2):
+      surface = grid.get(surface_id, {'z': [], 'x': [], 'y': []})
+      surface_data.append([{
+        "z": get_heatmap_values(surface['z']),
+        "x": surface['x'],
+        "y": surface['y'],
+        "type": 'heatmap',
+        "colorscale": 'Viridis'
+      }])
+    surface1_data, surface2_data = surface_data
     surface1_layout = {
       "title": 'Flowcell surface 1 heatmap - {0}'.format(key),
       "xaxis": {
@@ -741,19 +1883,20 @@ def get_flowcell_plot(tileDf, key='ClusterCountPF', surface_cutoff=2000, width=1
         "tickson": 'boundaries'
       }
     }
-    surface1_plotter = iplotter.PlotlyPlotter()
-    surface2_plotter = iplotter.PlotlyPlotter()
-    return surface1_plotter.plot(surface1_data, layout=surface1_layout, w=width, h=height),\
-           surface2_plotter.plot(surface2_data, layout=surface2_layout, w=width, h=height)
+    return plot_chart('plotly', surface1_data, options=surface1_layout, w=width, h=height, render_mode=render_mode),\
+           plot_chart('plotly', surface2_data, options=surface2_layout, w=width, h=height, render_mode=render_mode)
   except Exception as e:
     raise ValueError('Failed to plot flowcell data, error: {0}'.format(e))
 
-def summary_report_and_plots_for_interop_dump(interop_dump, runInfoXml_path):
+def summary_report_and_plots_for_interop_dump(interop_dump, runInfoXml_path, box_stats=False, render_mode='iframe'):
   """
   A function for Interop report and plots generation
 
   :params interop_dump: Path to interop dump file generated using the interop_dumptext tool
   :params runInfoXml_path: Path to RunInfo.xml file for Illumina run
+  :params box_stats: Toggle for box plots with precomputed quartiles, whiskers and outliers, default False
+  :params render_mode: iframe for a full iplotter page per plot, or shared for a div and compact json data per plot,
+                       the notebook must display get_report_js_bundle once for the shared mode, default iframe
   :returns: Returns the following
 
     * merged_data_html: HTML formatted summary table
@@ -768,16 +1911,11 @@ def summary_report_and_plots_for_interop_dump(interop_dump, runInfoXml_path):
   """
   try:
     data = \
-      read_interop_data(filepath=interop_dump)
-    runinfoDf = read_runinfo_xml(runInfoXml_path)
-    merged_data = \
-      get_summary_stats(
-        tileDf=data.get('Tile'),
-        q2030Df=data.get('Q2030'),
-        extractionDf=data.get('Extraction'),
-        empiricalPhasingDf=data.get('EmpiricalPhasing'),
-        errorDf=data.get('Error'),
-        runinfoDf=runinfoDf)
+      read_interop_data(
+        filepath=interop_dump,
+        sections=['Tile', 'Q2030', 'Extraction', 'EmpiricalPhasing', 'Error', 'QByLane'])
+    run_metrics = RunMetrics(data, read_runinfo(runInfoXml_path))
+    merged_data = get_run_summary_stats(run_metrics)
     merged_data.columns = [c.capitalize().replace("_"," ") for c in merged_data.columns]
     merged_data_html = \
       HTML(
@@ -795,15 +1933,27 @@ def summary_report_and_plots_for_interop_dump(interop_dump, runInfoXml_path):
           axis=1,).\
         hide_index().render())
     intensity_plots = \
-      plot_intensity_data(extractionDf=data.get('Extraction'))
+      plot_intensity_data(
+        extractionDf=run_metrics.get('Extraction'),
+        render_mode=render_mode)
     (f_surface1,f_surface2) = \
-      get_flowcell_plot(tileDf=data.get('Tile'))
+      get_flowcell_plot(
+        tileDf=run_metrics.get('Tile'),
+        flowcell_layout=run_metrics.flowcell_layout,
+        render_mode=render_mode)
     (clusterCount_plot,density_plot) = \
-      get_box_plots(tilesDf=data.get('Tile'))
+      get_box_plots(
+        tilesDf=run_metrics.get('Tile'),
+        box_stats=box_stats,
+        render_mode=render_mode)
     qscore_distribution_plot = \
-      get_qscore_distribution_plots(qByLaneDf=data.get('QByLane'))
+      get_qscore_distribution_plots(
+        qByLaneDf=run_metrics.get('QByLane'),
+        render_mode=render_mode)
     qscore_bar_plots = \
-      get_qscore_bar_plots(q2030Df=data.get('Q2030'))
+      get_qscore_bar_plots(
+        q2030Df=run_metrics.get('Q2030'),
+        render_mode=render_mode)
     return merged_data_html, intensity_plots, clusterCount_plot, density_plot,\
            qscore_distribution_plot, qscore_bar_plots, f_surface1, f_surface2
   except Exception as e:
@@ -0,0 +1,243 @@
+import os, json, shutil, hashlib, logging, tempfile
+import pyarrow.feather as feather
+
+INTEROP_CACHE_DIR_NAME = '.interop_cache'
+INTEROP_CACHE_MAX_SIZE = 5 * 1024 ** 3
+INTEROP_CACHE_MANIFEST = 'manifest.json'
+
+def write_file_atomic(path, writer):
+  """
+  A function for writing a file through a temp file in the same dir, which replaces the target only if the writer succeeds
+
+  :param path: Output file path
+  :param writer: A function(temp_path) for writing the file content
+  """
+  fd, temp_path = \
+    tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+  os.close(fd)
+  try:
+    writer(temp_path)
+    os.replace(temp_path, path)
+  finally:
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+
+def get_interop_run_cache_key(run_path):
+  """
+  A function for calculating the cache key of a run from its RunInfo.xml and InterOp binary files
+
+  Only the path, size and mtime of each file are used, so the key doesn't need a dumptext
+  output and it changes when the instrument writes new metrics.
+
+  :param run_path: Path to the run folder
+  :returns: A hex digest string
+  """
+  try:
+    files = [os.path.join(run_path, 'RunInfo.xml')]
+    for root, dirs, filenames in os.walk(os.path.join(run_path, 'InterOp')):
+      dirs.sort()
+      files.extend(
+        os.path.join(root, f)
+          for f in sorted(filenames)
+            if f.endswith('.bin'))
+    key = hashlib.sha1()
+    for f in files:
+      stat = os.stat(f)
+      key.update(
+        '{0}:{1}:{2}\n'.format(
+          os.path.abspath(f),
+          stat.st_size,
+          stat.st_mtime_ns).encode())
+    return key.hexdigest()
+  except Exception as e:
+    raise ValueError('Failed to get cache key for run {0}, error: {1}'.format(run_path, e))
+
+def get_interop_dump_cache_key(filepath, cache_key='stat', run_path=None):
+  """
+  A function for calculating the cache key of a interop dumptext output
+
+  :param filepath: A interop dumptext output path
+  :param cache_key: Key type, 'stat' for path, size and mtime, 'hash' for file content or 'run' for the InterOp files of run_path, default 'stat'
+  :param run_path: Path to the run folder of the dump, required for the 'run' key type, default None
+  :returns: A hex digest string
+  """
+  try:
+    if cache_key == 'run':
+      if run_path is None:
+        raise ValueError('Run path is required for the run cache key')
+      return get_interop_run_cache_key(run_path)
+    stat = os.stat(filepath)
+    if cache_key == 'stat':
+      key = \
+        hashlib.sha1(
+          '{0}:{1}:{2}'.format(
+            os.path.abspath(filepath),
+            stat.st_size,
+            stat.st_mtime_ns).encode())
+    elif cache_key == 'hash':
+      key = hashlib.blake2b(digest_size=20)
+      key.update(str(stat.st_size).encode())
+      with open(filepath, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(8 * 1024 * 1024), b''):
+          key.update(chunk)
+    else:
+      raise ValueError('Unknown cache key type {0}'.format(cache_key))
+    return key.hexdigest()
+  except Exception as e:
+    raise ValueError('Failed to get cache key for {0}, error: {1}'.format(filepath, e))
+
+def get_interop_cache_size(cache_dir):
+  """
+  A function for listing the cache entries and their size on disk
+
+  :param cache_dir: Cache directory path
+  :returns: A list of dict with entry path, size and last used time, least recently used first
+  """
+  entries = list()
+  if not os.path.exists(cache_dir):
+    return entries
+  for entry in os.listdir(cache_dir):
+    entry_dir = os.path.join(cache_dir, entry)
+    if not os.path.isdir(entry_dir):
+      continue
+    size = 0
+    last_used = os.path.getmtime(entry_dir)
+    for f in os.listdir(entry_dir):
+      f_path = os.path.join(entry_dir, f)
+      size += os.path.getsize(f_path)
+      if f == INTEROP_CACHE_MANIFEST:
+        last_used = os.path.getmtime(f_path)
+    entries.append({
+      'path': entry_dir,
+      'size': size,
+      'last_used': last_used})
+  entries.sort(key=lambda e: e.get('last_used'))
+  return entries
+
+def evict_interop_cache(cache_dir, max_cache_size=INTEROP_CACHE_MAX_SIZE, keep=()):
+  """
+  A function for removing the least recently used cache entries till the cache fits in max_cache_size
+
+  :param cache_dir: Cache directory path
+  :param max_cache_size: Maximum cache size in bytes, default 5 GB
+  :param keep: A list of entry paths which should not be removed
+  :returns: A list of removed entry paths
+  """
+  entries = get_interop_cache_size(cache_dir)
+  total_size = sum([e.get('size') for e in entries])
+  removed = list()
+  for entry in entries:
+    if total_size <= max_cache_size:
+      break
+    if entry.get('path') in keep:
+      continue
+    shutil.rmtree(entry.get('path'), ignore_errors=True)
+    total_size -= entry.get('size')
+    removed.append(entry.get('path'))
+  return removed
+
+class InteropDumpCache:
+  """
+  A Feather file cache for parsed metric sections of a interop dumptext output
+
+  Each dump gets its own entry directory, named after the cache key, with one uncompressed
+  Feather file per section, so cached sections can be memory mapped. A manifest keeps the
+  section byte ranges of the dump, so a fully cached dump is never scanned again.
+
+  :param filepath: A interop dumptext output path
+  :param cache_dir: Cache directory path, default .interop_cache next to the dump
+  :param cache_key: Key type, 'stat' for path, size and mtime, 'hash' for file content or 'run' for the InterOp files of run_path, default 'stat'
+  :param max_cache_size: Maximum cache size in bytes, default 5 GB
+  :param run_path: Path to the run folder of the dump, for the 'run' key type, default None
+  """
+  def __init__(
+        self, filepath, cache_dir=None, cache_key='stat', max_cache_size=INTEROP_CACHE_MAX_SIZE,
+        run_path=None):
+    if cache_dir is None:
+      cache_dir = \
+        os.path.join(
+          os.path.dirname(os.path.abspath(filepath)),
+          INTEROP_CACHE_DIR_NAME)
+    self.filepath = filepath
+    self.cache_dir = cache_dir
+    self.max_cache_size = max_cache_size
+    self.key = \
+      get_interop_dump_cache_key(
+        filepath,
+        cache_key=cache_key,
+        run_path=run_path)
+    self.entry_dir = os.path.join(cache_dir, self.key)
+
+  def get_section_path(self, section):
+    return os.path.join(self.entry_dir, '{0}.feather'.format(section))
+
+  def clear(self):
+    """
+    Remove the cache entry for this dump
+    """
+    shutil.rmtree(self.entry_dir, ignore_errors=True)
+
+  def read_manifest(self):
+    """
+    :returns: A dict of section name and list of (start, end) byte offsets, or None if not cached
+    """
+    manifest = os.path.join(self.entry_dir, INTEROP_CACHE_MANIFEST)
+    if not os.path.exists(manifest):
+      return None
+    with open(manifest, 'r') as fp:
+      data = json.load(fp)
+    os.utime(manifest)
+    return {
+      section: [tuple(r) for r in ranges]
+        for section, ranges in data.get('sections').items()}
+
+  def write_manifest(self, ranges):
+    """
+    :param ranges: A dict of section name and list of (start, end) byte offsets
+    """
+    def write_json(path):
+      with open(path, 'w') as fp:
+        json.dump({
+          'filepath': os.path.abspath(self.filepath),
+          'sections': ranges}, fp)
+    try:
+      os.makedirs(self.entry_dir, exist_ok=True)
+      write_file_atomic(
+        os.path.join(self.entry_dir, INTEROP_CACHE_MANIFEST),
+        write_json)
+    except Exception as e:
+      logging.warning('Failed to write interop cache manifest, error: {0}'.format(e))
+
+  def has_section(self, section):
+    return os.path.exists(self.get_section_path(section))
+
+  def read_section(self, section):
+    """
+    :param section: Metric section name
+    :returns: A Pandas dataframe read from the memory mapped Feather file
+    """
+    table = \
+      feather.read_table(
+        self.get_section_path(section),
+        memory_map=True)
+    return table.to_pandas()
+
+  def write_section(self, section, df):
+    """
+    Write a parsed section to the cache and evict old entries if the cache is too large
+
+    :param section: Metric section name
+    :param df: A Pandas dataframe for the section
+    """
+    try:
+      os.makedirs(self.entry_dir, exist_ok=True)
+      write_file_atomic(
+        self.get_section_path(section),
+        lambda path: feather.write_feather(df, path, compression='uncompressed'))
+      evict_interop_cache(
+        cache_dir=self.cache_dir,
+        max_cache_size=self.max_cache_size,
+        keep=(self.entry_dir,))
+    except Exception as e:
+      logging.warning(
+        'Failed to cache interop section {0}, error: {1}'.format(section, e))
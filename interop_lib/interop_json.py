@@ -0,0 +1,261 @@
+import json, gzip, base64
+import numpy as np
+import pandas as pd
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INTEROP_JSON_FORMAT_VERSIONS = (1, 2, 3)
+INTEROP_JSON_COMPRESSION = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst'}
+PACKED_ARRAY_KEY = '__ndarray__'
+INTEROP_JSON_CHART_KEYS = (
+    'flowcell_data', 'intensity_data', 'cluster_count_data', 'density_data',
+    'qscore_bins_data', 'qscore_cycles_data', 'occupied_pass_filter')
+
+
+def convert_to_json_type(obj):
+    """
+    A function for converting NumPy and Pandas objects to types supported by json
+
+    :param obj: A NumPy array or scalar, or a Pandas Series or Index
+    :returns: A list or Python scalar
+    :raises: TypeError for other types
+    """
+    if isinstance(obj, (pd.Series, pd.Index)):
+        obj = obj.values
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(
+        'Object of type {0} is not JSON serializable'.format(type(obj).__name__))
+
+
+class InteropJSONEncoder(json.JSONEncoder):
+    """
+    A json encoder for chart data with NumPy arrays and scalars, see convert_to_json_type
+    """
+    def default(self, obj):
+        try:
+            return convert_to_json_type(obj)
+        except TypeError:
+            return super().default(obj)
+
+
+def dumps_interop_json(data, fast_json=False):
+    """
+    A function for serializing chart data with NumPy arrays
+
+    The default output is same as json.dumps on the equivalent lists. With fast_json, orjson
+    is used if it is installed, arrays are written without converting them to lists.
+    orjson output is compact and writes NaN as null.
+
+    :param data: A dict or list of chart data
+    :param fast_json: Toggle for using orjson, default False
+    :returns: A json string
+    """
+    try:
+        if fast_json and orjson is not None:
+            return \
+                orjson.dumps(
+                    data,
+                    default=convert_to_json_type,
+                    option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).\
+                decode('utf-8')
+        return json.dumps(data, cls=InteropJSONEncoder)
+    except Exception as e:
+        raise ValueError('Failed to serialize json data, error: {0}'.format(e))
+
+
+def compress_interop_json(data, compression=None):
+    """
+    A function for compressing a serialized json document
+
+    :param data: Json bytes
+    :param compression: None, gzip or zstd, default None
+    :returns: Compressed bytes
+    """
+    if compression not in INTEROP_JSON_COMPRESSION:
+        raise ValueError('Unknown json compression {0}'.format(compression))
+    if compression == 'gzip':
+        return gzip.compress(data)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstandard package is required for zstd compression')
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def write_interop_json(data, output_file, fast_json=False, compression=None):
+    """
+    A function for writing chart data with NumPy arrays to a json file
+
+    :param data: A dict or list of chart data
+    :param output_file: Output json path
+    :param fast_json: Toggle for using orjson, default False, see dumps_interop_json
+    :param compression: None, gzip or zstd for compressing the whole file, default None
+    """
+    try:
+        if fast_json and orjson is not None:
+            json_bytes = \
+                orjson.dumps(
+                    data,
+                    default=convert_to_json_type,
+                    option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        else:
+            json_bytes = \
+                json.dumps(data, cls=InteropJSONEncoder).\
+                encode('utf-8')
+        with open(output_file, 'wb') as fp:
+            fp.write(
+                compress_interop_json(
+                    json_bytes,
+                    compression=compression))
+    except Exception as e:
+        raise ValueError('Failed to write json file {0}, error: {1}'.format(output_file, e))
+
+
+def pack_array(arr):
+    """
+    A function for packing a NumPy array as base64 little-endian float32 or int32 buffer
+
+    Integers outside the int32 range are packed as int64.
+
+    :param arr: A NumPy array
+    :returns: A dict with the base64 buffer, dtype and shape
+    """
+    arr = np.asarray(arr)
+    if arr.dtype.kind in ('i', 'u', 'b'):
+        dtype = np.dtype('<i4')
+        if arr.size > 0 and \
+           (arr.min() < np.iinfo(np.int32).min or arr.max() > np.iinfo(np.int32).max):
+            dtype = np.dtype('<i8')
+    elif arr.dtype.kind == 'f':
+        dtype = np.dtype('<f4')
+    else:
+        raise TypeError('Unsupported array dtype {0}'.format(arr.dtype))
+    return {
+        PACKED_ARRAY_KEY: \
+            base64.b64encode(
+                np.ascontiguousarray(arr, dtype=dtype).tobytes()).\
+            decode('ascii'),
+        'dtype': dtype.str,
+        'shape': list(arr.shape)}
+
+
+def unpack_array(packed):
+    """
+    A function for unpacking an array packed by pack_array
+
+    :param packed: A dict with the base64 buffer, dtype and shape
+    :returns: A NumPy array
+    """
+    return \
+        np.frombuffer(
+            base64.b64decode(packed.get(PACKED_ARRAY_KEY)),
+            dtype=np.dtype(packed.get('dtype'))).\
+        reshape(packed.get('shape'))
+
+
+def pack_chart_arrays(data):
+    """
+    A function for replacing the numeric NumPy arrays in chart data with packed buffers, see pack_array
+
+    :param data: Chart data, a dict, list or NumPy array
+    :returns: Chart data with packed arrays
+    """
+    if isinstance(data, (pd.Series, pd.Index)):
+        data = data.values
+    if isinstance(data, np.ndarray):
+        if data.dtype.kind in ('i', 'u', 'b', 'f'):
+            return pack_array(data)
+        return data.tolist()
+    if isinstance(data, dict):
+        return {k: pack_chart_arrays(v) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [pack_chart_arrays(v) for v in data]
+    return data
+
+
+def unpack_chart_arrays(data, as_lists=False):
+    """
+    A function for replacing the packed buffers in chart data with arrays, see pack_chart_arrays
+
+    :param data: Chart data, a dict or list
+    :param as_lists: Toggle for returning lists instead of NumPy arrays, default False
+    :returns: Chart data with arrays
+    """
+    if isinstance(data, dict):
+        if PACKED_ARRAY_KEY in data:
+            arr = unpack_array(data)
+            return arr.tolist() if as_lists else arr
+        return {k: unpack_chart_arrays(v, as_lists=as_lists) for k, v in data.items()}
+    if isinstance(data, list):
+        return [unpack_chart_arrays(v, as_lists=as_lists) for v in data]
+    return data
+
+
+def decode_interop_json(data, as_lists=False):
+    """
+    A function for decoding a DB json document of any format version
+
+    Gzip and zstd compressed documents are detected from the first bytes. Charts
+    stored as json strings (format 1) are decoded and packed arrays (format 3) are
+    unpacked, so all the formats return the same nested chart data.
+
+    :param data: Json document as bytes or str, or a path to a json file
+    :param as_lists: Toggle for returning lists instead of NumPy arrays, default False
+    :returns: A dict of the DB json fields
+    """
+    try:
+        if isinstance(data, str) and \
+           not data.lstrip().startswith('{'):
+            with open(data, 'rb') as fp:
+                data = fp.read()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if data[:2] == b'\x1f\x8b':
+            data = gzip.decompress(data)
+        elif data[:4] == b'\x28\xb5\x2f\xfd':
+            if zstandard is None:
+                raise ValueError('zstandard package is required for zstd compressed json')
+            data = zstandard.ZstdDecompressor().decompress(data)
+        json_data = json.loads(data)
+        for key in INTEROP_JSON_CHART_KEYS:
+            value = json_data.get(key)
+            if isinstance(value, str):
+                json_data.update({
+                    key: json.loads(value) if value != '' else None})
+        return unpack_chart_arrays(json_data, as_lists=as_lists)
+    except Exception as e:
+        raise ValueError('Failed to decode DB json, error: {0}'.format(e))
+
+
+def encode_chart_data(data, json_format=1, fast_json=False):
+    """
+    A function for encoding one chart for the DB json
+
+    Format 1 stores each chart as a json string inside the DB json. Format 2 stores
+    the chart as a nested object, it is serialized once with the whole document.
+    Format 3 is same as format 2, with the numeric arrays packed by pack_array.
+
+    :param data: Chart data
+    :param json_format: DB json format version, 1, 2 or 3, default 1
+    :param fast_json: Toggle for using orjson, default False, see dumps_interop_json
+    :returns: A json string for format 1, or the chart data for format 2 and 3
+    """
+    if json_format not in INTEROP_JSON_FORMAT_VERSIONS:
+        raise ValueError('Unknown DB json format {0}'.format(json_format))
+    if json_format == 1:
+        return dumps_interop_json(data, fast_json=fast_json)
+    if json_format == 3:
+        return pack_chart_arrays(data)
+    return data
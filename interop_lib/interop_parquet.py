@@ -0,0 +1,223 @@
+import os, re, time, shutil, logging, tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from interop_data_plot import INTEROP_COMPACT_ID_COLUMNS
+from interop_data_plot import INTEROP_SECTION_DTYPES
+from interop_dask import load_run_metrics
+
+PARQUET_EXPORT_SECTIONS = [
+    'Tile', 'Q2030', 'Extraction', 'EmpiricalPhasing', 'Error', 'QByLane']
+PARQUET_RUNINFO_SECTION = 'RunInfo'
+PARQUET_PARTITION_COLUMNS = ('instrument', 'run', 'section')
+PARQUET_UNKNOWN_VALUE = 'unknown'
+
+
+def get_parquet_partition_value(value):
+    """
+    A function for cleaning a partition value for the dir name, characters other than letters, digits, '.', '-' and '_' are replaced with '_'
+
+    :param value: Partition value, e.g. instrument or run id
+    :returns: A string, PARQUET_UNKNOWN_VALUE for a missing value
+    """
+    if value is None or \
+       str(value).strip() == '':
+        return PARQUET_UNKNOWN_VALUE
+    return re.sub(r'[^A-Za-z0-9._-]', '_', str(value).strip())
+
+
+def get_run_parquet_dir(output_dir, instrument, run_id):
+    """
+    :param output_dir: Parquet dataset dir
+    :param instrument: Instrument id
+    :param run_id: Run id
+    :returns: Path of the run partition, output_dir/instrument=<instrument>/run=<run_id>
+    """
+    return \
+        os.path.join(
+            output_dir,
+            'instrument={0}'.format(get_parquet_partition_value(instrument)),
+            'run={0}'.format(get_parquet_partition_value(run_id)))
+
+
+def get_parquet_section_data(df, section):
+    """
+    A function for preparing a normalized interop section for the Parquet dataset
+
+    Id columns are stored as nullable int64. Other numeric columns get the int64 or float64
+    type of INTEROP_SECTION_DTYPES, not the type of the source, so the schema of a section
+    is same for runs read from the dumptext output and from the InterOp binary files.
+
+    :param df: A normalized Pandas dataframe, see normalize_interop_section
+    :param section: Section name, e.g. QByLane
+    :returns: A new Pandas dataframe
+    """
+    section_dtypes = INTEROP_SECTION_DTYPES.get(section, dict())
+    columns = dict()
+    for c in df.columns:
+        values = df[c]
+        if c in INTEROP_COMPACT_ID_COLUMNS:
+            values = values.astype('Int64')
+        elif pd.api.types.is_numeric_dtype(values) and \
+             not pd.api.types.is_bool_dtype(values):
+            dtype = section_dtypes.get(c, section_dtypes.get('default'))
+            if dtype is None:
+                dtype = values.dtype
+            if np.dtype(dtype).kind in ('i', 'u'):
+                values = values.astype('int64')
+            else:
+                values = values.astype('float64')
+        columns.update({c: values})
+    return pd.DataFrame(columns, columns=df.columns)
+
+
+def get_runinfo_section_data(run_info):
+    """
+    A function for building the RunInfo section of the Parquet dataset, one row per read with the run metadata
+
+    :param run_info: A RunInfo object from read_runinfo
+    :returns: A Pandas dataframe with read_id, cycles, start_cycle, index_read, run_date, run_number, flowcell and instrument_id columns
+    """
+    data = run_info.reads.copy()
+    data['read_id'] = data['read_id'].astype('int64')
+    data['cycles'] = data['cycles'].astype('int64')
+    data['start_cycle'] = data['start_cycle'].astype('int64')
+    data['run_date'] = pd.Series(run_info.run_date, index=data.index, dtype='datetime64[ns]')
+    data['run_number'] = run_info.run_number
+    data['flowcell'] = run_info.flowcell
+    data['instrument_id'] = run_info.instrument
+    return data
+
+
+def export_run_to_parquet(run, output_dir, sections=None, cache_dir=None, compression='snappy'):
+    """
+    A function for writing the interop sections of one run to a Parquet dataset partitioned by instrument, run and section
+
+    Each section is written to output_dir/instrument=<instrument>/run=<run_id>/section=<section>/part-0.parquet,
+    with a RunInfo section for the reads and run date. The run partition is written to a
+    temp dir first and replaces the old partition of the run, so exporting a run again
+    doesn't leave old files. Empty sections are skipped. Timestamps are written in
+    microseconds, Spark can't read nanosecond Parquet timestamps.
+
+    :param run: A dict with run_id and run_path, and optional interop_dump and runinfo_xml, see read_runs_for_batch
+    :param output_dir: Parquet dataset dir
+    :param sections: A list of section names, default PARQUET_EXPORT_SECTIONS
+    :param cache_dir: Interop section cache dir for the dumptext output, default None
+    :param compression: Parquet compression, default snappy
+    :returns: A dict with run_id, instrument, path and number of rows of each section
+    """
+    try:
+        if sections is None:
+            sections = PARQUET_EXPORT_SECTIONS
+        run_id = run.get('run_id')
+        run_metrics = \
+            load_run_metrics(
+                run=run,
+                sections=sections,
+                cache_dir=cache_dir)
+        instrument = run_metrics.run_info.instrument
+        run_dir = get_run_parquet_dir(output_dir, instrument, run_id)
+        os.makedirs(output_dir, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(dir=output_dir, prefix='.tmp-')
+        try:
+            section_rows = dict()
+            section_data = [(PARQUET_RUNINFO_SECTION, get_runinfo_section_data(run_metrics.run_info))]
+            for section in sections:
+                df = run_metrics.get(section)
+                if df is not None:
+                    section_data.append((section, get_parquet_section_data(df, section)))
+            for section, df in section_data:
+                if len(df.index) == 0:
+                    continue
+                section_dir = os.path.join(temp_dir, 'section={0}'.format(section))
+                os.makedirs(section_dir)
+                df.to_parquet(
+                    os.path.join(section_dir, 'part-0.parquet'),
+                    engine='pyarrow',
+                    compression=compression,
+                    index=False,
+                    coerce_timestamps='us',
+                    allow_truncated_timestamps=True)
+                section_rows.update({section: len(df.index)})
+            if os.path.exists(run_dir):
+                shutil.rmtree(run_dir)
+            os.makedirs(os.path.dirname(run_dir), exist_ok=True)
+            os.rename(temp_dir, run_dir)
+        finally:
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+        return {
+            'run_id': run_id,
+            'instrument': get_parquet_partition_value(instrument),
+            'path': run_dir,
+            'sections': section_rows}
+    except Exception as e:
+        raise ValueError('Failed to export run {0} to parquet, error: {1}'.format(run.get('run_id'), e))
+
+
+def process_run_for_parquet(run, **kwargs):
+    """
+    A function for exporting one run in a worker process, errors are returned as part of the result
+
+    :param run: A dict with run_id and run_path, see export_run_to_parquet
+    :param kwargs: Other arguments for export_run_to_parquet
+    :returns: A dict with run_id, status, error, sections and elapsed seconds
+    """
+    start_time = time.perf_counter()
+    result = {'run_id': run.get('run_id'), 'status': 'success', 'error': ''}
+    try:
+        result.update(export_run_to_parquet(run=run, **kwargs))
+    except Exception as e:
+        result.update({
+            'status': 'failed',
+            'error': '{0}: {1}'.format(type(e).__name__, e)})
+    result.update({'elapsed': round(time.perf_counter() - start_time, 3)})
+    return result
+
+
+def export_runs_to_parquet(runs, output_dir, workers=4, sections=None, cache_dir=None, compression='snappy'):
+    """
+    A function for exporting many runs to the Parquet dataset on a process pool
+
+    A failed run is logged and recorded in the results, it doesn't stop the export.
+
+    :param runs: A list of dicts with run_id and run_path, see read_runs_for_batch
+    :param output_dir: Parquet dataset dir
+    :param workers: Number of worker processes, default 4
+    :param sections: A list of section names, default PARQUET_EXPORT_SECTIONS
+    :param cache_dir: Interop section cache dir, default None
+    :param compression: Parquet compression, default snappy
+    :returns: A list of dicts with run_id, status, error, sections and elapsed seconds
+    """
+    try:
+        results = list()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    process_run_for_parquet,
+                    run=run,
+                    output_dir=output_dir,
+                    sections=sections,
+                    cache_dir=cache_dir,
+                    compression=compression): run
+                    for run in runs}
+            for future in as_completed(futures):
+                run = futures.get(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {
+                        'run_id': run.get('run_id'),
+                        'status': 'failed',
+                        'error': '{0}: {1}'.format(type(e).__name__, e),
+                        'elapsed': None}
+                if result.get('status') == 'success':
+                    logging.info(
+                        'Run {0} exported in {1}s'.format(result.get('run_id'), result.get('elapsed')))
+                else:
+                    logging.error(
+                        'Run {0} failed, error: {1}'.format(result.get('run_id'), result.get('error')))
+                results.append(result)
+        return results
+    except Exception as e:
+        raise ValueError('Failed to export runs to parquet, error: {0}'.format(e))
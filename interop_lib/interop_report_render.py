@@ -0,0 +1,154 @@
+import json, uuid
+import iplotter
+from IPython.display import HTML
+from interop_json import InteropJSONEncoder
+
+REPORT_RENDER_MODES = ('iframe', 'shared')
+REPORT_CHART_LIBRARIES = {
+    'chartjs': 'https://cdnjs.cloudflare.com/ajax/libs/Chart.js/2.5.0/Chart.bundle.min',
+    'plotly': 'https://cdn.plot.ly/plotly-latest.min'}
+
+REPORT_JS_BUNDLE = '''<script>
+(function() {
+  if (window.interopRenderCharts) {
+    window.interopRenderCharts();
+    return;
+  }
+  var libraries = %(libraries)s;
+  var loaded = {};
+  function renderChart(chart) {
+    var element = document.getElementById(chart.id);
+    if (element === null || element.getAttribute('data-rendered') !== null) {
+      return;
+    }
+    element.setAttribute('data-rendered', '1');
+    if (chart.library === 'chartjs') {
+      var canvas = document.createElement('canvas');
+      element.appendChild(canvas);
+      var options = Object.assign({responsive: true, maintainAspectRatio: false}, chart.options || {});
+      new loaded.chartjs(canvas.getContext('2d'), {type: chart.type, data: chart.data, options: options});
+    } else {
+      loaded.plotly.newPlot(element, chart.data, chart.layout || {});
+    }
+  }
+  function renderCharts() {
+    var queue = window.interopChartQueue || [];
+    while (queue.length > 0) {
+      renderChart(queue.shift());
+    }
+  }
+  function librariesLoaded() {
+    window.interopRenderCharts = renderCharts;
+    renderCharts();
+  }
+  if (typeof window.require === 'function' && typeof window.define === 'function' && window.define.amd) {
+    window.require.config({paths: {interop_chartjs: libraries.chartjs, interop_plotly: libraries.plotly}});
+    window.require(['interop_chartjs', 'interop_plotly'], function(Chart, Plotly) {
+      loaded.chartjs = Chart;
+      loaded.plotly = Plotly;
+      librariesLoaded();
+    });
+  } else {
+    var pending = 2;
+    [['chartjs', 'Chart'], ['plotly', 'Plotly']].forEach(function(library) {
+      var script = document.createElement('script');
+      script.src = libraries[library[0]] + '.js';
+      script.onload = function() {
+        loaded[library[0]] = window[library[1]];
+        pending -= 1;
+        if (pending === 0) {
+          librariesLoaded();
+        }
+      };
+      document.head.appendChild(script);
+    });
+  }
+})();
+</script>'''
+
+REPORT_CHART_TEMPLATE = '''<div id="{div_id}" style="position: relative; width: {w}px; height: {h}px"></div>
+<script>
+(window.interopChartQueue = window.interopChartQueue || []).push({payload});
+if (window.interopRenderCharts) {{ window.interopRenderCharts(); }}
+</script>'''
+
+
+def get_report_js_bundle():
+    """
+    A function for loading Chart.js and plotly.js once for all the charts of a report, see get_chart_html
+
+    It must be displayed once in the notebook, charts displayed before or after it are rendered
+    when the libraries are loaded. RequireJS is used if the page has it (e.g. classic notebook
+    and nbconvert html), else the libraries are added as script tags.
+
+    :returns: A IPython.display.HTML object
+    """
+    return HTML(REPORT_JS_BUNDLE % {'libraries': json.dumps(REPORT_CHART_LIBRARIES)})
+
+
+def get_chart_html(library, data, options=None, chart_type=None, w=800, h=420):
+    """
+    A function for building the HTML of a chart for the shared JS bundle, a div and a compact json payload
+
+    Chart.js charts get the same canvas size as the iplotter iframe, 90% of the width and 85% of the height.
+
+    :param library: chartjs or plotly
+    :param data: Chart data, Chart.js data dict or list of plotly traces
+    :param options: Chart.js options or plotly layout, default None
+    :param chart_type: Chart.js chart type, e.g. bar, default None
+    :param w: Width, default 800
+    :param h: Height, default 420
+    :returns: A HTML string
+    """
+    if library not in REPORT_CHART_LIBRARIES:
+        raise ValueError('Unknown chart library {0}'.format(library))
+    div_id = 'interop-chart-{0}'.format(uuid.uuid4().hex)
+    payload = {'id': div_id, 'library': library, 'data': data}
+    if library == 'chartjs':
+        payload.update({'type': chart_type, 'options': options})
+        w = w - (.1 * w)
+        h = h - (.15 * h)
+    else:
+        payload.update({'layout': options})
+    return \
+        REPORT_CHART_TEMPLATE.format(
+            div_id=div_id,
+            w=w,
+            h=h,
+            payload=\
+                json.dumps(payload, separators=(',', ':'), cls=InteropJSONEncoder).\
+                replace('</', '<\\/'))
+
+
+def plot_chart(library, data, options=None, chart_type=None, w=800, h=420, render_mode='iframe'):
+    """
+    A function for plotting a Chart.js or plotly.js chart
+
+    The iframe mode is the iplotter output, each chart is a full HTML page in an iframe with
+    its own script tags and indented data. The shared mode is a div and a compact json
+    payload, the libraries are loaded once by get_report_js_bundle.
+
+    :param library: chartjs or plotly
+    :param data: Chart data, Chart.js data dict or list of plotly traces
+    :param options: Chart.js options or plotly layout, default None
+    :param chart_type: Chart.js chart type, e.g. bar, default None
+    :param w: Width, default 800
+    :param h: Height, default 420
+    :param render_mode: iframe or shared, default iframe
+    :returns: A IPython.display.HTML object
+    """
+    if render_mode not in REPORT_RENDER_MODES:
+        raise ValueError('Unknown render mode {0}'.format(render_mode))
+    if render_mode == 'shared':
+        return \
+            HTML(
+                get_chart_html(
+                    library=library,
+                    data=data,
+                    options=options,
+                    chart_type=chart_type,
+                    w=w,
+                    h=h))
+    if library == 'chartjs':
+        return iplotter.ChartJSPlotter().plot(data, options=options, chart_type=chart_type, w=w, h=h)
+    return iplotter.PlotlyPlotter().plot(data, layout=options, w=w, h=h)
@@ -0,0 +1,385 @@
+import os, glob, json, sqlite3, hashlib, logging
+from contextlib import closing
+import pandas as pd
+try:
+    import joblib
+    import sklearn
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.compose import ColumnTransformer
+    from sklearn.model_selection import train_test_split
+    from sklearn.ensemble import RandomForestClassifier
+except ImportError:
+    joblib = None
+from interop_dump_cache import write_file_atomic
+from interop_data_plot import SEQRUN_FEATURE_SECTIONS
+from interop_data_plot import SEQRUN_FEATURE_COLUMNS
+from interop_data_plot import read_interop_data
+from interop_data_plot import read_runinfo
+from interop_data_plot import RunMetrics
+from interop_data_plot import get_run_features
+
+SEQRUN_ML_CACHE_DIR = \
+    os.environ.get(
+        'SEQRUN_ML_CACHE_DIR',
+        os.path.join(os.path.expanduser('~'), '.seqrun_ml'))
+SEQRUN_FEATURE_TABLE = 'seqrun_features'
+SEQRUN_LABEL_COLUMN = 'obs_failed'
+SEQRUN_INT_FEATURE_COLUMNS = ('total_median', 'median_qscore')
+SEQRUN_MODEL_PARAMS = {
+    'split_random_state': 0,
+    'random_state': 42,
+    'max_depth': 7}
+SEQRUN_MODEL_FILE_PREFIX = 'seqrun_model_'
+SEQRUN_MODEL_CACHE_SIZE = 8
+SQLITE_MAX_PARAMS = 500
+
+
+def check_sklearn():
+    if joblib is None:
+        raise ValueError('scikit-learn and joblib packages are required for the sequencing run model')
+
+
+def get_seqrun_features(seqrun_id, interop_dump, runinfo_xml, cache_dir=None):
+    """
+    A function for calculating the sequencing run ML model features from a interop dump, see get_run_features
+
+    Only the Tile, Q2030, Extraction, EmpiricalPhasing and Error sections of the dump are parsed.
+
+    :param seqrun_id: Sequencing run id
+    :param interop_dump: A interop dumptext output path
+    :param runinfo_xml: Filepath for RunInfo.xml
+    :param cache_dir: Interop section cache dir, default None for no cache
+    :returns: A Pandas dataframe with one row per lane
+    """
+    try:
+        data = \
+            read_interop_data(
+                filepath=interop_dump,
+                sections=SEQRUN_FEATURE_SECTIONS,
+                use_cache=cache_dir is not None,
+                cache_dir=cache_dir)
+        return \
+            get_run_features(
+                RunMetrics(data, read_runinfo(runinfo_xml)),
+                seqrun_id=seqrun_id)
+    except Exception as e:
+        raise ValueError('Failed to get features for run {0}, error: {1}'.format(seqrun_id, e))
+
+
+class SeqrunFeatureStore:
+    """
+    A SQLite store for the sequencing run ML model features, one row per seqrun_id and lane_id
+
+    Rows of a run are replaced when the run is added again.
+
+    :param db_path: SQLite db path, created if it doesn't exist
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS {0} ('
+                'seqrun_id TEXT NOT NULL, '
+                'lane_id INTEGER NOT NULL, '
+                '{1}, '
+                'updated_at TEXT DEFAULT CURRENT_TIMESTAMP, '
+                'PRIMARY KEY (seqrun_id, lane_id))'.\
+                    format(
+                        SEQRUN_FEATURE_TABLE,
+                        ', '.join('{0} REAL'.format(c) for c in SEQRUN_FEATURE_COLUMNS)))
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def add_features(self, features):
+        """
+        :param features: A Pandas dataframe from get_run_features, with seqrun_id and lane_id columns
+        :returns: Number of rows written
+        """
+        try:
+            for c in ['seqrun_id', 'lane_id'] + SEQRUN_FEATURE_COLUMNS:
+                if c not in features.columns:
+                    raise KeyError('Missing column {0} in features'.format(c))
+            rows = [
+                (str(row[0]), int(row[1])) + tuple(float(v) for v in row[2:])
+                    for row in features[['seqrun_id', 'lane_id'] + SEQRUN_FEATURE_COLUMNS].\
+                        itertuples(index=False, name=None)]
+            columns = ['seqrun_id', 'lane_id'] + SEQRUN_FEATURE_COLUMNS
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO {0} ({1}) VALUES ({2})'.\
+                        format(
+                            SEQRUN_FEATURE_TABLE,
+                            ', '.join(columns),
+                            ', '.join(['?'] * len(columns))),
+                    rows)
+            return len(rows)
+        except Exception as e:
+            raise ValueError('Failed to add features to store, error: {0}'.format(e))
+
+    def get_features(self, seqrun_ids=None):
+        """
+        :param seqrun_ids: A list of sequencing run ids, default None for all the runs
+        :returns: A Pandas dataframe with seqrun_id, lane_id and feature columns, sorted by seqrun_id and lane_id
+        """
+        try:
+            query = \
+                'SELECT seqrun_id, lane_id, {0} FROM {1}'.\
+                    format(', '.join(SEQRUN_FEATURE_COLUMNS), SEQRUN_FEATURE_TABLE)
+            with closing(self._connect()) as conn:
+                if seqrun_ids is None:
+                    data = pd.read_sql_query(query, conn)
+                else:
+                    seqrun_ids = [str(i) for i in seqrun_ids]
+                    data = [
+                        pd.read_sql_query(
+                            '{0} WHERE seqrun_id IN ({1})'.\
+                                format(query, ', '.join(['?'] * len(chunk))),
+                            conn,
+                            params=chunk)
+                            for chunk in [
+                                seqrun_ids[i:i + SQLITE_MAX_PARAMS]
+                                    for i in range(0, len(seqrun_ids), SQLITE_MAX_PARAMS)]]
+                    data = \
+                        pd.concat(data, ignore_index=True) if len(data) > 0 else \
+                        pd.read_sql_query('{0} LIMIT 0'.format(query), conn)
+            return \
+                data.\
+                    sort_values(['seqrun_id', 'lane_id']).\
+                    reset_index(drop=True)
+        except Exception as e:
+            raise ValueError('Failed to get features from store, error: {0}'.format(e))
+
+    def has_run(self, seqrun_id):
+        """
+        :param seqrun_id: Sequencing run id
+        :returns: True if the store has features for the run
+        """
+        with closing(self._connect()) as conn:
+            return \
+                conn.execute(
+                    'SELECT 1 FROM {0} WHERE seqrun_id = ? LIMIT 1'.format(SEQRUN_FEATURE_TABLE),
+                    (str(seqrun_id),)).\
+                fetchone() is not None
+
+    def remove_run(self, seqrun_id):
+        """
+        :param seqrun_id: Sequencing run id
+        :returns: Number of rows removed
+        """
+        with closing(self._connect()) as conn, conn:
+            return \
+                conn.execute(
+                    'DELETE FROM {0} WHERE seqrun_id = ?'.format(SEQRUN_FEATURE_TABLE),
+                    (str(seqrun_id),)).\
+                rowcount
+
+    def get_or_add_run_features(self, seqrun_id, interop_dump, runinfo_xml, refresh=False, cache_dir=None):
+        """
+        A function for reading the features of a run from the store, they are calculated and added if the run is missing
+
+        :param seqrun_id: Sequencing run id
+        :param interop_dump: A interop dumptext output path
+        :param runinfo_xml: Filepath for RunInfo.xml
+        :param refresh: Toggle for calculating the features again, default False
+        :param cache_dir: Interop section cache dir, default None
+        :returns: A Pandas dataframe with one row per lane
+        """
+        if refresh or \
+           not self.has_run(seqrun_id):
+            features = \
+                get_seqrun_features(
+                    seqrun_id=seqrun_id,
+                    interop_dump=interop_dump,
+                    runinfo_xml=runinfo_xml,
+                    cache_dir=cache_dir)
+            self.remove_run(seqrun_id)
+            self.add_features(features)
+        return self.get_features(seqrun_ids=[seqrun_id])
+
+
+def read_seqrun_training_data(training_data):
+    """
+    A function for reading the sequencing run model training data, with the dtypes of the seqrun_ml notebook
+
+    :param training_data: A csv path or a Pandas dataframe with the feature columns and obs_failed label column
+    :returns: A Pandas dataframe
+    """
+    try:
+        if isinstance(training_data, pd.DataFrame):
+            training_data = training_data.copy()
+        else:
+            training_data = pd.read_csv(training_data)
+        for c in SEQRUN_FEATURE_COLUMNS + [SEQRUN_LABEL_COLUMN]:
+            if c not in training_data.columns:
+                raise KeyError('Missing column {0} in training data'.format(c))
+            if c in SEQRUN_INT_FEATURE_COLUMNS or \
+               c == SEQRUN_LABEL_COLUMN:
+                training_data[c] = training_data[c].astype(int)
+            else:
+                training_data[c] = training_data[c].astype(float)
+        return training_data
+    except Exception as e:
+        raise ValueError('Failed to read training data, error: {0}'.format(e))
+
+
+def get_training_data_key(training_data, model_params):
+    """
+    A function for calculating the model cache key from the training data, model parameters and scikit-learn version
+
+    :param training_data: A Pandas dataframe from read_seqrun_training_data
+    :param model_params: A dict of model parameters, see SEQRUN_MODEL_PARAMS
+    :returns: A hex digest string
+    """
+    key = hashlib.sha1()
+    key.update(
+        pd.util.hash_pandas_object(
+            training_data[SEQRUN_FEATURE_COLUMNS + [SEQRUN_LABEL_COLUMN]],
+            index=False).\
+        values.\
+        tobytes())
+    key.update(json.dumps(model_params, sort_keys=True).encode())
+    key.update(sklearn.__version__.encode())
+    return key.hexdigest()
+
+
+def fit_seqrun_model(training_data, model_params=None):
+    """
+    A function for fitting the scaler and RandomForest classifier of the seqrun_ml notebook
+
+    :param training_data: A Pandas dataframe from read_seqrun_training_data
+    :param model_params: A dict of model parameters, default SEQRUN_MODEL_PARAMS
+    :returns: A dict with column_transformer, model, train_score, test_score, X_test_scaled and y_test
+    """
+    check_sklearn()
+    if model_params is None:
+        model_params = SEQRUN_MODEL_PARAMS
+    targets = training_data[SEQRUN_LABEL_COLUMN].values
+    X_train, X_test, y_train, y_test = \
+        train_test_split(
+            training_data[SEQRUN_FEATURE_COLUMNS],
+            targets,
+            random_state=model_params.get('split_random_state'))
+    ct = \
+        ColumnTransformer([(
+            'scaled', StandardScaler(), SEQRUN_FEATURE_COLUMNS)])
+    ct.fit(X_train)
+    X_train_scaled = ct.transform(X_train)
+    X_test_scaled = ct.transform(X_test)
+    model = \
+        RandomForestClassifier(
+            random_state=model_params.get('random_state'),
+            max_depth=model_params.get('max_depth'))
+    model.fit(X_train_scaled, y_train)
+    return {
+        'column_transformer': ct,
+        'model': model,
+        'train_score': model.score(X_train_scaled, y_train),
+        'test_score': model.score(X_test_scaled, y_test),
+        'X_test_scaled': X_test_scaled,
+        'y_test': y_test}
+
+
+def evict_seqrun_models(cache_dir, max_models=SEQRUN_MODEL_CACHE_SIZE, keep=()):
+    """
+    A function for removing the least recently used model cache files till max_models are left
+
+    Loading a cached model updates its mtime, see get_seqrun_model. Files removed
+    by another process at the same time are skipped.
+
+    :param cache_dir: Model cache dir
+    :param max_models: Maximum number of cached models, default SEQRUN_MODEL_CACHE_SIZE
+    :param keep: A list of model file paths which should not be removed
+    :returns: A list of removed model file paths
+    """
+    model_files = list()
+    for model_file in glob.glob(os.path.join(cache_dir, '{0}*.joblib'.format(SEQRUN_MODEL_FILE_PREFIX))):
+        try:
+            model_files.append((os.path.getmtime(model_file), model_file))
+        except FileNotFoundError:
+            continue
+    model_files.sort()
+    removed = list()
+    for _, model_file in model_files[:max(len(model_files) - max_models, 0)]:
+        if model_file in keep:
+            continue
+        try:
+            os.remove(model_file)
+            removed.append(model_file)
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def get_seqrun_model(
+    training_data, cache_dir=None, model_params=None, refresh=False,
+    max_cached_models=SEQRUN_MODEL_CACHE_SIZE):
+    """
+    A function for loading the fitted sequencing run model from the joblib cache, the model is fitted if the cache is missing
+
+    The cache file name has a key of the training data, model parameters and scikit-learn
+    version, so the model is fitted again when any of them changes. The cache dir can be
+    shared by notebooks with different training data, only the least recently used models
+    beyond max_cached_models are removed, see evict_seqrun_models.
+
+    :param training_data: A csv path or a Pandas dataframe, see read_seqrun_training_data
+    :param cache_dir: Model cache dir, default SEQRUN_ML_CACHE_DIR
+    :param model_params: A dict of model parameters, default SEQRUN_MODEL_PARAMS
+    :param refresh: Toggle for fitting the model again, default False
+    :param max_cached_models: Maximum number of cached models, default SEQRUN_MODEL_CACHE_SIZE
+    :returns: A dict from fit_seqrun_model, with training_data_key
+    """
+    try:
+        check_sklearn()
+        if cache_dir is None:
+            cache_dir = SEQRUN_ML_CACHE_DIR
+        if model_params is None:
+            model_params = SEQRUN_MODEL_PARAMS
+        training_data = read_seqrun_training_data(training_data)
+        key = get_training_data_key(training_data, model_params)
+        model_file = \
+            os.path.join(
+                cache_dir,
+                '{0}{1}.joblib'.format(SEQRUN_MODEL_FILE_PREFIX, key))
+        if not refresh and \
+           os.path.exists(model_file):
+            try:
+                model_data = joblib.load(model_file)
+                os.utime(model_file)
+                return model_data
+            except Exception as e:
+                logging.warning('Failed to load cached model {0}, error: {1}'.format(model_file, e))
+        model_data = fit_seqrun_model(training_data, model_params=model_params)
+        model_data.update({'training_data_key': key})
+        os.makedirs(cache_dir, exist_ok=True)
+        write_file_atomic(
+            model_file,
+            lambda path: joblib.dump(model_data, path))
+        evict_seqrun_models(
+            cache_dir,
+            max_models=max_cached_models,
+            keep=[model_file])
+        return model_data
+    except Exception as e:
+        raise ValueError('Failed to get sequencing run model, error: {0}'.format(e))
+
+
+def predict_seqrun_lanes(model_data, features):
+    """
+    A function for predicting low quality lanes of a run
+
+    :param model_data: A dict from get_seqrun_model
+    :param features: A Pandas dataframe from get_run_features or SeqrunFeatureStore
+    :returns: A Pandas dataframe with seqrun_id, lane_id and is_low columns
+    """
+    try:
+        predictions = features[['seqrun_id', 'lane_id']].copy()
+        predictions['is_low'] = \
+            model_data.get('model').predict(
+                model_data.get('column_transformer').transform(
+                    features[SEQRUN_FEATURE_COLUMNS]))
+        return predictions
+    except Exception as e:
+        raise ValueError('Failed to predict lanes, error: {0}'.format(e))
@@ -0,0 +1,262 @@
+import os
+try:
+    from pyspark.sql import SparkSession, Window
+    from pyspark.sql import functions as F
+except ImportError:
+    SparkSession = None
+from interop_parquet import PARQUET_RUNINFO_SECTION
+
+TREND_PERIODS = ('day', 'week', 'month', 'quarter', 'year')
+
+
+def check_spark():
+    if SparkSession is None:
+        raise ValueError('pyspark package is required for interop trends')
+
+
+def get_spark_session(
+    app_name='interop_trends', master='local[*]', ui_port=4040, driver_memory=None,
+    shuffle_partitions=16):
+    """
+    A function for starting a local mode SparkSession for the interop Parquet dataset
+
+    Partition column type inference is turned off, so instrument and run ids are always
+    read as strings, and the session time zone is UTC for the run dates.
+
+    :param app_name: Spark app name, default interop_trends
+    :param master: Spark master, default local[*]
+    :param ui_port: Spark UI port, default 4040
+    :param driver_memory: Driver memory, e.g. 8g, default None for the Spark default
+    :param shuffle_partitions: Number of shuffle partitions, default 16
+    :returns: A SparkSession object
+    """
+    try:
+        check_spark()
+        builder = \
+            SparkSession.builder.\
+                master(master).\
+                appName(app_name).\
+                config('spark.ui.port', str(ui_port)).\
+                config('spark.sql.shuffle.partitions', str(shuffle_partitions)).\
+                config('spark.sql.sources.partitionColumnTypeInference.enabled', 'false').\
+                config('spark.sql.session.timeZone', 'UTC')
+        if driver_memory is not None:
+            builder = builder.config('spark.driver.memory', driver_memory)
+        return builder.getOrCreate()
+    except Exception as e:
+        raise ValueError('Failed to start spark session, error: {0}'.format(e))
+
+
+def read_parquet_section(spark, dataset_path, section):
+    """
+    A function for reading one section of all the runs from the interop Parquet dataset, see export_run_to_parquet
+
+    :param spark: A SparkSession object
+    :param dataset_path: Parquet dataset dir
+    :param section: Section name
+    :returns: A Spark dataframe with instrument and run columns
+    """
+    return \
+        spark.read.\
+            option('basePath', dataset_path).\
+            option('mergeSchema', 'true').\
+            parquet(
+                os.path.join(
+                    dataset_path, 'instrument=*', 'run=*', 'section={0}'.format(section))).\
+            drop('section')
+
+
+def get_run_reads(spark, dataset_path):
+    """
+    :param spark: A SparkSession object
+    :param dataset_path: Parquet dataset dir
+    :returns: A Spark dataframe with instrument, run, run_date, read_id, cycles, start_cycle and index_read columns
+    """
+    return \
+        read_parquet_section(spark, dataset_path, PARQUET_RUNINFO_SECTION).\
+            select(
+                'instrument', 'run', 'run_date', 'read_id', 'cycles',
+                'start_cycle', 'index_read')
+
+
+def get_run_dates(spark, dataset_path):
+    """
+    :param spark: A SparkSession object
+    :param dataset_path: Parquet dataset dir
+    :returns: A Spark dataframe with instrument, run, run_date and flowcell columns, one row per run
+    """
+    return \
+        read_parquet_section(spark, dataset_path, PARQUET_RUNINFO_SECTION).\
+            select('instrument', 'run', 'run_date', 'flowcell').\
+            dropDuplicates(['instrument', 'run'])
+
+
+def map_cycles_to_reads(df, reads):
+    """
+    A function for adding read_id, read_cycle, read_cycles and index_read columns to a Spark dataframe with a Cycle column
+
+    :param df: A Spark dataframe with instrument, run and Cycle columns
+    :param reads: A Spark dataframe from get_run_reads
+    :returns: A Spark dataframe, cycles outside the reads have null read columns
+    """
+    return \
+        df.alias('m').\
+            join(
+                F.broadcast(reads).alias('r'),
+                (F.col('m.instrument') == F.col('r.instrument')) & \
+                (F.col('m.run') == F.col('r.run')) & \
+                (F.col('m.Cycle') > F.col('r.start_cycle')) & \
+                (F.col('m.Cycle') <= F.col('r.start_cycle') + F.col('r.cycles')),
+                'left').\
+            select(
+                'm.*',
+                F.col('r.read_id').alias('read_id'),
+                (F.col('m.Cycle') - F.col('r.start_cycle')).alias('read_cycle'),
+                F.col('r.cycles').alias('read_cycles'),
+                F.col('r.index_read').alias('index_read'))
+
+
+def add_trend_period(df, period):
+    if period not in TREND_PERIODS:
+        raise ValueError('Unknown trend period {0}'.format(period))
+    return df.withColumn('period', F.date_trunc(period, F.col('run_date')))
+
+
+def get_q30_by_cycle_trend(spark, dataset_path, period=None):
+    """
+    A function for calculating the Q30 percentage of each cycle of each run, or of each read cycle of each period
+
+    Cycles are mapped to reads, so runs with different read layouts are compared by read
+    and cycle within the read.
+
+    :param spark: A SparkSession object
+    :param dataset_path: Parquet dataset dir
+    :param period: None for one row per run and cycle, or one of TREND_PERIODS for summing the runs of each instrument and period
+    :returns: A Spark dataframe with q30_pct column
+    """
+    try:
+        q30_data = \
+            read_parquet_section(spark, dataset_path, 'Q2030').\
+                groupBy('instrument', 'run', 'Cycle').\
+                agg(
+                    F.sum('Q30').alias('Q30'),
+                    F.sum('Total').alias('Total'))
+        q30_data = \
+            map_cycles_to_reads(q30_data, get_run_reads(spark, dataset_path)).\
+                join(
+                    get_run_dates(spark, dataset_path),
+                    on=['instrument', 'run'],
+                    how='left')
+        if period is None:
+            return \
+                q30_data.\
+                    withColumn('q30_pct', F.col('Q30') / F.col('Total') * 100).\
+                    orderBy('instrument', 'run_date', 'run', 'Cycle')
+        return \
+            add_trend_period(q30_data, period).\
+                groupBy('instrument', 'period', 'read_id', 'read_cycle').\
+                agg(
+                    F.sum('Q30').alias('Q30'),
+                    F.sum('Total').alias('Total'),
+                    F.countDistinct('run').alias('runs')).\
+                withColumn('q30_pct', F.col('Q30') / F.col('Total') * 100).\
+                orderBy('instrument', 'period', 'read_id', 'read_cycle')
+    except Exception as e:
+        raise ValueError('Failed to get Q30 by cycle trend, error: {0}'.format(e))
+
+
+def get_tile_density_drift(spark, dataset_path):
+    """
+    A function for calculating the density of each tile of each run and its drift across the runs of an instrument
+
+    Runs of an instrument are ordered by run date. relative_density is the tile density over
+    the lane median of the run, so a tile drifting against the other tiles is separated from
+    a change of the loading concentration.
+
+    :param spark: A SparkSession object
+    :param dataset_path: Parquet dataset dir
+    :returns: A Spark dataframe with instrument, run, run_date, Lane, Tile, density, density_pf,
+              previous_density, density_change, tile_mean_density, density_deviation,
+              relative_density and relative_density_change columns
+    """
+    try:
+        tile_data = \
+            read_parquet_section(spark, dataset_path, 'Tile').\
+                groupBy('instrument', 'run', 'Lane', 'Tile').\
+                agg(
+                    F.avg('Density').alias('density'),
+                    F.avg('DensityPF').alias('density_pf')).\
+                join(
+                    get_run_dates(spark, dataset_path),
+                    on=['instrument', 'run'],
+                    how='left')
+        tile_window = \
+            Window.\
+                partitionBy('instrument', 'Lane', 'Tile').\
+                orderBy('run_date', 'run')
+        tile_all_window = \
+            Window.partitionBy('instrument', 'Lane', 'Tile')
+        lane_window = \
+            Window.partitionBy('instrument', 'run', 'Lane')
+        return \
+            tile_data.\
+                withColumn('previous_density', F.lag('density').over(tile_window)).\
+                withColumn('density_change', F.col('density') - F.col('previous_density')).\
+                withColumn('tile_mean_density', F.avg('density').over(tile_all_window)).\
+                withColumn('density_deviation', F.col('density') / F.col('tile_mean_density') - 1).\
+                withColumn(
+                    'relative_density',
+                    F.col('density') / F.expr('percentile_approx(density, 0.5)').over(lane_window)).\
+                withColumn(
+                    'relative_density_change',
+                    F.col('relative_density') - F.lag('relative_density').over(tile_window)).\
+                orderBy('instrument', 'Lane', 'Tile', 'run_date', 'run')
+    except Exception as e:
+        raise ValueError('Failed to get tile density drift, error: {0}'.format(e))
+
+
+def get_lane_error_rate_trend(spark, dataset_path, period=None):
+    """
+    A function for calculating the mean error rate of each lane of each run, or of each lane of each period
+
+    Last cycle of each read is skipped, same as the summary stats table.
+
+    :param spark: A SparkSession object
+    :param dataset_path: Parquet dataset dir
+    :param period: None for one row per run and lane, or one of TREND_PERIODS for the mean of the runs of each instrument and period
+    :returns: A Spark dataframe with error_rate column
+    """
+    try:
+        error_data = \
+            map_cycles_to_reads(
+                read_parquet_section(spark, dataset_path, 'Error'),
+                get_run_reads(spark, dataset_path)).\
+                where(F.col('read_cycle') < F.col('read_cycles')).\
+                groupBy('instrument', 'run', 'Lane').\
+                agg(
+                    F.avg('ErrorRate').alias('error_rate'),
+                    F.countDistinct('Cycle').alias('error_cycles')).\
+                join(
+                    get_run_dates(spark, dataset_path),
+                    on=['instrument', 'run'],
+                    how='left')
+        if period is None:
+            return \
+                error_data.\
+                    orderBy('instrument', 'run_date', 'run', 'Lane')
+        return \
+            add_trend_period(error_data, period).\
+                groupBy('instrument', 'period', 'Lane').\
+                agg(
+                    F.avg('error_rate').alias('error_rate'),
+                    F.max('error_rate').alias('max_error_rate'),
+                    F.countDistinct('run').alias('runs')).\
+                orderBy('instrument', 'period', 'Lane')
+    except Exception as e:
+        raise ValueError('Failed to get lane error rate trend, error: {0}'.format(e))
+
+
+INTEROP_TRENDS = {
+    'q30_by_cycle': get_q30_by_cycle_trend,
+    'tile_density_drift': get_tile_density_drift,
+    'lane_error_rate': get_lane_error_rate_trend}
@@ -0,0 +1,104 @@
+import json, time, logging, resource
+from contextlib import contextmanager
+
+
+def get_resource_snapshot():
+    """
+    A function for reading wall time, CPU time and peak RSS of this process and its finished subprocesses
+
+    :returns: A dict with wall, cpu, children_cpu, peak_rss_mb and children_peak_rss_mb
+    """
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'wall': time.perf_counter(),
+        'cpu': self_usage.ru_utime + self_usage.ru_stime,
+        'children_cpu': children_usage.ru_utime + children_usage.ru_stime,
+        'peak_rss_mb': self_usage.ru_maxrss / 1024,
+        'children_peak_rss_mb': children_usage.ru_maxrss / 1024}
+
+
+class InteropStageTimer:
+    """
+    A class for recording wall time, CPU time, peak RSS and row counts for each stage of a run
+
+    CPU time of a stage includes the subprocesses which finished during that stage, e.g.
+    interop_dumptext. Peak RSS is the high-water mark of the process at the end of the
+    stage, a non-zero peak_rss_increase_mb marks the stage which raised the peak.
+
+    :param run_name: Run name for the log lines
+    :param log_stages: Toggle for logging each stage when it ends, default True
+    """
+    def __init__(self, run_name, log_stages=True):
+        self.run_name = run_name
+        self.log_stages = log_stages
+        self.stages = list()
+        self._start = get_resource_snapshot()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        A context manager for recording one stage, the yielded dict can be updated with row counts
+
+        :param name: Stage name
+        """
+        counts = dict()
+        start = get_resource_snapshot()
+        try:
+            yield counts
+        except Exception as e:
+            counts.update({'error': str(e)})
+            raise
+        finally:
+            end = get_resource_snapshot()
+            record = {
+                'stage': name,
+                'wall_time': round(end['wall'] - start['wall'], 4),
+                'cpu_time': \
+                    round(
+                        (end['cpu'] - start['cpu']) + \
+                        (end['children_cpu'] - start['children_cpu']), 4),
+                'peak_rss_mb': round(end['peak_rss_mb'], 1),
+                'peak_rss_increase_mb': round(end['peak_rss_mb'] - start['peak_rss_mb'], 1)}
+            record.update(counts)
+            self.stages.append(record)
+            if self.log_stages:
+                logging.info(
+                    'Run {0} stage {1}: {2}s wall, {3}s CPU, {4} MB peak RSS{5}'.\
+                        format(
+                            self.run_name, name, record['wall_time'], record['cpu_time'],
+                            record['peak_rss_mb'],
+                            ''.join(
+                                ', {0} {1}'.format(v, k)
+                                    for k, v in counts.items())))
+
+    def get_summary(self):
+        """
+        :returns: A dict with run_name, total wall and CPU time, peak RSS of the run and its subprocesses and the list of stages
+        """
+        end = get_resource_snapshot()
+        return {
+            'run_name': self.run_name,
+            'wall_time': round(end['wall'] - self._start['wall'], 4),
+            'cpu_time': \
+                round(
+                    (end['cpu'] - self._start['cpu']) + \
+                    (end['children_cpu'] - self._start['children_cpu']), 4),
+            'peak_rss_mb': round(end['peak_rss_mb'], 1),
+            'children_peak_rss_mb': round(end['children_peak_rss_mb'], 1),
+            'stages': list(self.stages)}
+
+    def write(self, output_file):
+        """
+        A function for writing the stage summary as json
+
+        :param output_file: Output json path
+        :returns: The summary dict, see get_summary
+        """
+        try:
+            summary = self.get_summary()
+            with open(output_file, 'w') as fp:
+                json.dump(summary, fp, indent=2)
+            return summary
+        except Exception as e:
+            raise ValueError('Failed to write stage summary, error: {0}'.format(e))
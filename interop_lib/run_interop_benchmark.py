@@ -0,0 +1,92 @@
+import sys, json, argparse, logging
+from interop_benchmark import BENCHMARK_SCALES
+from interop_benchmark import BENCHMARK_FUNCTIONS
+from interop_benchmark import run_benchmark_suite
+from interop_benchmark import compare_benchmark_results
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--scale', action='append', default=None, help='Benchmark scale, can be used more than once, default all of {0}'.format(', '.join(BENCHMARK_SCALES.keys())))
+    parser.add_argument('-f', '--function', action='append', default=None, help='Benchmark function, can be used more than once, default all of {0}'.format(', '.join(BENCHMARK_FUNCTIONS)))
+    parser.add_argument('-d', '--data_dir', default=None, help='Dir for the synthetic runs, existing runs are reused, default ./benchmark_data')
+    parser.add_argument('-r', '--repeat', default=3, type=int, help='Number of timed calls for each function')
+    parser.add_argument('-o', '--output_file', required=True, help='Output json path')
+    parser.add_argument('-b', '--baseline', default=None, help='Baseline json from an earlier run, regressions are flagged')
+    parser.add_argument('-t', '--time_threshold', default=0.1, type=float, help='Allowed median time increase against the baseline, default 0.1')
+    parser.add_argument('-m', '--memory_threshold', default=0.1, type=float, help='Allowed peak RSS increase against the baseline, default 0.1')
+    parser.add_argument('--no_imaging', default=False, action='store_true', help='Skip the imaging table')
+    parser.add_argument('--lanes', default=None, type=int, help='Custom scale: number of lanes')
+    parser.add_argument('--surfaces', default=2, type=int, help='Custom scale: number of surfaces')
+    parser.add_argument('--swaths', default=2, type=int, help='Custom scale: number of swaths')
+    parser.add_argument('--sections', default=1, type=int, help='Custom scale: number of sections per swath, more than 1 for FiveDigit tile names')
+    parser.add_argument('--tiles_per_swath', default=10, type=int, help='Custom scale: number of tiles per swath, or per section, 1 to 99')
+    parser.add_argument('--read_cycles', default='151,8,8,151', help='Custom scale: comma separated cycles of each read, reads with less than 20 cycles are index reads')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        scales = args.scale
+        custom_scales = None
+        if args.lanes is not None:
+            read_cycles = [int(c) for c in args.read_cycles.split(',')]
+            custom_scales = {
+                'custom': {
+                    'lanes': args.lanes,
+                    'surfaces': args.surfaces,
+                    'swaths': args.swaths,
+                    'sections': args.sections,
+                    'tiles_per_swath': args.tiles_per_swath,
+                    'reads': [
+                        (i + 1, c, 'Y' if c < 20 else 'N')
+                            for i, c in enumerate(read_cycles)],
+                    'channels': ['Red', 'Green']}}
+            if scales is None:
+                scales = ['custom']
+        if scales is None:
+            scales = list(BENCHMARK_SCALES.keys())
+        results = \
+            run_benchmark_suite(
+                scales=scales,
+                functions=args.function or BENCHMARK_FUNCTIONS,
+                data_dir=args.data_dir,
+                repeat=args.repeat,
+                generate_imaging=not args.no_imaging,
+                custom_scales=custom_scales)
+        regressions = list()
+        if args.baseline is not None:
+            with open(args.baseline, 'r') as fp:
+                baseline = json.load(fp)
+            comparison = \
+                compare_benchmark_results(
+                    results=results,
+                    baseline=baseline,
+                    time_threshold=args.time_threshold,
+                    memory_threshold=args.memory_threshold)
+            results.update({
+                'baseline': args.baseline,
+                'comparison': comparison})
+            for c in comparison:
+                if c.get('error') is not None:
+                    logging.info(
+                        '{0} {1}: failed, error: {2} REGRESSION'.format(
+                            c.get('scale'), c.get('function'), c.get('error')))
+                    continue
+                logging.info(
+                    '{0} {1}: time x{2}, peak RSS x{3}{4}'.format(
+                        c.get('scale'), c.get('function'), c.get('time_ratio'),
+                        c.get('memory_ratio'), ' REGRESSION' if c.get('regression') else ''))
+            regressions = [c for c in comparison if c.get('regression')]
+        with open(args.output_file, 'w') as fp:
+            json.dump(results, fp, indent=2)
+        errors = [r for r in results.get('results') if r.get('error') is not None]
+        for r in errors:
+            logging.error(
+                'Failed to benchmark {0} {1}, error: {2}'.format(
+                    r.get('scale'), r.get('function'), r.get('error')))
+        if len(regressions) > 0:
+            logging.error('Found {0} regressions against the baseline'.format(len(regressions)))
+        if len(regressions) > 0 or \
+           len(errors) > 0:
+            sys.exit(1)
+    except Exception as e:
+        logging.error('Failed to run benchmark, error: {0}'.format(e))
+        sys.exit(1)
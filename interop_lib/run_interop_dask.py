@@ -0,0 +1,75 @@
+import sys, json, argparse, logging
+import pandas as pd
+from interop_data_for_db import read_runs_for_batch
+from interop_dask import DASK_RUN_FUNCTIONS
+from interop_dask import get_dask_client
+from interop_dask import close_dask_client
+from interop_dask import get_multi_run_summary_stats
+from interop_dask import get_multi_run_features
+from interop_seqrun_ml import SeqrunFeatureStore
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--manifest', default=None, help='Csv file with run_id and run_path columns, and optional interop_dump and runinfo_xml columns')
+    parser.add_argument('-b', '--runs_dir', default=None, help='Dir of run folders, folder name is used as run id and InterOp binary files are read')
+    parser.add_argument('-m', '--mode', default='summary', choices=DASK_RUN_FUNCTIONS, help='summary for the summary stats table, features for the sequencing run ML features')
+    parser.add_argument('-o', '--output_file', required=True, help='Output csv path')
+    parser.add_argument('-l', '--labels', default=None, help='Features mode: csv with seqrun_id, optional lane_id and label columns, merged with the features for the training data')
+    parser.add_argument('-s', '--feature_store', default=None, help='Features mode: add the features of each run to this SQLite feature store')
+    parser.add_argument('-a', '--scheduler_address', default=None, help='Address of a running dask scheduler, default a local cluster')
+    parser.add_argument('-n', '--workers', default=None, type=int, help='Number of local worker processes, default one per core')
+    parser.add_argument('--threads_per_worker', default=1, type=int, help='Number of threads per local worker')
+    parser.add_argument('--memory_limit', default='auto', help='Memory limit per local worker, e.g. 4GB')
+    parser.add_argument('--dashboard_address', default=':8787', help='Dashboard address of the local cluster')
+    parser.add_argument('-c', '--cache_dir', default=None, help='Interop section cache dir for the dumptext outputs')
+    parser.add_argument('--failed_runs', default=None, help='Write the failed runs and errors to this json file')
+    args = parser.parse_args()
+    if args.manifest is None and \
+       args.runs_dir is None:
+        parser.error('Required --manifest or --runs_dir')
+    logging.basicConfig(level=logging.INFO)
+    try:
+        runs = \
+            read_runs_for_batch(
+                manifest=args.manifest,
+                runs_dir=args.runs_dir)
+        client = \
+            get_dask_client(
+                scheduler_address=args.scheduler_address,
+                n_workers=args.workers,
+                threads_per_worker=args.threads_per_worker,
+                memory_limit=args.memory_limit,
+                dashboard_address=args.dashboard_address)
+        try:
+            if args.mode == 'features':
+                labels = None
+                if args.labels is not None:
+                    labels = pd.read_csv(args.labels)
+                data, failed = \
+                    get_multi_run_features(
+                        runs=runs,
+                        cache_dir=args.cache_dir,
+                        labels=labels)
+                if args.feature_store is not None and \
+                   len(data.index) > 0:
+                    rows = \
+                        SeqrunFeatureStore(args.feature_store).\
+                            add_features(data)
+                    logging.info('Added {0} rows to feature store {1}'.format(rows, args.feature_store))
+            else:
+                data, failed = \
+                    get_multi_run_summary_stats(
+                        runs=runs,
+                        cache_dir=args.cache_dir)
+        finally:
+            close_dask_client(client)
+        data.to_csv(args.output_file, index=False)
+        if args.failed_runs is not None:
+            with open(args.failed_runs, 'w') as fp:
+                json.dump(failed, fp, indent=2)
+        if len(failed) > 0:
+            logging.error('Failed to process {0} of {1} runs'.format(len(failed), len(runs)))
+            sys.exit(1)
+    except Exception as e:
+        logging.error('Failed to process runs with dask, error: {0}'.format(e))
+        sys.exit(1)
@@ -0,0 +1,40 @@
+import os, sys, argparse, logging
+from interop_spark import INTEROP_TRENDS
+from interop_spark import TREND_PERIODS
+from interop_spark import get_spark_session
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--dataset_dir', required=True, help='Parquet dataset dir from export_interop_parquet.py')
+    parser.add_argument('-o', '--output_dir', required=True, help='Output dir, each trend is written to a sub dir')
+    parser.add_argument('-t', '--trend', action='append', default=None, choices=list(INTEROP_TRENDS.keys()), help='Trend to calculate, can be used more than once, default all')
+    parser.add_argument('-p', '--period', default=None, choices=TREND_PERIODS, help='Aggregate the runs of each instrument by this period, default one row per run')
+    parser.add_argument('--output_format', default='parquet', choices=['parquet', 'csv'], help='Output format, csv is written as a single file per trend')
+    parser.add_argument('--master', default='local[*]', help='Spark master')
+    parser.add_argument('--ui_port', default=4040, type=int, help='Spark UI port')
+    parser.add_argument('--driver_memory', default=None, help='Spark driver memory, e.g. 8g')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        spark = \
+            get_spark_session(
+                master=args.master,
+                ui_port=args.ui_port,
+                driver_memory=args.driver_memory)
+        try:
+            for trend in args.trend or list(INTEROP_TRENDS.keys()):
+                if trend == 'tile_density_drift':
+                    data = INTEROP_TRENDS.get(trend)(spark, args.dataset_dir)
+                else:
+                    data = INTEROP_TRENDS.get(trend)(spark, args.dataset_dir, period=args.period)
+                output_path = os.path.join(args.output_dir, trend)
+                if args.output_format == 'csv':
+                    data.coalesce(1).write.mode('overwrite').option('header', 'true').csv(output_path)
+                else:
+                    data.write.mode('overwrite').parquet(output_path)
+                logging.info('Trend {0} written to {1}'.format(trend, output_path))
+        finally:
+            spark.stop()
+    except Exception as e:
+        logging.error('Failed to calculate interop trends, error: {0}'.format(e))
+        sys.exit(1)
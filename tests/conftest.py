@@ -0,0 +1,7 @@
+import os, sys
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'interop_lib'))
@@ -0,0 +1,39 @@
+from interop_benchmark import compare_benchmark_results
+
+
+def get_result(function, median_time=1.0, peak_rss_mb=100.0, error=None):
+    if error is not None:
+        return {'scale': 'miseq', 'function': function, 'error': error}
+    return {
+        'scale': 'miseq',
+        'function': function,
+        'median_time': median_time,
+        'peak_rss_mb': peak_rss_mb,
+        'error': None}
+
+
+def test_compare_benchmark_results():
+    baseline = {
+        'results': [
+            get_result('read_interop_data'),
+            get_result('get_table_data'),
+            get_result('get_surface_data'),
+            get_result('get_intensity_data', error='ValueError: failed')]}
+    results = {
+        'results': [
+            get_result('read_interop_data', median_time=1.05),
+            get_result('get_table_data', peak_rss_mb=150.0),
+            get_result('get_surface_data', error='KeyError: Tile'),
+            get_result('get_intensity_data', error='ValueError: failed'),
+            get_result('get_qscore_bin_data')]}
+    comparison = {
+        c.get('function'): c
+            for c in compare_benchmark_results(results, baseline)}
+    assert sorted(comparison.keys()) == \
+        ['get_surface_data', 'get_table_data', 'read_interop_data']
+    assert not comparison.get('read_interop_data').get('regression')
+    assert comparison.get('get_table_data').get('regression')
+    assert comparison.get('get_table_data').get('memory_ratio') == 1.5
+    assert comparison.get('get_surface_data').get('regression')
+    assert comparison.get('get_surface_data').get('error') == 'KeyError: Tile'
+    assert comparison.get('get_surface_data').get('time_ratio') is None
@@ -0,0 +1,265 @@
+import struct
+import numpy as np
+import pandas as pd
+import pytest
+from interop_data_plot import read_interop_data
+from interop_binary_reader import read_interop_binary_data
+
+LANES = (1, 2)
+TILES = (1101, 2102)
+CYCLES = (1, 2, 3)
+READS = (1, 2)
+Q_BIN_LOWER = (1, 10, 20, 25, 30, 35, 39)
+Q_BIN_UPPER = (9, 19, 24, 29, 34, 38, 41)
+Q_BIN_VALUES = (2, 14, 21, 27, 32, 36, 40)
+
+
+def write_binary(path, version, dtype, rows, header=b''):
+    """
+    Write a InterOp binary file: version byte, record size byte, header and records
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    records = np.array(rows, dtype=dtype)
+    with open(path, 'wb') as fp:
+        fp.write(bytes([version, dtype.itemsize]) + header)
+        fp.write(records.tobytes())
+
+
+def write_dump(path, sections):
+    """
+    Write a interop_dumptext like output from a list of (section header, extra comments, dataframe)
+    """
+    with open(path, 'w') as fp:
+        fp.write('# Version: v1.1.23\n')
+        for header, comments, df in sections:
+            fp.write('# {0}\n'.format(header))
+            for comment in comments:
+                fp.write('# {0}\n'.format(comment))
+            df.to_csv(fp, index=False)
+
+
+def assert_sections_equal(binary_data, dump_data, section):
+    binary_df = binary_data.get(section)
+    dump_df = dump_data.get(section)
+    assert len(binary_df.index) > 0
+    assert set(binary_df.columns) <= set(dump_df.columns)
+    pd.testing.assert_frame_equal(
+        binary_df.reset_index(drop=True),
+        dump_df[binary_df.columns].reset_index(drop=True),
+        check_dtype=False)
+
+
+def get_q_histogram(lane, tile, cycle):
+    return tuple(
+        (lane * 7 + tile % 100 * 5 + cycle * 3 + i * 11) % 50
+            for i in range(len(Q_BIN_VALUES)))
+
+
+def get_q2030_rows(histograms):
+    rows = list()
+    for (lane, tile, cycle), hist in histograms:
+        total = sum(hist)
+        median = 0
+        count = 0
+        for value, c in zip(Q_BIN_VALUES, hist):
+            count += c
+            if total > 0 and \
+               count >= (total + 1) // 2:
+                median = value
+                break
+        rows.append({
+            'Lane': lane,
+            'Tile': tile,
+            'Cycle': cycle,
+            'Q20': sum(c for value, c in zip(Q_BIN_VALUES, hist) if value >= 20),
+            'Q30': sum(c for value, c in zip(Q_BIN_VALUES, hist) if value >= 30),
+            'Total': total,
+            'MedianQScore': median})
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def run_v2(tmp_path):
+    """
+    A run with TileMetrics v2, QMetrics v6 with 7 bins, ExtractionMetrics v3 (2 channels),
+    ErrorMetrics v3 and EmpiricalPhasing v1, and the matching dumptext output
+    """
+    interop_dir = tmp_path / 'run' / 'InterOp'
+    tile_dtype = \
+        np.dtype([
+            ('Lane', '<u2'), ('Tile', '<u2'), ('code', '<u2'), ('value', '<f4')])
+    tile_rows = list()
+    tile_dump = list()
+    for lane in LANES:
+        for tile in TILES:
+            count = 1000 * lane + tile
+            tile_rows.extend([
+                (lane, tile, 100, count / 2),
+                (lane, tile, 101, count / 4),
+                (lane, tile, 102, count),
+                (lane, tile, 103, count / 2)])
+            for read in READS:
+                tile_rows.extend([
+                    (lane, tile, 200 + (read - 1) * 2, 0.25 * read),
+                    (lane, tile, 201 + (read - 1) * 2, 0.125 * read),
+                    (lane, tile, 300 + read - 1, 50 + read)])
+                tile_dump.append({
+                    'Lane': lane, 'Tile': tile, 'Read': read,
+                    'ClusterCount': count, 'ClusterCountPF': count / 2,
+                    'Density': count / 2, 'DensityPF': count / 4,
+                    'Aligned': 50 + read, 'Prephasing': 0.125 * read,
+                    'Phasing': 0.25 * read})
+    write_binary(interop_dir / 'TileMetricsOut.bin', 2, tile_dtype, tile_rows)
+    q_dtype = \
+        np.dtype([
+            ('Lane', '<u2'), ('Tile', '<u2'), ('Cycle', '<u2'),
+            ('hist', '<u4', (len(Q_BIN_VALUES),))])
+    histograms = [
+        ((lane, tile, cycle), get_q_histogram(lane, tile, cycle))
+            for lane in LANES
+                for tile in TILES
+                    for cycle in CYCLES]
+    write_binary(
+        interop_dir / 'QMetricsOut.bin', 6, q_dtype,
+        [key + (hist,) for key, hist in histograms],
+        header=\
+            bytes([1, len(Q_BIN_VALUES)]) + \
+            bytes(Q_BIN_LOWER) + bytes(Q_BIN_UPPER) + bytes(Q_BIN_VALUES))
+    qbylane_dump = list()
+    for lane in LANES:
+        for cycle in CYCLES:
+            row = {'Lane': lane, 'Tile': 0, 'Cycle': cycle}
+            for i in range(len(Q_BIN_VALUES)):
+                row.update({
+                    'Bin_{0}'.format(i + 1): \
+                        sum(
+                            hist[i] for (l, t, c), hist in histograms
+                                if l == lane and c == cycle)})
+            qbylane_dump.append(row)
+    extraction_dtype = \
+        np.dtype([
+            ('Lane', '<u2'), ('Tile', '<u4'), ('Cycle', '<u2'),
+            ('fwhm', '<f4', (2,)), ('p90', '<u2', (2,)), ('TimeStamp', '<u8')])
+    extraction_rows = list()
+    extraction_dump = list()
+    error_dtype = \
+        np.dtype([
+            ('Lane', '<u2'), ('Tile', '<u2'), ('Cycle', '<u2'),
+            ('ErrorRate', '<f4'), ('mismatch', '<u4', (5,))])
+    error_rows = list()
+    error_dump = list()
+    phasing_dtype = \
+        np.dtype([
+            ('Lane', '<u2'), ('Tile', '<u4'), ('Cycle', '<u2'),
+            ('Phasing', '<f4'), ('Prephasing', '<f4')])
+    phasing_rows = list()
+    phasing_dump = list()
+    for lane in LANES:
+        for tile in TILES:
+            for cycle in CYCLES:
+                time_stamp = 637000000000000000 + lane * 1000 + cycle
+                extraction_rows.append(
+                    (lane, tile, cycle, (1.5, 2.25), (1000 + cycle, 2000 + lane), time_stamp))
+                extraction_dump.append({
+                    'Lane': lane, 'Tile': tile, 'Cycle': cycle, 'TimeStamp': time_stamp,
+                    'MaxIntensity_Red': 1000 + cycle, 'MaxIntensity_Green': 2000 + lane,
+                    'Focus_Red': 1.5, 'Focus_Green': 2.25})
+                error_rows.append(
+                    (lane, tile, cycle, 0.0625 * cycle, (1, 2, 3, 4, 5)))
+                error_dump.append({
+                    'Lane': lane, 'Tile': tile, 'Cycle': cycle,
+                    'ErrorRate': 0.0625 * cycle})
+                phasing_rows.append(
+                    (lane, tile, cycle, 0.125 + 0.0625 * cycle, 0.03125 * cycle))
+                phasing_dump.append({
+                    'Lane': lane, 'Tile': tile, 'Cycle': cycle,
+                    'Phasing': 0.125 + 0.0625 * cycle, 'Prephasing': 0.03125 * cycle})
+    write_binary(
+        interop_dir / 'ExtractionMetricsOut.bin', 3, extraction_dtype, extraction_rows,
+        header=bytes([2]))
+    write_binary(interop_dir / 'ErrorMetricsOut.bin', 3, error_dtype, error_rows)
+    write_binary(interop_dir / 'EmpiricalPhasingMetricsOut.bin', 1, phasing_dtype, phasing_rows)
+    dump_file = tmp_path / 'dump.csv'
+    write_dump(
+        dump_file, [
+            ('Tile,2', [], pd.DataFrame(tile_dump)),
+            ('Q2030,1', [], get_q2030_rows(histograms)),
+            ('Extraction,2', ['Channel Count: 2'], pd.DataFrame(extraction_dump)),
+            ('Error,3', [], pd.DataFrame(error_dump)),
+            ('EmpiricalPhasing,1', [], pd.DataFrame(phasing_dump)),
+            ('QByLane,6', ['Bin Count: {0}'.format(len(Q_BIN_VALUES))], pd.DataFrame(qbylane_dump))])
+    return tmp_path / 'run', dump_file
+
+
+@pytest.mark.parametrize(
+    'section', ['Tile', 'Q2030', 'Extraction', 'Error', 'EmpiricalPhasing', 'QByLane'])
+def test_binary_sections_match_dumptext(run_v2, section):
+    run_path, dump_file = run_v2
+    binary_data = read_interop_binary_data(str(run_path), sections=[section])
+    dump_data = read_interop_data(str(dump_file), sections=[section])
+    assert_sections_equal(binary_data, dump_data, section)
+
+
+def test_binary_reader_min_cycle(run_v2):
+    run_path, dump_file = run_v2
+    binary_data = \
+        read_interop_binary_data(
+            str(run_path),
+            sections=['Tile', 'Extraction'],
+            min_cycle=2)
+    dump_data = read_interop_data(str(dump_file), sections=['Tile', 'Extraction'])
+    assert_sections_equal(binary_data, dump_data, 'Tile')
+    extraction = dump_data.get('Extraction')
+    pd.testing.assert_frame_equal(
+        binary_data.get('Extraction').reset_index(drop=True),
+        extraction[extraction['Cycle'] > 2][binary_data.get('Extraction').columns].reset_index(drop=True),
+        check_dtype=False)
+
+
+def test_binary_reader_ignores_partial_record(run_v2):
+    run_path, dump_file = run_v2
+    with open(run_path / 'InterOp' / 'EmpiricalPhasingMetricsOut.bin', 'ab') as fp:
+        fp.write(b'\x01\x00\x02')
+    binary_data = read_interop_binary_data(str(run_path), sections=['EmpiricalPhasing'])
+    dump_data = read_interop_data(str(dump_file), sections=['EmpiricalPhasing'])
+    assert_sections_equal(binary_data, dump_data, 'EmpiricalPhasing')
+
+
+def test_tile_metrics_v3_matches_dumptext(tmp_path):
+    tile_dtype = \
+        np.dtype([
+            ('Lane', '<u2'), ('Tile', '<u4'), ('code', 'u1'),
+            ('value1', '<f4'), ('value2', '<f4')])
+    tile_rows = list()
+    tile_dump = list()
+    for lane in LANES:
+        for tile in TILES:
+            count = 1000 * lane + tile
+            tile_rows.append((lane, tile, ord('t'), count, count / 2))
+            for read in READS:
+                read_id = np.array([read], dtype='<u4').view('<f4')[0]
+                tile_rows.append((lane, tile, ord('r'), read_id, 50 + read))
+                tile_dump.append({
+                    'Lane': lane, 'Tile': tile, 'Read': read,
+                    'ClusterCount': count, 'ClusterCountPF': count / 2,
+                    'Density': count / 2, 'DensityPF': count / 4,
+                    'Aligned': 50 + read, 'Prephasing': np.nan, 'Phasing': np.nan})
+    write_binary(
+        tmp_path / 'run' / 'InterOp' / 'TileMetricsOut.bin', 3, tile_dtype, tile_rows,
+        header=struct.pack('<f', 2.0))
+    dump_file = tmp_path / 'dump.csv'
+    write_dump(dump_file, [('Tile,3', [], pd.DataFrame(tile_dump))])
+    binary_data = read_interop_binary_data(str(tmp_path / 'run'), sections=['Tile'])
+    dump_data = read_interop_data(str(dump_file), sections=['Tile'])
+    assert_sections_equal(binary_data, dump_data, 'Tile')
+
+
+def test_unsupported_version(tmp_path):
+    tile_dtype = \
+        np.dtype([
+            ('Lane', '<u2'), ('Tile', '<u2'), ('code', '<u2'), ('value', '<f4')])
+    write_binary(
+        tmp_path / 'run' / 'InterOp' / 'TileMetricsOut.bin', 1, tile_dtype,
+        [(1, 1101, 100, 1.0)])
+    with pytest.raises(ValueError):
+        read_interop_binary_data(str(tmp_path / 'run'), sections=['Tile'])
@@ -0,0 +1,160 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import iplotter
+import seaborn as sns
+from interop_data_plot import RunMetrics
+from interop_data_plot import plot_intensity_data
+from interop_data_for_db import get_intensity_data
+from interop_json import dumps_interop_json
+
+COLORS = [
+    'rgb(255, 99, 132, 0.8)',
+    'rgb(255, 159, 64, 0.8)',
+    'rgb(255, 205, 86, 0.8)',
+    'rgb(75, 192, 192, 0.8)']
+
+
+def reference_intensity_medians(extractionDf):
+    """
+    The nested lane and cycle loop used before get_intensity_medians
+    """
+    intensity_columns = [
+        c for c in extractionDf.columns
+            if c.startswith('MaxIntensity_')]
+    if len(intensity_columns) == 0:
+        raise ValueError('No intensity columns found')
+    extractionDf['Lane'] = extractionDf['Lane'].astype(int)
+    extractionDf['Cycle'] = extractionDf['Cycle'].astype(int)
+    for c in intensity_columns:
+        extractionDf[c] = extractionDf[c].astype(float)
+    formatted_data = list()
+    for lane_id, l_data in extractionDf.groupby('Lane'):
+        for cycle, c_data in l_data.groupby('Cycle'):
+            row = {'Lane':lane_id, 'Cycle':cycle}
+            for c in intensity_columns:
+                row.update({c: c_data[c].median()})
+            formatted_data.append(row)
+    return intensity_columns, pd.DataFrame(formatted_data)
+
+
+def reference_get_intensity_data(extractionDf, colors):
+    intensity_columns, formatted_data = \
+        reference_intensity_medians(extractionDf)
+    chart_data = dict()
+    labels = []
+    for lane_id, l_data in formatted_data.groupby('Lane'):
+        labels = l_data.sort_values('Cycle').set_index('Cycle').index.tolist()
+        lane_data = list()
+        for c, color in zip(intensity_columns, colors):
+            intensity_data = l_data.sort_values('Cycle').set_index('Cycle')[c].astype(int).values.tolist()
+            lane_data.append({
+                "label": c,
+                "data": intensity_data,
+                "color": color })
+        chart_data.update({lane_id: lane_data})
+    return {"chart_data":chart_data, "labels":labels}
+
+
+def reference_plot_intensity_data(extractionDf, color_palette='colorblind', width=1000, height=600):
+    intensity_columns, formatted_data = \
+        reference_intensity_medians(extractionDf)
+    plots = list()
+    colors = sns.color_palette(color_palette, len(intensity_columns), as_cmap=False).as_hex()
+    chart_js = iplotter.ChartJSPlotter()
+    for lane_id, l_data in formatted_data.groupby('Lane'):
+        labels = l_data.sort_values('Cycle').set_index('Cycle').index
+        datasets = list()
+        for c, color in zip(intensity_columns, colors):
+            intensity_data = l_data.sort_values('Cycle').set_index('Cycle')[c].values
+            datasets.append({
+                "label": c,
+                "data": list(intensity_data),
+                "type": "line",
+                "fill": False,
+                "pointBorderColor": "transparent",
+                "backgroundColor": color,
+                "borderColor": color,
+                "lineTension": 0})
+        data_json = {
+            "datasets":datasets,
+            "labels": list(labels)}
+        options = {
+            "animation": {
+                "duration": 0
+            },
+            "title": {
+                "display": True,
+                "text": 'Intensity plots for lane {0}'.format(lane_id),
+                "fontSize":16
+            },
+            "scales": {
+                "yAxes":[{
+                    "scaleLabel":{
+                        "display":True,
+                        "labelString":"Intensity values"
+                    }
+                }],
+                "xAxes":[{
+                    "scaleLabel":{
+                        "display":True,
+                        "labelString":"Cycles"
+                    }
+                }]
+            }
+        }
+        plots.append(chart_js.plot(data_json, options=options, chart_type="line", w=width, h=height))
+    return plots
+
+
+def get_extraction_data(channels, lanes=(1, 2, 3), tiles=(1101, 1102, 1103, 2101), cycles=12, seed=1):
+    """
+    A shuffled Extraction section, an even number of tiles per cycle so some medians are not whole numbers
+    """
+    rng = np.random.default_rng(seed)
+    rows = list()
+    for lane in lanes:
+        for tile in tiles:
+            for cycle in range(1, cycles + 1):
+                row = {'Lane': lane, 'Tile': tile, 'Cycle': cycle, 'TimeStamp': 637000000000000000 + cycle}
+                for channel in channels:
+                    row.update({'MaxIntensity_{0}'.format(channel): float(rng.integers(500, 5000))})
+                for channel in channels:
+                    row.update({'Focus_{0}'.format(channel): float(rng.random() * 3)})
+                rows.append(row)
+    extraction = pd.DataFrame(rows)
+    extraction = extraction.drop(index=[5, 17]).sample(frac=1, random_state=seed)
+    for c in extraction.columns:
+        if c.startswith(('MaxIntensity_', 'Focus_')):
+            extraction[c] = extraction[c].astype('float32')
+    return extraction.reset_index(drop=True)
+
+
+@pytest.fixture(params=[('A', 'C', 'G', 'T'), ('Red', 'Green')], ids=['four_channel', 'two_channel'])
+def extraction_data(request):
+    return get_extraction_data(request.param)
+
+
+def test_get_intensity_data_matches_reference(extraction_data):
+    expected = reference_get_intensity_data(extraction_data.copy(), COLORS)
+    data = \
+        get_intensity_data(
+            RunMetrics({'Extraction': extraction_data.copy()}, None),
+            COLORS)
+    assert dumps_interop_json(data) == json.dumps(expected)
+
+
+def test_plot_intensity_data_matches_reference(extraction_data):
+    expected = reference_plot_intensity_data(extraction_data.copy())
+    plots = plot_intensity_data(extraction_data.copy())
+    assert len(plots) == len(expected)
+    for plot, expected_plot in zip(plots, expected):
+        assert plot.data == expected_plot.data
+
+
+def test_intensity_data_keeps_extraction_data(extraction_data):
+    extraction = extraction_data.copy()
+    get_intensity_data(RunMetrics({'Extraction': extraction}, None), COLORS)
+    plot_intensity_data(extraction)
+    pd.testing.assert_frame_equal(extraction, extraction_data)
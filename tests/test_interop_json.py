@@ -0,0 +1,77 @@
+import json
+import pytest
+from interop_benchmark import generate_benchmark_run
+from interop_data_for_db import get_interop_data_for_db
+from interop_json import write_interop_json
+from interop_json import decode_interop_json
+
+
+def assert_chart_data_close(data, expected, rel=1e-6):
+    """
+    Compare nested chart data, floats with a relative tolerance for the float32 arrays of format 3
+    """
+    if isinstance(expected, dict):
+        assert isinstance(data, dict)
+        assert set(data.keys()) == set(expected.keys())
+        for k in expected:
+            assert_chart_data_close(data[k], expected[k], rel=rel)
+    elif isinstance(expected, list):
+        assert isinstance(data, list)
+        assert len(data) == len(expected)
+        for v, e in zip(data, expected):
+            assert_chart_data_close(v, e, rel=rel)
+    elif isinstance(expected, float):
+        assert data == pytest.approx(expected, rel=rel, nan_ok=True)
+    else:
+        assert data == expected
+
+
+@pytest.fixture(scope='module')
+def run_files(tmp_path_factory):
+    return \
+        generate_benchmark_run(
+            str(tmp_path_factory.mktemp('run')),
+            lanes=2,
+            surfaces=2,
+            swaths=2,
+            tiles_per_swath=3,
+            reads=[(1, 5, 'N'), (2, 2, 'Y'), (3, 5, 'N')],
+            channels=['Red', 'Green'])
+
+
+def get_db_json(run_files, json_format):
+    return \
+        get_interop_data_for_db(
+            run_name='R1',
+            dump_file=run_files.get('dump_file'),
+            runinfo_file=run_files.get('runinfo_file'),
+            imaging_table_data=run_files.get('imaging_file'),
+            json_format=json_format)
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+@pytest.mark.parametrize('json_format', [1, 2, 3])
+def test_db_json_roundtrip(run_files, tmp_path, json_format, compression):
+    expected = json.loads(json.dumps(get_db_json(run_files, json_format=1)))
+    for key in ('flowcell_data', 'intensity_data', 'cluster_count_data', 'density_data',
+                'qscore_bins_data', 'qscore_cycles_data', 'occupied_pass_filter'):
+        expected.update({key: json.loads(expected.get(key))})
+    output_file = str(tmp_path / 'R1.json')
+    write_interop_json(
+        get_db_json(run_files, json_format=json_format),
+        output_file,
+        compression=compression)
+    data = decode_interop_json(output_file, as_lists=True)
+    if json_format == 1:
+        assert 'format_version' not in data
+    else:
+        assert data.pop('format_version') == json_format
+    if json_format == 3:
+        assert_chart_data_close(data, expected)
+    else:
+        assert data == expected
+
+
+def test_db_json_format_2_needs_interop_encoder(run_files):
+    with pytest.raises(TypeError):
+        json.dumps(get_db_json(run_files, json_format=2))
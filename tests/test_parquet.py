@@ -0,0 +1,52 @@
+import os
+import pyarrow.parquet as pq
+import pytest
+from interop_benchmark import write_benchmark_runinfo
+from interop_parquet import PARQUET_EXPORT_SECTIONS
+from interop_parquet import PARQUET_RUNINFO_SECTION
+from interop_parquet import export_run_to_parquet
+from test_binary_reader import CYCLES
+from test_binary_reader import run_v2
+
+
+@pytest.fixture
+def run_files(run_v2):
+    run_path, dump_file = run_v2
+    write_benchmark_runinfo(
+        str(run_path / 'RunInfo.xml'),
+        lanes=2,
+        surfaces=2,
+        swaths=1,
+        tiles_per_swath=2,
+        reads=[(1, len(CYCLES) - 1, 'N'), (2, 1, 'N')])
+    return run_path, dump_file
+
+
+def read_section_schemas(run_dir):
+    schemas = dict()
+    for section_dir in sorted(os.listdir(run_dir)):
+        schemas.update({
+            section_dir.split('=', 1)[1]: \
+                pq.read_schema(os.path.join(run_dir, section_dir, 'part-0.parquet')).\
+                remove_metadata()})
+    return schemas
+
+
+def test_parquet_schema_same_for_dumptext_and_binary_runs(run_files, tmp_path):
+    run_path, dump_file = run_files
+    dump_export = \
+        export_run_to_parquet(
+            {'run_id': 'R1', 'run_path': str(run_path), 'interop_dump': str(dump_file)},
+            output_dir=str(tmp_path / 'dump_parquet'))
+    binary_export = \
+        export_run_to_parquet(
+            {'run_id': 'R1', 'run_path': str(run_path)},
+            output_dir=str(tmp_path / 'binary_parquet'))
+    assert sorted(dump_export.get('sections').keys()) == \
+        sorted(PARQUET_EXPORT_SECTIONS + [PARQUET_RUNINFO_SECTION])
+    assert dump_export.get('sections') == binary_export.get('sections')
+    dump_schemas = read_section_schemas(dump_export.get('path'))
+    binary_schemas = read_section_schemas(binary_export.get('path'))
+    assert sorted(dump_schemas.keys()) == sorted(binary_schemas.keys())
+    for section, schema in dump_schemas.items():
+        assert schema == binary_schemas.get(section), section
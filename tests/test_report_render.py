@@ -0,0 +1,77 @@
+import re
+import json
+import numpy as np
+import pytest
+import iplotter
+from interop_report_render import plot_chart
+
+CHARTJS_DATA = {
+    'labels': np.array([1, 2, 3]),
+    'datasets': [{
+        'label': '</script><script>alert(1)</script>',
+        'data': np.array([1.5, 2.25, np.float32(3.0)]),
+        'backgroundColor': 'rgb(255, 99, 132, 0.8)'}]}
+CHARTJS_OPTIONS = {
+    'title': {'display': True, 'text': 'Lane 1 </div>'},
+    'animation': {'duration': 0}}
+PLOTLY_DATA = [{
+    'type': 'heatmap',
+    'z': [[1, 2], [3, 4]],
+    'name': '</SCRIPT> lane 1'}]
+PLOTLY_LAYOUT = {'title': 'Surface </b>'}
+
+
+def get_shared_payload(html):
+    match = \
+        re.match(
+            r'<div id="(?P<div_id>[^"]+)"[^>]*></div>\n<script>\n'
+            r'\(window\.interopChartQueue = window\.interopChartQueue \|\| \[\]\)\.push\((?P<payload>.*)\);\n',
+            html)
+    assert match is not None
+    return match.group('div_id'), match.group('payload')
+
+
+@pytest.mark.parametrize(
+    'library, data, options, chart_type', [
+        ('chartjs', CHARTJS_DATA, CHARTJS_OPTIONS, 'bar'),
+        ('plotly', PLOTLY_DATA, PLOTLY_LAYOUT, None)])
+def test_shared_mode_payload(library, data, options, chart_type):
+    html = \
+        plot_chart(
+            library, data, options=options, chart_type=chart_type,
+            w=1000, h=600, render_mode='shared').data
+    div_id, payload = get_shared_payload(html)
+    assert '</' not in payload
+    payload = json.loads(payload)
+    assert payload.get('id') == div_id
+    assert payload.get('library') == library
+    expected_data = json.loads(json.dumps(data, default=lambda obj: obj.tolist()))
+    assert payload.get('data') == expected_data
+    if library == 'chartjs':
+        assert payload.get('type') == chart_type
+        assert payload.get('options') == options
+    else:
+        assert payload.get('layout') == options
+
+
+def test_shared_mode_unique_div_ids():
+    html_1 = plot_chart('plotly', PLOTLY_DATA, options=PLOTLY_LAYOUT, render_mode='shared').data
+    html_2 = plot_chart('plotly', PLOTLY_DATA, options=PLOTLY_LAYOUT, render_mode='shared').data
+    assert get_shared_payload(html_1)[0] != get_shared_payload(html_2)[0]
+
+
+def test_iframe_mode_matches_iplotter():
+    data = {
+        'labels': [1, 2, 3],
+        'datasets': [{'label': 'Q30', 'data': [90.5, 88.25, 91.0]}]}
+    assert \
+        plot_chart('chartjs', data, options=CHARTJS_OPTIONS, chart_type='bar', w=1000, h=600).data == \
+        iplotter.ChartJSPlotter().plot(data, options=CHARTJS_OPTIONS, chart_type='bar', w=1000, h=600).data
+    assert \
+        plot_chart('plotly', PLOTLY_DATA, options=PLOTLY_LAYOUT, w=1000, h=600).data == \
+        iplotter.PlotlyPlotter().plot(PLOTLY_DATA, layout=PLOTLY_LAYOUT, w=1000, h=600).data
+
+
+def test_unknown_render_mode():
+    with pytest.raises(ValueError):
+        plot_chart('chartjs', CHARTJS_DATA, render_mode='inline')
@@ -0,0 +1,140 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import interop_seqrun_ml
+from interop_data_plot import SEQRUN_FEATURE_COLUMNS
+from interop_benchmark import generate_benchmark_run
+from interop_seqrun_ml import SEQRUN_LABEL_COLUMN
+from interop_seqrun_ml import SEQRUN_MODEL_FILE_PREFIX
+from interop_seqrun_ml import SeqrunFeatureStore
+from interop_seqrun_ml import evict_seqrun_models
+
+
+def get_features(seqrun_id, lanes=(1, 2), offset=0.0):
+    rows = list()
+    for lane in lanes:
+        row = {'seqrun_id': seqrun_id, 'lane_id': lane}
+        for i, c in enumerate(SEQRUN_FEATURE_COLUMNS):
+            row.update({c: float(lane * 100 + i) + offset})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def get_training_data(rows=60, seed=0):
+    rng = np.random.default_rng(seed)
+    data = \
+        pd.DataFrame(
+            rng.random((rows, len(SEQRUN_FEATURE_COLUMNS))) * 100,
+            columns=SEQRUN_FEATURE_COLUMNS)
+    data[SEQRUN_LABEL_COLUMN] = (data[SEQRUN_FEATURE_COLUMNS[0]] > 50).astype(int)
+    return data
+
+
+def test_feature_store_add_and_get(tmp_path):
+    store = SeqrunFeatureStore(str(tmp_path / 'db' / 'features.db'))
+    assert not store.has_run('R1')
+    assert store.add_features(get_features('R2')) == 2
+    assert store.add_features(get_features('R1', lanes=(1, 2, 3))) == 3
+    assert store.has_run('R1')
+    data = store.get_features()
+    assert data[['seqrun_id', 'lane_id']].values.tolist() == \
+        [['R1', 1], ['R1', 2], ['R1', 3], ['R2', 1], ['R2', 2]]
+    pd.testing.assert_frame_equal(
+        store.get_features(seqrun_ids=['R2']),
+        get_features('R2'),
+        check_dtype=False)
+    assert len(store.get_features(seqrun_ids=['R3']).index) == 0
+
+
+def test_feature_store_replace_run(tmp_path):
+    store = SeqrunFeatureStore(str(tmp_path / 'features.db'))
+    store.add_features(get_features('R1', lanes=(1, 2, 3)))
+    store.add_features(get_features('R2'))
+    assert store.remove_run('R1') == 3
+    store.add_features(get_features('R1', lanes=(1,), offset=0.5))
+    pd.testing.assert_frame_equal(
+        store.get_features(seqrun_ids=['R1']),
+        get_features('R1', lanes=(1,), offset=0.5),
+        check_dtype=False)
+    assert len(store.get_features(seqrun_ids=['R2']).index) == 2
+
+
+def test_feature_store_missing_column(tmp_path):
+    store = SeqrunFeatureStore(str(tmp_path / 'features.db'))
+    with pytest.raises(ValueError):
+        store.add_features(get_features('R1').drop(columns=[SEQRUN_FEATURE_COLUMNS[0]]))
+
+
+def test_feature_store_get_or_add_run_features(tmp_path):
+    run_files = \
+        generate_benchmark_run(
+            str(tmp_path / 'run'),
+            lanes=2,
+            surfaces=2,
+            swaths=2,
+            tiles_per_swath=3,
+            reads=[(1, 5, 'N'), (2, 2, 'Y'), (3, 5, 'N')],
+            channels=['Red', 'Green'],
+            generate_imaging=False)
+    store = SeqrunFeatureStore(str(tmp_path / 'features.db'))
+    features = \
+        store.get_or_add_run_features(
+            'R1',
+            interop_dump=run_files.get('dump_file'),
+            runinfo_xml=run_files.get('runinfo_file'))
+    assert features['lane_id'].tolist() == [1, 2]
+    os.remove(run_files.get('dump_file'))
+    pd.testing.assert_frame_equal(
+        store.get_or_add_run_features(
+            'R1',
+            interop_dump=run_files.get('dump_file'),
+            runinfo_xml=run_files.get('runinfo_file')),
+        features)
+
+
+def test_evict_seqrun_models(tmp_path):
+    model_files = list()
+    for i in range(4):
+        model_file = tmp_path / '{0}{1}.joblib'.format(SEQRUN_MODEL_FILE_PREFIX, i)
+        model_file.write_bytes(b'model')
+        os.utime(model_file, (1000 + i, 1000 + i))
+        model_files.append(str(model_file))
+    (tmp_path / 'other.joblib').write_bytes(b'other')
+    os.utime(model_files[0], (2000, 2000))
+    removed = evict_seqrun_models(str(tmp_path), max_models=2, keep=[model_files[1]])
+    assert removed == [model_files[2]]
+    assert sorted(os.listdir(tmp_path)) == \
+        sorted(['other.joblib'] + [os.path.basename(f) for f in model_files if f != model_files[2]])
+
+
+def test_seqrun_model_refit_on_training_data_change(tmp_path, monkeypatch):
+    pytest.importorskip('sklearn')
+    pytest.importorskip('joblib')
+    fit_calls = list()
+    fit_seqrun_model = interop_seqrun_ml.fit_seqrun_model
+    def counted_fit(training_data, model_params=None):
+        fit_calls.append(len(training_data.index))
+        return fit_seqrun_model(training_data, model_params=model_params)
+    monkeypatch.setattr(interop_seqrun_ml, 'fit_seqrun_model', counted_fit)
+    cache_dir = str(tmp_path / 'models')
+    training_data = get_training_data()
+    model_a = interop_seqrun_ml.get_seqrun_model(training_data, cache_dir=cache_dir)
+    cached_a = interop_seqrun_ml.get_seqrun_model(training_data, cache_dir=cache_dir)
+    assert fit_calls == [60]
+    assert cached_a.get('training_data_key') == model_a.get('training_data_key')
+    changed_data = get_training_data(rows=80, seed=1)
+    model_b = interop_seqrun_ml.get_seqrun_model(changed_data, cache_dir=cache_dir)
+    assert fit_calls == [60, 80]
+    assert model_b.get('training_data_key') != model_a.get('training_data_key')
+    assert len(os.listdir(cache_dir)) == 2
+    interop_seqrun_ml.get_seqrun_model(training_data, cache_dir=cache_dir)
+    assert fit_calls == [60, 80]
+    interop_seqrun_ml.get_seqrun_model(
+        get_training_data(rows=70, seed=2),
+        cache_dir=cache_dir,
+        max_cached_models=2)
+    assert fit_calls == [60, 80, 70]
+    model_files = os.listdir(cache_dir)
+    assert len(model_files) == 2
+    assert '{0}{1}.joblib'.format(SEQRUN_MODEL_FILE_PREFIX, model_a.get('training_data_key')) in model_files